@@ -0,0 +1,300 @@
+"""Measures client overhead against a local mock ChatGPT server.
+
+Run from the repository root:
+
+    python -m benchmarks.run --requests 200 --concurrency 16
+    python -m benchmarks.run --latency 0.5 --error-rate 0.1 --json
+
+Reports throughput, p50/p99 latency, time to first reply snapshot,
+client CPU time per reply and memory per conversation.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Union
+
+from typer.testing import CliRunner
+
+from benchmarks.server import MockServer
+from benchmarks.server import ServerConfig
+from chatgpt import api
+from chatgpt import batch
+from chatgpt import cli
+from chatgpt import transcript
+from chatgpt.retry import RetryPolicy
+
+
+@dataclass
+class Result:
+    scenario: str
+    replies: int = 0
+    errors: int = 0
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    latencies: List[float] = field(default_factory=list, repr=False)
+    first_snapshot: List[float] = field(default_factory=list, repr=False)
+    memory_per_conversation: Union[float, None] = None
+
+    def summary(self) -> Dict[str, Union[str, float, None]]:
+        return {
+            "scenario": self.scenario,
+            "replies": self.replies,
+            "errors": self.errors,
+            "throughput_rps": _div(self.replies, self.wall_seconds),
+            "p50_ms": _percentile(self.latencies, 50),
+            "p99_ms": _percentile(self.latencies, 99),
+            "ttft_p50_ms": _percentile(self.first_snapshot, 50),
+            "cpu_ms_per_reply": _div(self.cpu_seconds * 1000, self.replies),
+            "kib_per_conversation": self.memory_per_conversation,
+        }
+
+
+@contextmanager
+def measured(result: Result) -> Iterator[None]:
+    wall, cpu = time.perf_counter(), time.process_time()
+    yield
+    result.wall_seconds = time.perf_counter() - wall
+    result.cpu_seconds = time.process_time() - cpu
+
+
+def client_kwargs(args: argparse.Namespace) -> dict:
+    return {
+        "session_token": "benchmark",
+        "response_timeout": 60,
+        "transcript": None,
+        "retry_policy": RetryPolicy(backoff_base=0.01)
+        if args.retries
+        else None,
+    }
+
+
+def bench_send_message(client_class, args) -> Result:
+    result = Result("send_message")
+    with client_class(**client_kwargs(args)) as chat:
+        with measured(result):
+            for _ in range(args.requests):
+                chat.new_conversation()
+                start = time.perf_counter()
+                try:
+                    chat.send_message("benchmark")
+                except Exception:
+                    result.errors += 1
+                    continue
+                result.latencies.append(time.perf_counter() - start)
+                result.replies += 1
+    return result
+
+
+def bench_stream_message(client_class, args) -> Result:
+    result = Result("stream_message")
+    with client_class(**client_kwargs(args)) as chat:
+        with measured(result):
+            for _ in range(args.requests):
+                chat.new_conversation()
+                start = time.perf_counter()
+                first = None
+                try:
+                    for _ in chat.stream_message("benchmark"):
+                        if first is None:
+                            first = time.perf_counter() - start
+                except Exception:
+                    result.errors += 1
+                    continue
+                if first is not None:
+                    result.first_snapshot.append(first)
+                result.latencies.append(time.perf_counter() - start)
+                result.replies += 1
+    return result
+
+
+def bench_send_many(client_class, args) -> Result:
+    result = Result(f"send_many x{args.concurrency}")
+    with client_class(**client_kwargs(args)) as chat:
+        with measured(result):
+            for item in batch.send_many(
+                chat,
+                ["benchmark"] * args.requests,
+                concurrency=args.concurrency,
+            ):
+                if item.ok:
+                    result.replies += 1
+                else:
+                    result.errors += 1
+    return result
+
+
+def bench_async(client_class, args) -> Result:
+    result = Result(f"AsyncChatGPT x{args.concurrency}")
+
+    async def one(chat, semaphore) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            first = None
+            try:
+                async for _ in chat.conversation().stream_message("benchmark"):
+                    if first is None:
+                        first = time.perf_counter() - start
+            except Exception:
+                result.errors += 1
+                return
+            if first is not None:
+                result.first_snapshot.append(first)
+            result.latencies.append(time.perf_counter() - start)
+            result.replies += 1
+
+    async def main() -> None:
+        async with client_class(**client_kwargs(args)) as chat:
+            semaphore = asyncio.Semaphore(args.concurrency)
+            with measured(result):
+                await asyncio.gather(
+                    *(one(chat, semaphore) for _ in range(args.requests))
+                )
+
+    asyncio.run(main())
+    return result
+
+
+def bench_memory(client_class, args) -> Result:
+    """Memory retained by conversations which exchanged one message."""
+    result = Result("memory per conversation")
+    count = args.requests
+    with client_class(**client_kwargs(args)) as chat:
+        # Warm up connections and caches, so they aren't counted
+        chat.conversation().send_message("benchmark")
+        gc.collect()
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        conversations = [chat.conversation() for _ in range(count)]
+        with measured(result):
+            for item in batch.send_many(
+                chat,
+                [(conv, "benchmark") for conv in conversations],
+                concurrency=args.concurrency,
+            ):
+                if item.ok:
+                    result.replies += 1
+                else:
+                    result.errors += 1
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    result.memory_per_conversation = (after - before) / count / 1024
+    return result
+
+
+def bench_cli(client_class, args) -> Result:
+    """Runs the `chatgpt start` loop with messages piped to stdin."""
+    result = Result("cli start")
+    with tempfile.TemporaryDirectory() as tmp:
+        key_file = Path(tmp) / "key.txt"
+        key_file.write_text("benchmark")
+        patches = [
+            (cli, "SESSION_KEY_FILE", key_file),
+            (transcript, "LOGGING_DIR", Path(tmp) / "logs"),
+            (api.ChatGPT, "_AUTH_URL", client_class._AUTH_URL),
+            (api.ChatGPT, "_CONV_URL", client_class._CONV_URL),
+        ]
+        with _patched(patches):
+            stdin = "benchmark\n" * args.requests + "!exit\n"
+            with measured(result):
+                outcome = CliRunner().invoke(
+                    cli.app, ["start", "--no-token-cache"], input=stdin
+                )
+    result.replies = outcome.stdout.count("Message:") - 1
+    result.errors = args.requests - result.replies
+    return result
+
+
+SCENARIOS: Dict[str, Callable[..., Result]] = {
+    "send_message": bench_send_message,
+    "stream_message": bench_stream_message,
+    "send_many": bench_send_many,
+    "async": bench_async,
+    "memory": bench_memory,
+    "cli": bench_cli,
+}
+
+
+@contextmanager
+def _patched(patches) -> Iterator[None]:
+    saved = [(obj, name, getattr(obj, name)) for obj, name, _ in patches]
+    for obj, name, value in patches:
+        setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        for obj, name, value in saved:
+            setattr(obj, name, value)
+
+
+def _percentile(values: List[float], percentile: int) -> Union[float, None]:
+    if len(values) < 2:
+        return values[0] * 1000 if values else None
+    return statistics.quantiles(values, n=100)[percentile - 1] * 1000
+
+
+def _div(a: float, b: float) -> Union[float, None]:
+    return a / b if b else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=list(SCENARIOS),
+        help="scenario to run, can be repeated (default: all)",
+    )
+    parser.add_argument("--retries", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    for name, default in asdict(ServerConfig()).items():
+        parser.add_argument(
+            "--" + name.replace("_", "-"), type=type(default), default=default
+        )
+    args = parser.parse_args()
+    config = ServerConfig(
+        **{name: getattr(args, name) for name in asdict(ServerConfig())}
+    )
+
+    summaries = []
+    with MockServer(config) as server:
+        for name in args.scenario or SCENARIOS:
+            base = api.AsyncChatGPT if name == "async" else api.ChatGPT
+            result = SCENARIOS[name](server.client_class(base), args)
+            summaries.append(result.summary())
+
+    if args.json:
+        print(json.dumps({"server": asdict(config), "results": summaries}))
+        return
+    columns = list(summaries[0])
+    print(" | ".join(f"{c:>20}" for c in columns))
+    for summary in summaries:
+        print(" | ".join(f"{_format(summary[c]):>20}" for c in columns))
+
+
+def _format(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return "-" if value is None else str(value)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Local stand-in for the ChatGPT endpoints used by the client.
+
+Serves the session endpoint and a streaming conversation endpoint with
+configurable latency, token rate, reply size and error injection:
+
+    python -m benchmarks.server --port 8080 --latency 0.2 --error-rate 0.05
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import time
+import uuid
+from dataclasses import asdict
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Type
+from typing import TypeVar
+from typing import Union
+
+from chatgpt import api
+
+AUTH_PATH = "/api/auth/session"
+CONV_PATH = "/backend-api/conversation"
+
+ClientT = TypeVar("ClientT", bound=api._BaseChatGPT)
+
+
+@dataclass
+class ServerConfig:
+    # Seconds before response headers are sent
+    latency: float = 0.05
+    # Generated tokens per second, 0 sends the whole reply at once
+    tokens_per_second: float = 200.0
+    reply_chars: int = 2000
+    chars_per_token: int = 4
+    # Tokens sent in a single event
+    tokens_per_event: int = 1
+    # Share of conversation requests answered with `error_status`
+    error_rate: float = 0.0
+    error_status: int = 503
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = ServerConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != AUTH_PATH:
+            return self._send_empty(404)
+        body = json.dumps(
+            {"accessToken": "benchmark", "expires": "2999-01-01T00:00:00Z"}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header(
+            "Set-Cookie", f"{api.ChatGPT._AUTH_COOKIE_NAME}=benchmark"
+        )
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(
+            self.rfile.read(int(self.headers["Content-Length"]))
+        )
+        if self.path != CONV_PATH:
+            return self._send_empty(404)
+        config = self.config
+        time.sleep(config.latency)
+        if random.random() < config.error_rate:
+            return self._send_empty(config.error_status)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        conversation_id = request["conversation_id"] or str(uuid.uuid4())
+        message_id = str(uuid.uuid4())
+        text = (
+            "lorem ipsum dolor sit amet " * (config.reply_chars // 27 + 1)
+        )[: config.reply_chars]
+        step = config.chars_per_token * config.tokens_per_event
+        delay = (
+            config.tokens_per_event / config.tokens_per_second
+            if config.tokens_per_second
+            else 0
+        )
+        for end in range(step, len(text) + step, step):
+            event = {
+                "message": {
+                    "id": message_id,
+                    "role": "assistant",
+                    "content": {"content_type": "text", "parts": [text[:end]]},
+                },
+                "conversation_id": conversation_id,
+                "error": None,
+            }
+            self._send_chunk(f"data: {json.dumps(event)}\n\n".encode())
+            if delay:
+                time.sleep(delay)
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+    def _send_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def _send_empty(self, status: int) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def serve(port: int, config: ServerConfig, ready=None) -> None:
+    handler = type("Handler", (_Handler,), {"config": config})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    if ready is not None:
+        ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+class MockServer:
+    """Runs the server in a separate process.
+
+    That way the server doesn't skew client CPU and memory measurements.
+    """
+
+    def __init__(self, config: ServerConfig) -> None:
+        self.config = config
+        self.port = 0
+        self._process: Union[multiprocessing.Process, None] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def client_class(self, base: Type[ClientT]) -> Type[ClientT]:
+        """Returns subclass of a client class talking to this server."""
+        return type(
+            base.__name__,
+            (base,),
+            {
+                "_AUTH_URL": self.url + AUTH_PATH,
+                "_CONV_URL": self.url + CONV_PATH,
+            },
+        )
+
+    def __enter__(self) -> "MockServer":
+        ready: multiprocessing.Queue = multiprocessing.Queue()
+        self._process = multiprocessing.Process(
+            target=serve, args=(0, self.config, ready), daemon=True
+        )
+        self._process.start()
+        self.port = ready.get(timeout=10)
+        return self
+
+    def __exit__(self, *args) -> None:
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8080)
+    for field, default in asdict(ServerConfig()).items():
+        parser.add_argument(
+            "--" + field.replace("_", "-"), type=type(default), default=default
+        )
+    args = vars(parser.parse_args())
+    port = args.pop("port")
+    print(f"Serving on http://127.0.0.1:{port}")
+    serve(port, ServerConfig(**args))
+
+
+if __name__ == "__main__":
+    main()
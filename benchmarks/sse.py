@@ -0,0 +1,113 @@
+"""Compares reply parsing with the event-stream parser and the old regex.
+
+Run from the repository root:
+
+    python -m benchmarks.sse --reply-chars 20000 --chunk-size 4096
+"""
+import argparse
+import json
+import re
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+from typing import List
+
+from chatgpt import api
+
+FIXTURE = (
+    Path(__file__).parent.parent / "tests" / "valid_response_test_data.txt"
+)
+
+
+def build_stream(reply_chars: int, chars_per_event: int) -> bytes:
+    """Scales the test fixture up to a reply of `reply_chars` characters.
+
+    As in real streams, every event repeats the whole reply so far.
+    """
+    template = json.loads(FIXTURE.read_text().split("data: ")[-2].strip())
+    text = ("lorem ipsum dolor sit amet " * (reply_chars // 27 + 1))[
+        :reply_chars
+    ]
+    frames = []
+    for end in range(
+        chars_per_event, reply_chars + chars_per_event, chars_per_event
+    ):
+        template["message"]["content"]["parts"] = [text[:end]]
+        frames.append(f"data: {json.dumps(template)}\n\n")
+    frames.append("data: [DONE]\n\n")
+    return "".join(frames).encode()
+
+
+def split(raw: bytes, chunk_size: int) -> List[bytes]:
+    bounds = range(0, len(raw) + chunk_size, chunk_size)
+    return [raw[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def regex_whole_body(chunks: List[bytes]) -> api.Response:
+    """Approach used before the event-stream parser was introduced."""
+    text = b"".join(chunks).decode()
+    resp_data = json.loads(re.findall(r"data: ({.+})\n", text)[-1])
+    return api.Response(
+        id=resp_data["message"]["id"],
+        conversation_id=resp_data["conversation_id"],
+        parent_message_id=resp_data["message"]["id"],
+        content="\n\n".join(resp_data["message"]["content"]["parts"]),
+    )
+
+
+def parser_last_event(chunks: List[bytes]) -> api.Response:
+    reader = api._ReplyReader(snapshots=False)
+    for chunk in chunks:
+        reader.feed(chunk)
+    return reader.close()[-1]
+
+
+def parser_snapshots(chunks: List[bytes]) -> api.Response:
+    reader = api._ReplyReader(snapshots=True)
+    resp = None
+    for chunk in chunks:
+        for resp in reader.feed(chunk):
+            pass
+    for resp in reader.close():
+        pass
+    assert resp is not None
+    return resp
+
+
+def measure(func: Callable, chunks: List[bytes], repeat: int) -> dict:
+    func(chunks)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(chunks)
+    elapsed = (time.perf_counter() - start) / repeat
+    tracemalloc.start()
+    func(chunks)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ms": elapsed * 1000, "peak_kib": peak / 1024}
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--reply-chars", type=int, default=20_000)
+    arg_parser.add_argument("--chars-per-event", type=int, default=20)
+    arg_parser.add_argument("--chunk-size", type=int, default=4096)
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    args = arg_parser.parse_args()
+
+    raw = build_stream(args.reply_chars, args.chars_per_event)
+    chunks = split(raw, args.chunk_size)
+    expected = regex_whole_body(chunks)
+    print(f"stream: {len(raw) / 1024:.0f} KiB in {len(chunks)} chunks")
+    for func in (regex_whole_body, parser_last_event, parser_snapshots):
+        assert func(chunks) == expected
+        result = measure(func, chunks, args.repeat)
+        print(
+            f"{func.__name__:<20} {result['ms']:>10.2f} ms "
+            f"{result['peak_kib']:>10.0f} KiB peak"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,35 @@
-from . import api
-from . import cli
-from . import exceptions
+import importlib
+from typing import Any
 
-__all__ = ("api", "cli", "exceptions")
+__all__ = (
+    "api",
+    "batch",
+    "cache",
+    "cli",
+    "conversation",
+    "documents",
+    "exceptions",
+    "hedge",
+    "limiter",
+    "metrics",
+    "payloads",
+    "pool",
+    "retry",
+    "scheduler",
+    "server",
+    "sse",
+    "stop",
+    "store",
+    "tokens",
+    "transcript",
+    "transport",
+    "tree",
+)
+
+
+def __getattr__(name: str) -> Any:
+    # Submodules are imported on first access, so that importing the CLI
+    # doesn't import the HTTP client
+    if name in __all__:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
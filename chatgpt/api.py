@@ -1,21 +1,66 @@
+import asyncio
+import dataclasses
 import json
-import logging
-import re
+import threading
 import time
 import uuid
+from contextlib import asynccontextmanager
+from contextlib import nullcontext
 from dataclasses import dataclass
 from typing import Any
+from typing import AsyncIterator
+from typing import ContextManager
+from typing import Generator
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Tuple
 from typing import Union
 
 import httpx
 
 from chatgpt import payloads
-from chatgpt.const import LOGGING_DIR
+from chatgpt.cache import ResponseCache
+from chatgpt.cache import SingleFlight
 from chatgpt.const import PACKAGE_GH_URL
+from chatgpt.conversation import AsyncConversation
+from chatgpt.conversation import Conversation
+from chatgpt.exceptions import ConversationNotFoundException
 from chatgpt.exceptions import ForbiddenException
 from chatgpt.exceptions import InvalidResponseException
 from chatgpt.exceptions import StatusCodeException
 from chatgpt.exceptions import UnauthorizedException
+from chatgpt.hedge import _AsyncHedgedReply
+from chatgpt.hedge import _HedgedReply
+from chatgpt.hedge import HedgePolicy
+from chatgpt.limiter import AdaptiveLimiter
+from chatgpt.limiter import LimiterSlot
+from chatgpt.metrics import CallTracker
+from chatgpt.metrics import Hooks
+from chatgpt.retry import CircuitBreaker
+from chatgpt.retry import RetryPolicy
+from chatgpt.scheduler import CancellationToken
+from chatgpt.sse import Event
+from chatgpt.sse import EventStreamParser
+from chatgpt.stop import combine
+from chatgpt.stop import Stop
+from chatgpt.stop import StopCondition
+from chatgpt.store import ConversationStore
+from chatgpt.tokens import _fingerprint
+from chatgpt.tokens import AccessToken
+from chatgpt.tokens import parse_expires
+from chatgpt.tokens import TokenCache
+from chatgpt.transcript import get_default_transcript
+from chatgpt.transcript import Transcript
+from chatgpt.transport import TransportConfig
+from chatgpt.tree import MessageTree
+
+
+# Marks arguments that fall back to a shared default
+_DEFAULT = object()
+# Stands for a call tracker when there are no hooks, or a limiter slot
+# when there is no limiter
+_NOT_TRACKED: ContextManager[None] = nullcontext()
 
 
 @dataclass
@@ -26,10 +71,14 @@ class Response:
     content: str
 
 
-class ChatGPT(httpx.Client):
+class _BaseChatGPT:
+    """State and protocol handling shared by sync and async clients."""
+
     _AUTH_URL = "https://chat.openai.com/api/auth/session"
     _CONV_URL = "https://chat.openai.com/backend-api/conversation"
     _AUTH_COOKIE_NAME = "__Secure-next-auth.session-token"
+    # Access token is refreshed this many seconds before it expires
+    _TOKEN_REFRESH_MARGIN = 60
     _DEFAULT_USER_AGENT = (
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
         "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36"
@@ -41,22 +90,84 @@ class ChatGPT(httpx.Client):
         session_token: str,
         response_timeout: int = 10,
         user_agent: Union[str, None] = None,
+        token_cache: Union[TokenCache, None] = None,
+        retry_policy: Union[RetryPolicy, None] = None,
+        circuit_breaker: Union[CircuitBreaker, None] = None,
+        transcript: Union[Transcript, None, object] = _DEFAULT,
+        response_cache: Union[ResponseCache, None] = None,
+        conversation_store: Union[ConversationStore, None] = None,
+        transport_config: Union[TransportConfig, None] = None,
+        hooks: Union[Hooks, None] = None,
+        single_flight: Union[SingleFlight, None] = None,
+        hedge_policy: Union[HedgePolicy, None] = None,
+        limiter: Union[AdaptiveLimiter, None] = None,
+        message_tree: Union[MessageTree, None] = None,
         **kwargs: Any,
     ) -> None:
+        """Other keyword arguments are passed to the httpx client.
+
+        `transport_config` sets timeouts and connection pool limits, then
+        `response_timeout` is ignored. A `transport` argument, e.g. one
+        shared by many clients, takes precedence over its pool settings.
+        Received replies are recorded in `message_tree`, a new one unless
+        given.
+        """
         self._session_token = session_token
-        self._access_token = None
+        self._access_token: Union[str, None] = None
+        self._access_token_expires_at: Union[float, None] = None
+        self._token_cache = token_cache
+        self._retry_policy = retry_policy
+        self._circuit_breaker = circuit_breaker
+        self._response_cache = response_cache
+        self.conversation_store = conversation_store
+        self._hooks = hooks
+        self._single_flight = single_flight
+        self._hedge_policy = hedge_policy
+        self._limiter = limiter
+        self.message_tree = (
+            message_tree if message_tree is not None else MessageTree()
+        )
+        # Limits and reusable replies are kept per session, without
+        # revealing its token
+        self.limiter_key = _fingerprint(session_token)[:12]
+        self._auth_lock = threading.Lock()
+        self._async_auth_lock: Union[asyncio.Lock, None] = None
         self._conversation_id: Union[str, None] = None
         self._parent_message_id = _generate_uuid()
         self._auth_flag = False
         self._user_agent = user_agent or self._DEFAULT_USER_AGENT
-        self.logger = self.__get_class_logger()
-        kwargs["timeout"] = response_timeout
+        if transcript is _DEFAULT:
+            transcript = get_default_transcript()
+        self.transcript: Union[Transcript, None] = transcript  # type: ignore
+        if transport_config is None:
+            kwargs["timeout"] = response_timeout
+        else:
+            kwargs["timeout"] = transport_config.timeout
+            if "transport" not in kwargs:
+                kwargs["transport"] = self._create_transport(transport_config)
         super().__init__(**kwargs)
 
     @property
     def conversation_id(self) -> Union[str, None]:
         return self._conversation_id
 
+    def _create_transport(self, config: TransportConfig) -> Any:
+        raise NotImplementedError
+
+    def _track(
+        self, operation: str
+    ) -> ContextManager[Union[CallTracker, None]]:
+        """Measures a call if there are hooks to report it to."""
+        if self._hooks is None:
+            return _NOT_TRACKED
+        return CallTracker(self._hooks, operation)
+
+    def _limit(self) -> ContextManager[Union[LimiterSlot, None]]:
+        """Holds a slot of the limiter, if there is one, for a reply."""
+        if self._limiter is None:
+            return _NOT_TRACKED
+        return self._limiter.slot(self.limiter_key)
+
     @property
     def _chatgpt_headers(self) -> dict:
         return {
@@ -66,20 +177,33 @@ class ChatGPT(httpx.Client):
             "User-Agent": self._user_agent,
         }
 
-    def __enter__(self):
-        super().__enter__()
-        self.authenticate()
-        return self
-
-    def __exit__(self, *args, **kwargs):
-        super().__exit__(*args, **kwargs)
+    def new_conversation(self) -> None:
+        """Starts new conversation."""
+        self._conversation_id = None
+        self._parent_message_id = _generate_uuid()
 
-    def authenticate(self) -> None:
-        """Authenticates HTTP session."""
-        self.cookies.set(self._AUTH_COOKIE_NAME, self._session_token)
-        response = self.get(
-            self._AUTH_URL, headers={"User-Agent": self._user_agent}
+    def resume(self, conversation_id: str) -> None:
+        """Continues conversation saved in the conversation store."""
+        self._conversation_id, self._parent_message_id = self._stored_state(
+            conversation_id
         )
+
+    def _fork_state(
+        self, message_id: Union[str, None]
+    ) -> Tuple[Union[str, None], str]:
+        if message_id is None:
+            return self._conversation_id, self._parent_message_id
+        return self.message_tree.conversation_id(message_id), message_id
+
+    def _stored_state(self, conversation_id: str) -> Tuple[str, str]:
+        stored = None
+        if self.conversation_store is not None:
+            stored = self.conversation_store.get(conversation_id)
+        if stored is None:
+            raise ConversationNotFoundException(conversation_id)
+        return stored.id, stored.parent_message_id
+
+    def _handle_auth_response(self, response: httpx.Response) -> None:
         if response.status_code == 403:
             raise ForbiddenException(
                 "Access forbidden. It may indicate that something "
@@ -94,101 +218,769 @@ class ChatGPT(httpx.Client):
                 "Unable to authenticate. Verify if session token is valid."
             )
         try:
-            self._access_token = response.json()["accessToken"]
+            resp_data = response.json()
+            token = AccessToken(
+                resp_data["accessToken"],
+                parse_expires(resp_data.get("expires")),
+            )
         except Exception as e:
             raise InvalidResponseException(response.content) from e
+        if self._token_cache is not None:
+            self._token_cache.set(self._session_token, token)
+        self._use_token(token)
+
+    def _use_cached_token(self) -> bool:
+        """Uses token from the cache if it's still valid."""
+        if self._token_cache is None:
+            return False
+        token = self._token_cache.get(self._session_token)
+        if token is None or token.is_expired(self._TOKEN_REFRESH_MARGIN):
+            return False
+        self._use_token(token)
+        return True
+
+    def _use_token(self, token: AccessToken) -> None:
+        self._access_token = token.value
+        self._access_token_expires_at = token.expires_at
         self._auth_flag = True
 
-    def send_message(self, message: str) -> Response:
-        """Sends message to the chat bot."""
+    def _needs_refresh(self, stale_token: Union[str, None]) -> bool:
+        """Whether token has to be refreshed before the next request.
+
+        `stale_token` is a token rejected by the server, unless another
+        caller has already replaced it, it has to be refreshed.
+        """
+        if stale_token is not None:
+            return stale_token == self._access_token
+        return AccessToken(
+            self._access_token or "", self._access_token_expires_at
+        ).is_expired(self._TOKEN_REFRESH_MARGIN)
+
+    def _drop_cached_token(self) -> None:
+        if self._token_cache is not None:
+            self._token_cache.delete(self._session_token)
+
+    def _check_circuit(self) -> Union[int, None]:
+        if self._circuit_breaker is None:
+            return None
+        return self._circuit_breaker.before_request()
+
+    def _release_trial(self, trial: Union[int, None]) -> None:
+        if trial is not None and self._circuit_breaker is not None:
+            self._circuit_breaker.release_trial(trial)
+
+    def _record_success(self) -> None:
+        if self._circuit_breaker is not None:
+            self._circuit_breaker.record_success()
+
+    def _on_request_error(
+        self,
+        attempt: int,
+        error: Union[Exception, None] = None,
+        response: Union[httpx.Response, None] = None,
+    ) -> Union[float, None]:
+        """Records failed attempt, returns delay before retrying it.
+
+        None means that the error should be raised.
+        """
+        upstream_error = error is not None or (
+            response is not None
+            and (response.status_code == 429 or response.status_code >= 500)
+        )
+        if upstream_error and self._limiter is not None:
+            self._limiter.overload(self.limiter_key)
+        if self._circuit_breaker is not None:
+            if upstream_error:
+                self._circuit_breaker.record_failure()
+            else:
+                self._circuit_breaker.record_success()
+        if self._retry_policy is None:
+            return None
+        return self._retry_policy.delay(
+            attempt, response=response, error=error
+        )
+
+    def _message_payload(
+        self,
+        message: str,
+        conversation_id: Union[str, None],
+        parent_message_id: str,
+    ) -> str:
         if not self._auth_flag:
             raise UnauthorizedException(
                 "In order to send messages you have to authenticate first."
             )
-
-        data = payloads.send_message(
+        return payloads.send_message(
             message,
             id_=_generate_uuid(),
-            conv_id=self._conversation_id,
-            parent_msg_id=self._parent_message_id,
+            conv_id=conversation_id,
+            parent_msg_id=parent_message_id,
         )
-        response = self.post(
-            self._CONV_URL, headers=self._chatgpt_headers, content=data
+
+    def _reply_key(
+        self,
+        message: str,
+        conversation_id: Union[str, None],
+        parent_message_id: str,
+        stop: Union[StopCondition, None] = None,
+    ) -> Union[str, None]:
+        """Returns key under which the reply can be reused, if it can be.
+
+        Replies cut by a stop condition aren't reused.
+        """
+        if stop is not None:
+            return None
+        if self._response_cache is None and self._single_flight is None:
+            return None
+        return payloads.send_message_key(
+            message,
+            conversation_id,
+            parent_message_id,
+            session=self.limiter_key,
         )
 
-        if response.status_code == 401:
-            raise UnauthorizedException()
-        elif response.status_code != 200:
-            raise StatusCodeException(response)
-        resp_matches = re.findall(r"data: ({.+})\n", response.text)
-        if not resp_matches:
-            raise InvalidResponseException(response.text)
-        resp_match = resp_matches[-1]
+    def _cached_response(self, key: Union[str, None]) -> Union[Response, None]:
+        if key is None or self._response_cache is None:
+            return None
+        return self._response_cache.get(key)
 
-        try:
-            resp_data: dict = json.loads(resp_match)
-            resp = Response(
-                id=resp_data["message"]["id"],
-                conversation_id=resp_data["conversation_id"],
-                parent_message_id=resp_data["message"]["id"],
-                content="\n\n".join(resp_data["message"]["content"]["parts"]),
+    def _end_flight(
+        self,
+        key: Union[str, None],
+        resp: Union[Response, None] = None,
+        error: Union[BaseException, None] = None,
+    ) -> None:
+        """Passes outcome of the call to identical requests waiting for it."""
+        if key is not None and self._single_flight is not None:
+            self._single_flight.done(key, resp, error)
+
+    def _finish_message(
+        self,
+        message: str,
+        parent_message_id: str,
+        resp: Union[Response, None],
+        cache_key: Union[str, None] = None,
+    ) -> Response:
+        """Validates, caches, stores and logs the completed reply."""
+        if resp is None:
+            raise InvalidResponseException(
+                "Response doesn't contain any message."
             )
-            self._conversation_id = resp.conversation_id
-            self._parent_message_id = resp.parent_message_id
-            self.logger.info(
-                "",
-                {
-                    "timestamp": f"{time.time()}",
-                    "input": message,
-                    "output": resp.content,
-                    "id": resp.id,
-                    "conversation_id": resp.conversation_id,
-                    "parent_message_id": resp.parent_message_id,
-                },
+        if cache_key is not None and self._response_cache is not None:
+            self._response_cache.set(cache_key, resp)
+        self.message_tree.add(resp.id, parent_message_id, resp.conversation_id)
+        if self.conversation_store is not None:
+            self.conversation_store.save_turn(message, parent_message_id, resp)
+        if self.transcript is not None:
+            self.transcript.record(
+                input=message,
+                output=resp.content,
+                id=resp.id,
+                conversation_id=resp.conversation_id,
+                parent_message_id=resp.parent_message_id,
             )
-            return resp
-        except Exception as e:
-            raise InvalidResponseException(response.text) from e
+        return resp
 
-    def new_conversation(self) -> None:
-        """Starts new conversation."""
-        self._conversation_id = None
-        self._parent_message_id = _generate_uuid()
 
-    @staticmethod
-    def __get_class_logger() -> logging.Logger:
-        class __IOFormatter(logging.Formatter):
-            """Used to specify custom logging keys."""
-
-            def format(self, record):
-                record.timestamp = record.args.get("timestamp")
-                record.input = record.args.get("input")
-                record.output = record.args.get("output")
-                record.id = record.args.get("id")
-                record.conversation_id = record.args.get("conversation_id")
-                record.parent_message_id = record.args.get("parent_message_id")
-                return super().format(record)
-
-        logger = logging.getLogger("ChatGPT")
-        io_json_formatter = __IOFormatter(
-            '{"timestamp":"%(timestamp)s",\
-            "input": "%(input)s", "output": "%(output)s",\
-            "id": "%(id)s", "conversation_id": "%(conversation_id)s",\
-            "parent_message_id": "%(parent_message_id)s"}'
+class ChatGPT(_BaseChatGPT, httpx.Client):
+    def __enter__(self):
+        super().__enter__()
+        self.authenticate()
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        super().__exit__(*args, **kwargs)
+
+    def _create_transport(self, config: TransportConfig) -> Any:
+        return config.create_transport()
+
+    def authenticate(self) -> None:
+        """Authenticates HTTP session.
+
+        A valid access token from the token cache is reused without
+        contacting the server.
+        """
+        if self._use_cached_token():
+            return
+        self._authenticate()
+
+    def _authenticate(self) -> None:
+        with self._track("authenticate") as call:
+            self.cookies.set(self._AUTH_COOKIE_NAME, self._session_token)
+            response = self.get(
+                self._AUTH_URL, headers={"User-Agent": self._user_agent}
+            )
+            if call is not None:
+                call.attempt(response.status_code)
+                call.received(len(response.content))
+            self._handle_auth_response(response)
+
+    def _refresh_token(self, stale_token: Union[str, None] = None) -> None:
+        if not self._needs_refresh(stale_token):
+            return
+        with self._auth_lock:
+            if self._needs_refresh(stale_token):
+                self._drop_cached_token()
+                self._authenticate()
+
+    def send_message(self, message: str, stop: Stop = None) -> Response:
+        """Sends message to the chat bot.
+
+        The reply ends early once one of `stop` conditions matches it.
+        """
+        resp = None
+        for resp in self._converse(message, snapshots=False, stop=stop):
+            pass
+        # _stream raises if no message was received, so resp is set
+        return resp  # type: ignore[return-value]
+
+    def stream_message(
+        self, message: str, stop: Stop = None
+    ) -> Generator[Response, None, None]:
+        """Sends message to the chat bot and yields the reply as it arrives.
+
+        Every yielded `Response` is a snapshot holding the whole reply
+        received so far, the last one is the completed reply. Conversation
+        state is updated only after the reply has been fully received.
+        Closing the generator early aborts the reply.
+        """
+        return self._converse(message, snapshots=True, stop=stop)
+
+    def _converse(
+        self, message: str, snapshots: bool, stop: Stop = None
+    ) -> Generator[Response, None, None]:
+        resp = None
+        for resp in self._stream(
+            message,
+            self._conversation_id,
+            self._parent_message_id,
+            snapshots=snapshots,
+            stop=stop,
+        ):
+            yield resp
+        assert resp is not None
+        self._conversation_id = resp.conversation_id
+        self._parent_message_id = resp.parent_message_id
+
+    def conversation(
+        self,
+        conversation_id: Union[str, None] = None,
+        parent_message_id: Union[str, None] = None,
+    ) -> Conversation:
+        """Creates a conversation handle sharing this client's session."""
+        return Conversation(self, conversation_id, parent_message_id)
+
+    def fork(self, message_id: Union[str, None] = None) -> Conversation:
+        """Creates a conversation handle continuing from a recorded reply.
+
+        Without `message_id` it continues from the latest reply. Raises
+        `MessageNotFoundException` for replies missing in `message_tree`.
+        """
+        return Conversation(self, *self._fork_state(message_id))
+
+    def _stream(
+        self,
+        message: str,
+        conversation_id: Union[str, None],
+        parent_message_id: str,
+        snapshots: bool = True,
+        cancel: Union[CancellationToken, None] = None,
+        stop: Stop = None,
+    ) -> Iterator[Response]:
+        """Yields reply snapshots without touching conversation state.
+
+        Unless `snapshots` is set, only the completed reply is yielded.
+        Cancelling `cancel` closes the reply stream.
+        """
+        if cancel is not None:
+            cancel.raise_if_cancelled()
+        data = self._message_payload(
+            message, conversation_id, parent_message_id
+        )
+        condition = combine(stop)
+        key = self._reply_key(
+            message, conversation_id, parent_message_id, condition
+        )
+        reused = self._cached_response(key)
+        if (
+            reused is None
+            and key is not None
+            and self._single_flight is not None
+        ):
+            reused = self._single_flight.wait(key)
+        if reused is not None:
+            # Recorded like a received reply, without caching it again
+            yield self._finish_message(message, parent_message_id, reused)
+            return
+        try:
+            with self._track("send_message") as call, self._limit() as slot:
+                chunks: Iterable[bytes]
+                reply: Union[_HedgedReply, httpx.Response]
+                if self._hedge_policy is not None:
+                    chunks = reply = _HedgedReply(
+                        self._hedge_policy,
+                        lambda data: self._send_conversation_request(
+                            data, call, cancel
+                        ),
+                        data,
+                        lambda: self._message_payload(
+                            message, conversation_id, parent_message_id
+                        ),
+                        first_byte=snapshots or condition is not None,
+                        on_first_byte=lambda: _first_byte(call, slot),
+                    )
+                else:
+                    reply = self._send_conversation_request(data, call, cancel)
+                    chunks = reply.iter_bytes()
+                reader = _ReplyReader(snapshots, condition)
+                # Closing the response from another thread aborts a read
+                # which is waiting for the next chunk
+                unregister = (
+                    cancel.on_cancel(reply.close)
+                    if cancel is not None
+                    else None
+                )
+                try:
+                    for chunk in chunks:
+                        if cancel is not None:
+                            cancel.raise_if_cancelled()
+                        if call is not None:
+                            call.received(len(chunk))
+                        if slot is not None:
+                            slot.received()
+                        yield from reader.feed(chunk)
+                        if reader.stopped:
+                            break
+                    if cancel is not None:
+                        cancel.raise_if_cancelled()
+                    yield from reader.close()
+                except Exception:
+                    if cancel is not None:
+                        cancel.raise_if_cancelled()
+                    raise
+                finally:
+                    if unregister is not None:
+                        unregister()
+                    reply.close()
+                resp = self._finish_message(
+                    message, parent_message_id, reader.reply, key
+                )
+        except BaseException as e:
+            self._end_flight(key, error=e)
+            raise
+        self._end_flight(key, resp)
+
+    def _request_timeout(self, cancel: Union[CancellationToken, None]) -> Any:
+        """Returns client timeouts, cut to the time left before a deadline."""
+        remaining = cancel.remaining() if cancel is not None else None
+        if remaining is None:
+            return httpx.USE_CLIENT_DEFAULT
+        return httpx.Timeout(
+            **{
+                name: remaining if limit is None else min(limit, remaining)
+                for name, limit in self.timeout.as_dict().items()
+            }
+        )
+
+    def _send_conversation_request(
+        self,
+        data: str,
+        call: Union[CallTracker, None] = None,
+        cancel: Union[CancellationToken, None] = None,
+    ) -> httpx.Response:
+        """Sends message payload, returns the streamed 200 response.
+
+        Refreshes access token on 401, retries failed requests according
+        to the retry policy and reports outcomes to the circuit breaker.
+        Cancelling `cancel` stops retrying, and its deadline bounds the wait
+        for each response.
+        """
+        self._refresh_token()
+        can_refresh = True
+        attempt = 0
+        trial = None
+        try:
+            while True:
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                trial = self._check_circuit()
+                token = self._access_token
+                request = self.build_request(
+                    "POST",
+                    self._CONV_URL,
+                    headers=self._chatgpt_headers,
+                    content=data,
+                    timeout=self._request_timeout(cancel),
+                )
+                try:
+                    response = self.send(request, stream=True)
+                except httpx.TransportError as e:
+                    if call is not None:
+                        call.attempt(None)
+                    if cancel is not None:
+                        # Timed out by the deadline, not by the server
+                        cancel.raise_if_cancelled()
+                    attempt += 1
+                    delay = self._on_request_error(attempt, e)
+                    if delay is None:
+                        raise
+                    _sleep(delay, cancel)
+                    continue
+
+                if call is not None:
+                    call.attempt(response.status_code)
+                if cancel is not None and cancel.cancelled:
+                    response.close()
+                    cancel.raise_if_cancelled()
+                if response.status_code == 200:
+                    self._record_success()
+                    return response
+                response.read()
+                response.close()
+                if response.status_code == 401:
+                    self._record_success()
+                    if can_refresh:
+                        can_refresh = False
+                        self._refresh_token(stale_token=token)
+                        continue
+                    raise UnauthorizedException()
+                attempt += 1
+                delay = self._on_request_error(attempt, response=response)
+                if delay is None:
+                    raise StatusCodeException(response)
+                _sleep(delay, cancel)
+        except BaseException:
+            # A trial ended without an outcome mustn't keep the
+            # circuit open
+            self._release_trial(trial)
+            raise
+
+
+class AsyncChatGPT(_BaseChatGPT, httpx.AsyncClient):
+    async def __aenter__(self):
+        await super().__aenter__()
+        await self.authenticate()
+        return self
+
+    async def __aexit__(self, *args, **kwargs):
+        await super().__aexit__(*args, **kwargs)
+
+    def _create_transport(self, config: TransportConfig) -> Any:
+        return config.create_async_transport()
+
+    async def authenticate(self) -> None:
+        """Authenticates HTTP session.
+
+        A valid access token from the token cache is reused without
+        contacting the server.
+        """
+        if self._use_cached_token():
+            return
+        await self._authenticate()
+
+    async def _authenticate(self) -> None:
+        with self._track("authenticate") as call:
+            self.cookies.set(self._AUTH_COOKIE_NAME, self._session_token)
+            response = await self.get(
+                self._AUTH_URL, headers={"User-Agent": self._user_agent}
+            )
+            if call is not None:
+                call.attempt(response.status_code)
+                call.received(len(response.content))
+            self._handle_auth_response(response)
+
+    async def _refresh_token(
+        self, stale_token: Union[str, None] = None
+    ) -> None:
+        if not self._needs_refresh(stale_token):
+            return
+        # Created lazily, so that the lock binds to the running event loop
+        if self._async_auth_lock is None:
+            self._async_auth_lock = asyncio.Lock()
+        async with self._async_auth_lock:
+            if self._needs_refresh(stale_token):
+                self._drop_cached_token()
+                await self._authenticate()
+
+    async def send_message(self, message: str, stop: Stop = None) -> Response:
+        """Sends message to the chat bot.
+
+        The reply ends early once one of `stop` conditions matches it.
+        """
+        resp = None
+        async for resp in self._converse(message, snapshots=False, stop=stop):
+            pass
+        # _stream raises if no message was received, so resp is set
+        return resp  # type: ignore[return-value]
+
+    def stream_message(
+        self, message: str, stop: Stop = None
+    ) -> AsyncIterator[Response]:
+        """Async counterpart of `ChatGPT.stream_message`."""
+        return self._converse(message, snapshots=True, stop=stop)
+
+    async def _converse(
+        self, message: str, snapshots: bool, stop: Stop = None
+    ) -> AsyncIterator[Response]:
+        resp = None
+        async for resp in self._stream(
+            message,
+            self._conversation_id,
+            self._parent_message_id,
+            snapshots=snapshots,
+            stop=stop,
+        ):
+            yield resp
+        assert resp is not None
+        self._conversation_id = resp.conversation_id
+        self._parent_message_id = resp.parent_message_id
+
+    def conversation(
+        self,
+        conversation_id: Union[str, None] = None,
+        parent_message_id: Union[str, None] = None,
+    ) -> AsyncConversation:
+        """Creates a conversation handle sharing this client's session."""
+        return AsyncConversation(self, conversation_id, parent_message_id)
+
+    def fork(self, message_id: Union[str, None] = None) -> AsyncConversation:
+        """Async counterpart of `ChatGPT.fork`."""
+        return AsyncConversation(self, *self._fork_state(message_id))
+
+    @asynccontextmanager
+    async def _limit_async(self) -> AsyncIterator[Union[LimiterSlot, None]]:
+        """Async counterpart of `_limit`."""
+        if self._limiter is None:
+            yield None
+            return
+        async with self._limiter.slot_async(self.limiter_key) as slot:
+            yield slot
+
+    async def _stream(
+        self,
+        message: str,
+        conversation_id: Union[str, None],
+        parent_message_id: str,
+        snapshots: bool = True,
+        stop: Stop = None,
+    ) -> AsyncIterator[Response]:
+        """Yields reply snapshots without touching conversation state.
+
+        Unless `snapshots` is set, only the completed reply is yielded.
+        """
+        data = self._message_payload(
+            message, conversation_id, parent_message_id
         )
-        time_tuple = time.localtime(time.time())
-        time_string = time.strftime("%H:%M:%S", time_tuple)
-        if not LOGGING_DIR.exists():
-            LOGGING_DIR.mkdir(parents=True, exist_ok=True)
-        logging_path = LOGGING_DIR / f"chatgpt_logs_{time_string}.log"
-        file_handler = logging.FileHandler(
-            filename=str(logging_path), mode="w"
+        condition = combine(stop)
+        key = self._reply_key(
+            message, conversation_id, parent_message_id, condition
         )
-        file_handler.setFormatter(io_json_formatter)
-        logger.addHandler(file_handler)
-        logger.setLevel(level=logging.DEBUG)
-        return logger
+        reused = self._cached_response(key)
+        if (
+            reused is None
+            and key is not None
+            and self._single_flight is not None
+        ):
+            reused = await self._single_flight.wait_async(key)
+        if reused is not None:
+            # Recorded like a received reply, without caching it again
+            yield self._finish_message(message, parent_message_id, reused)
+            return
+        try:
+            with self._track("send_message") as call:
+                async with self._limit_async() as slot:
+                    chunks: AsyncIterator[bytes]
+                    response = None
+                    if self._hedge_policy is not None:
+                        chunks = _AsyncHedgedReply(
+                            self._hedge_policy,
+                            lambda data: self._send_conversation_request(
+                                data, call
+                            ),
+                            data,
+                            lambda: self._message_payload(
+                                message, conversation_id, parent_message_id
+                            ),
+                            first_byte=snapshots or condition is not None,
+                            on_first_byte=lambda: _first_byte(call, slot),
+                        ).chunks()
+                    else:
+                        response = await self._send_conversation_request(
+                            data, call
+                        )
+                        chunks = response.aiter_bytes()
+                    reader = _ReplyReader(snapshots, condition)
+                    try:
+                        async for chunk in chunks:
+                            if call is not None:
+                                call.received(len(chunk))
+                            if slot is not None:
+                                slot.received()
+                            for resp in reader.feed(chunk):
+                                yield resp
+                            if reader.stopped:
+                                break
+                        for resp in reader.close():
+                            yield resp
+                    finally:
+                        if response is not None:
+                            await response.aclose()
+                        else:
+                            await chunks.aclose()  # type: ignore[attr-defined]
+                    resp = self._finish_message(
+                        message, parent_message_id, reader.reply, key
+                    )
+        except BaseException as e:
+            self._end_flight(key, error=e)
+            raise
+        self._end_flight(key, resp)
+
+    async def _send_conversation_request(
+        self, data: str, call: Union[CallTracker, None] = None
+    ) -> httpx.Response:
+        """Async counterpart of `ChatGPT._send_conversation_request`."""
+        await self._refresh_token()
+        can_refresh = True
+        attempt = 0
+        trial = None
+        try:
+            while True:
+                trial = self._check_circuit()
+                token = self._access_token
+                request = self.build_request(
+                    "POST",
+                    self._CONV_URL,
+                    headers=self._chatgpt_headers,
+                    content=data,
+                )
+                try:
+                    response = await self.send(request, stream=True)
+                except httpx.TransportError as e:
+                    if call is not None:
+                        call.attempt(None)
+                    attempt += 1
+                    delay = self._on_request_error(attempt, e)
+                    if delay is None:
+                        raise
+                    await asyncio.sleep(delay)
+                    continue
+
+                if call is not None:
+                    call.attempt(response.status_code)
+                if response.status_code == 200:
+                    self._record_success()
+                    return response
+                await response.aread()
+                await response.aclose()
+                if response.status_code == 401:
+                    self._record_success()
+                    if can_refresh:
+                        can_refresh = False
+                        await self._refresh_token(stale_token=token)
+                        continue
+                    raise UnauthorizedException()
+                attempt += 1
+                delay = self._on_request_error(attempt, response=response)
+                if delay is None:
+                    raise StatusCodeException(response)
+                await asyncio.sleep(delay)
+        except BaseException:
+            # A trial ended without an outcome mustn't keep the
+            # circuit open
+            self._release_trial(trial)
+            raise
+
+
+def _first_byte(
+    call: Union[CallTracker, None], slot: Union[LimiterSlot, None]
+) -> None:
+    """Reports first byte of a hedged reply, before its winner is known."""
+    if call is not None:
+        call.received(0)
+    if slot is not None:
+        slot.received()
+
+
+def _sleep(seconds: float, cancel: Union[CancellationToken, None]) -> None:
+    """Waits before a retry, unless the request is cancelled meanwhile."""
+    if cancel is None:
+        time.sleep(seconds)
+    else:
+        cancel.sleep(seconds)
 
 
 def _generate_uuid() -> str:
     return str(uuid.uuid4())
+
+
+class _ReplyReader:
+    """Turns event-stream chunks into reply snapshots.
+
+    Every event repeats the whole reply so far, so unless `snapshots` is
+    set only the last one is decoded, once the stream is closed. With a
+    `stop` condition every one is decoded, the reader stops at the first
+    match and cuts the reply.
+    """
+
+    def __init__(
+        self, snapshots: bool, stop: Union[StopCondition, None] = None
+    ) -> None:
+        self._parser = EventStreamParser()
+        self._snapshots = snapshots
+        self._stop = stop
+        self._last_data: Union[bytes, None] = None
+        self.reply: Union[Response, None] = None
+        self.stopped = False
+
+    def feed(self, chunk: bytes) -> List[Response]:
+        return self._read(self._parser.feed(chunk))
+
+    def close(self) -> List[Response]:
+        replies = [] if self.stopped else self._read(self._parser.close())
+        if not self._snapshots:
+            if self._last_data is not None:
+                self.reply = _parse_message_data(self._last_data)
+            if self.reply is not None:
+                replies.append(self.reply)
+        return replies
+
+    def _read(self, events: List[Event]) -> List[Response]:
+        replies: List[Response] = []
+        for event in events:
+            # Skips [DONE] and anything else that isn't a message
+            if self.stopped or not event.data.startswith(b"{"):
+                continue
+            if self._stop is not None:
+                self.reply = self._check_stop(_parse_message_data(event.data))
+            elif self._snapshots:
+                self.reply = _parse_message_data(event.data)
+            else:
+                self._last_data = event.data
+                continue
+            if self._snapshots:
+                replies.append(self.reply)
+        return replies
+
+    def _check_stop(self, reply: Response) -> Response:
+        assert self._stop is not None
+        end = self._stop(reply.content)
+        if end is None:
+            return reply
+        self.stopped = True
+        return dataclasses.replace(reply, content=reply.content[:end])
+
+
+def _parse_message_data(data: bytes) -> Response:
+    """Builds `Response` from the JSON payload of a single event."""
+    try:
+        resp_data: dict = json.loads(data)
+        return Response(
+            id=resp_data["message"]["id"],
+            conversation_id=resp_data["conversation_id"],
+            parent_message_id=resp_data["message"]["id"],
+            content="\n\n".join(resp_data["message"]["content"]["parts"]),
+        )
+    except Exception as e:
+        raise InvalidResponseException(
+            data.decode("utf-8", errors="replace")
+        ) from e
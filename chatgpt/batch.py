@@ -0,0 +1,261 @@
+import asyncio
+import collections
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from dataclasses import dataclass
+from typing import Any
+from typing import AsyncIterator
+from typing import Deque
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Set
+from typing import Tuple
+from typing import TYPE_CHECKING
+from typing import Union
+
+if TYPE_CHECKING:  # pragma: no cover
+    from chatgpt.api import AsyncChatGPT
+    from chatgpt.api import ChatGPT
+    from chatgpt.api import Response
+
+
+BatchItem = Union[str, Tuple[Any, str]]
+
+
+@dataclass
+class BatchResult:
+    index: int
+    prompt: str
+    conversation: Any
+    response: Union["Response", None] = None
+    error: Union[Exception, None] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class RateLimiter:
+    """Spaces requests evenly to stay within a requests-per-minute budget.
+
+    Shared by threads and tasks, every caller reserves the next free slot.
+    """
+
+    def __init__(self, requests_per_minute: float) -> None:
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive.")
+        self._interval = 60.0 / requests_per_minute
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Reserves a slot, returns how long the caller has to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._interval
+            return slot - now
+
+    def acquire(self) -> None:
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class _BatchState:
+    """Bookkeeping shared by the thread pool and asyncio runners.
+
+    Items sharing a conversation are started one after another in input
+    order, the others run as soon as there is a free slot. Results are
+    released either as they complete or in input order.
+
+    Callers stop pulling items while too many are waiting or held back.
+    The earliest unreleased item is always running, so the batch still
+    makes progress.
+    """
+
+    def __init__(self, items: Iterable[BatchItem], ordered: bool) -> None:
+        self._items = enumerate(items)
+        self._exhausted = False
+        self._ordered = ordered
+        # conversation id -> items waiting for the conversation to be free
+        self._waiting: Dict[int, Deque[Tuple[int, Any, str]]] = {}
+        self._waiting_count = 0
+        self._finished: Dict[int, BatchResult] = {}
+        self._next_index = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self._exhausted
+
+    @property
+    def waiting_count(self) -> int:
+        return self._waiting_count
+
+    @property
+    def held_count(self) -> int:
+        """Finished results held back until earlier ones are released."""
+        return len(self._finished)
+
+    def next_ready(
+        self, new_conversation
+    ) -> Union[Tuple[int, Any, str], None]:
+        """Pulls the next input item, returns it if it can be started.
+
+        An item whose conversation is busy is queued and None is returned,
+        so callers can bound the number of waiting items.
+        """
+        for index, item in self._items:
+            if isinstance(item, str):
+                return index, new_conversation(), item
+            conversation, prompt = item
+            key = id(conversation)
+            if key in self._waiting:
+                self._waiting[key].append((index, conversation, prompt))
+                self._waiting_count += 1
+                return None
+            self._waiting[key] = collections.deque()
+            return index, conversation, prompt
+        self._exhausted = True
+        return None
+
+    def complete(
+        self, result: BatchResult
+    ) -> Tuple[List[BatchResult], Union[Tuple[int, Any, str], None]]:
+        """Returns results to release and the item unblocked by this one."""
+        unblocked = None
+        key = id(result.conversation)
+        queue = self._waiting.get(key)
+        if queue is not None:
+            if queue:
+                unblocked = queue.popleft()
+                self._waiting_count -= 1
+            else:
+                del self._waiting[key]
+
+        if not self._ordered:
+            return [result], unblocked
+        self._finished[result.index] = result
+        released = []
+        while self._next_index in self._finished:
+            released.append(self._finished.pop(self._next_index))
+            self._next_index += 1
+        return released, unblocked
+
+
+def send_many(
+    client: "ChatGPT",
+    items: Iterable[BatchItem],
+    *,
+    concurrency: int = 4,
+    requests_per_minute: Union[float, None] = None,
+    ordered: bool = False,
+) -> Iterator[BatchResult]:
+    """Sends many messages concurrently using a thread pool.
+
+    Items are either prompts, each sent in a new conversation, or
+    `(conversation, prompt)` pairs. Results are yielded as they complete,
+    or in input order when `ordered` is set. Failures are reported in
+    `BatchResult.error` and don't stop the batch.
+    """
+    limiter = RateLimiter(requests_per_minute) if requests_per_minute else None
+
+    def run(index: int, conversation: Any, prompt: str) -> BatchResult:
+        result = BatchResult(index, prompt, conversation)
+        try:
+            if limiter is not None:
+                limiter.acquire()
+            result.response = conversation.send_message(prompt)
+        except Exception as e:
+            result.error = e
+        return result
+
+    state = _BatchState(items, ordered)
+    running: Set[Future] = set()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        while True:
+            # Waiting and held back items are bounded too, so input is
+            # consumed lazily
+            while (
+                not state.exhausted
+                and len(running) < concurrency
+                and state.waiting_count < concurrency
+                and state.held_count < concurrency
+            ):
+                item = state.next_ready(client.conversation)
+                if item is not None:
+                    running.add(executor.submit(run, *item))
+            if not running:
+                return
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                released, unblocked = state.complete(future.result())
+                if unblocked is not None:
+                    running.add(executor.submit(run, *unblocked))
+                yield from released
+    finally:
+        for future in running:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+async def async_send_many(
+    client: "AsyncChatGPT",
+    items: Iterable[BatchItem],
+    *,
+    concurrency: int = 4,
+    requests_per_minute: Union[float, None] = None,
+    ordered: bool = False,
+) -> AsyncIterator[BatchResult]:
+    """Async counterpart of `send_many` running on the event loop."""
+    limiter = RateLimiter(requests_per_minute) if requests_per_minute else None
+
+    async def run(index: int, conversation: Any, prompt: str) -> BatchResult:
+        result = BatchResult(index, prompt, conversation)
+        try:
+            if limiter is not None:
+                await limiter.acquire_async()
+            result.response = await conversation.send_message(prompt)
+        except Exception as e:
+            result.error = e
+        return result
+
+    state = _BatchState(items, ordered)
+    running: Set[asyncio.Task] = set()
+    try:
+        while True:
+            while (
+                not state.exhausted
+                and len(running) < concurrency
+                and state.waiting_count < concurrency
+                and state.held_count < concurrency
+            ):
+                item = state.next_ready(client.conversation)
+                if item is not None:
+                    running.add(asyncio.ensure_future(run(*item)))
+            if not running:
+                return
+            done, running = await asyncio.wait(
+                running, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                released, unblocked = state.complete(task.result())
+                if unblocked is not None:
+                    running.add(asyncio.ensure_future(run(*unblocked)))
+                for result in released:
+                    yield result
+    finally:
+        for task in running:
+            task.cancel()
@@ -0,0 +1,283 @@
+import asyncio
+import collections
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict
+from typing import Tuple
+from typing import TYPE_CHECKING
+from typing import Union
+
+from chatgpt.exceptions import CancelledException
+
+if TYPE_CHECKING:  # pragma: no cover
+    from chatgpt.api import Response
+
+
+class ResponseCache:
+    """Stores replies keyed by `payloads.send_message_key`.
+
+    Entries older than `ttl` seconds are treated as missing, the least
+    recently used entries are evicted above `maxsize` entries.
+    """
+
+    def __init__(
+        self, maxsize: int = 1024, ttl: Union[float, None] = None
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str) -> Union["Response", None]:
+        response = self._get(key)
+        with self._stats_lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response
+
+    def set(self, key: str, response: "Response") -> None:
+        self._set(key, response)
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def _get(self, key: str) -> Union["Response", None]:
+        raise NotImplementedError
+
+    def _set(self, key: str, response: "Response") -> None:
+        raise NotImplementedError
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+
+class LRUCache(ResponseCache):
+    """In-memory cache."""
+
+    def __init__(
+        self, maxsize: int = 1024, ttl: Union[float, None] = None
+    ) -> None:
+        super().__init__(maxsize, ttl)
+        self._entries: "collections.OrderedDict[str, Tuple[float, Response]]"
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _get(self, key: str) -> Union["Response", None]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created_at, response = entry
+            if self._is_expired(created_at):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def _set(self, key: str, response: "Response") -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+class SQLiteCache(ResponseCache):
+    """On-disk cache, can be shared by processes using the same file."""
+
+    def __init__(
+        self,
+        path: Union[Path, str],
+        maxsize: int = 100_000,
+        ttl: Union[float, None] = None,
+    ) -> None:
+        super().__init__(maxsize, ttl)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            str(path), check_same_thread=False, isolation_level=None
+        )
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                id TEXT NOT NULL,
+                conversation_id TEXT NOT NULL,
+                parent_message_id TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_accessed_at
+                ON responses (accessed_at);
+            """
+        )
+        self._size = self._count()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._count()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._size = 0
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def _get(self, key: str) -> Union["Response", None]:
+        from chatgpt.api import Response
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, conversation_id, parent_message_id, content, "
+                "created_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            if self._is_expired(row[4]):
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._size -= 1
+                return None
+            self._db.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                (time.time(), key),
+            )
+        return Response(*row[:4])
+
+    def _set(self, key: str, response: "Response") -> None:
+        now = time.time()
+        row = (
+            response.id,
+            response.conversation_id,
+            response.parent_message_id,
+            response.content,
+            now,
+            now,
+            key,
+        )
+        with self._lock:
+            updated = self._db.execute(
+                "UPDATE responses SET id = ?, conversation_id = ?, "
+                "parent_message_id = ?, content = ?, created_at = ?, "
+                "accessed_at = ? WHERE key = ?",
+                row,
+            ).rowcount
+            if updated:
+                return
+            self._db.execute(
+                "INSERT INTO responses (id, conversation_id, "
+                "parent_message_id, content, created_at, accessed_at, key) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            self._size += 1
+            if self._size > self.maxsize:
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM "
+                    "responses ORDER BY accessed_at LIMIT ?)",
+                    (self._size - self.maxsize,),
+                )
+                self._size = self.maxsize
+
+
+class _Abandoned(Exception):
+    """The call ended without a reply or an error to share."""
+
+
+# `asyncio.CancelledError` is an `Exception` before Python 3.8
+_ABANDONED = (CancelledException, asyncio.CancelledError)
+
+
+class SingleFlight:
+    """Lets concurrent identical requests share one upstream call.
+
+    The first request for a key is sent, the others wait for it and get
+    the same `Response`, or the same exception. If it's abandoned, e.g.
+    its stream is closed early or it's cancelled, one of the waiting
+    requests is sent instead. Can be shared by threads, event loops and
+    clients.
+    """
+
+    def __init__(self) -> None:
+        # Requests answered with the reply of another one
+        self.shared = 0
+        self._flights: "Dict[str, Future[Response]]" = {}
+        self._lock = threading.Lock()
+
+    def wait(self, key: str) -> Union["Response", None]:
+        """Returns reply of an identical call in flight.
+
+        None means there is no such call, then the caller makes it and
+        reports the outcome with `done`.
+        """
+        while True:
+            flight = self._join(key)
+            if flight is None:
+                return None
+            try:
+                response = flight.result()
+            except _Abandoned:
+                continue
+            self._count_shared()
+            return response
+
+    async def wait_async(self, key: str) -> Union["Response", None]:
+        """Async counterpart of `wait`."""
+        while True:
+            flight = self._join(key)
+            if flight is None:
+                return None
+            try:
+                # Shielded, so that a cancelled waiter doesn't cancel the
+                # flight for the others
+                response = await asyncio.shield(asyncio.wrap_future(flight))
+            except _Abandoned:
+                continue
+            self._count_shared()
+            return response
+
+    def done(
+        self,
+        key: str,
+        response: Union["Response", None] = None,
+        error: Union[BaseException, None] = None,
+    ) -> None:
+        with self._lock:
+            flight = self._flights.pop(key)
+        if error is None:
+            flight.set_result(response)  # type: ignore[arg-type]
+        elif isinstance(error, _ABANDONED) or not isinstance(error, Exception):
+            # The caller gave up, the waiters haven't
+            flight.set_exception(_Abandoned())
+        else:
+            flight.set_exception(error)
+
+    def _join(self, key: str) -> "Union[Future[Response], None]":
+        """Returns call in flight, or None after starting a new one."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                self._flights[key] = Future()
+            return flight
+
+    def _count_shared(self) -> None:
+        with self._lock:
+            self.shared += 1
@@ -1,20 +1,39 @@
+import json
+import sys
+import time
+from contextlib import closing
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Generator
+from typing import Iterator
+from typing import List
+from typing import Set
+from typing import TextIO
+from typing import Tuple
+from typing import TYPE_CHECKING
 from typing import Union
 
-import httpx
 import typer
 from rich.console import Console
-from rich.markdown import Markdown
-from rich.panel import Panel
 
 from chatgpt import exceptions
-from chatgpt.api import ChatGPT
 from chatgpt.const import PACKAGE_GH_URL
 
+if TYPE_CHECKING:  # pragma: no cover
+    from chatgpt.api import ChatGPT
+    from chatgpt.api import Response
+
+# The HTTP stack and rendering modules are imported by commands which use
+# them, so that CLI startup doesn't pay for them.
 
 CHATGPT_DIR = Path.home() / ".chatgpt_api"
 SESSION_KEY_FILE = CHATGPT_DIR / "key.txt"
 
+# Cap on how often a streamed reply is re-rendered
+REFRESH_PER_SECOND = 10
+
 app = typer.Typer()
 console = Console()
 err_console = Console(stderr=True)
@@ -42,8 +61,22 @@ def setup():
 
 
 @app.command()
-def start(response_timeout: int = 20, user_agent: Union[str, None] = None):
+def start(
+    response_timeout: int = 20,
+    user_agent: Union[str, None] = None,
+    token_cache: bool = True,
+    max_retries: int = 3,
+    resume: Union[str, None] = typer.Option(
+        None, help="Id of a saved conversation to continue."
+    ),
+    history: bool = typer.Option(
+        True, help="Save conversations, so that they can be resumed."
+    ),
+):
     """Start chatting at ChatGPT."""
+    import httpx
+    from rich.panel import Panel
+
     try:
         session_key = SESSION_KEY_FILE.read_text()
     except FileNotFoundError:
@@ -53,12 +86,24 @@ def start(response_timeout: int = 20, user_agent: Union[str, None] = None):
         return
     _auth_progress = console.status("[bold green]Authenticating...")
     _auth_progress.start()
-    with ChatGPT(
-        session_token=session_key,
-        response_timeout=response_timeout,
-        user_agent=user_agent,
+    with _create_client(
+        session_key,
+        response_timeout,
+        user_agent,
+        token_cache,
+        max_retries,
+        history=history or resume is not None,
     ) as chat:
         _auth_progress.stop()
+        if resume is not None:
+            try:
+                chat.resume(resume)
+            except exceptions.ConversationNotFoundException:
+                err_console.print(
+                    f"[bold red]Conversation {resume} not found. "
+                    "Use `chatgpt history` command to list conversations."
+                )
+                return
         console.print(
             Panel(
                 "You are starting a conversation.\n"
@@ -81,8 +126,10 @@ def start(response_timeout: int = 20, user_agent: Union[str, None] = None):
                 console.print("[bold green]Bye!")
                 break
             try:
-                with console.status("[bold green]Waiting for response..."):
-                    response = chat.send_message(message)
+                _render_reply(chat.stream_message(message))
+            except KeyboardInterrupt:
+                console.print("[bold yellow]Response cancelled.")
+                continue
             except exceptions.UnauthorizedException:
                 err_console.print(
                     "[bold red]Unauthorized. Probably your session "
@@ -98,4 +145,333 @@ def start(response_timeout: int = 20, user_agent: Union[str, None] = None):
                     "argument.\nIf it won't help, try again later."
                 )
                 continue
-            console.print(Panel(Markdown(response.content)))
+            except exceptions.StatusCodeException as e:
+                err_console.print(
+                    f"[bold red]ChatGPT responded with status {e.status_code}."
+                    " Try again later."
+                )
+                continue
+
+
+@app.command()
+def batch(
+    input_file: Path = typer.Argument(
+        "-", help="JSONL file with prompts, `-` reads from stdin."
+    ),
+    concurrency: int = 4,
+    requests_per_minute: Union[float, None] = None,
+    checkpoint: Union[Path, None] = typer.Option(
+        None, help="File recording progress, used to resume the run."
+    ),
+    response_timeout: int = 60,
+    user_agent: Union[str, None] = None,
+    token_cache: bool = True,
+    max_retries: int = 3,
+):
+    """Send prompts from a JSONL file, write replies as JSONL to stdout.
+
+    Every input line is an object with `prompt` and optional `id` and
+    `conversation` key. Prompts with the same conversation key are sent
+    one after another in one conversation, the others in new ones.
+    """
+    from chatgpt.batch import send_many
+
+    try:
+        session_key = SESSION_KEY_FILE.read_text()
+    except FileNotFoundError:
+        err_console.print(
+            "[red bold]Config file doesn't exist. Use `chatgpt setup` command."
+        )
+        raise typer.Exit(1)
+
+    done, states = _read_checkpoint(checkpoint)
+    failed = 0
+    with _create_client(
+        session_key, response_timeout, user_agent, token_cache, max_retries
+    ) as chat, _open_checkpoint(checkpoint) as checkpoint_file:
+        conversations = {
+            key: chat.conversation(*state) for key, state in states.items()
+        }
+        # Input line number and entry of items passed to send_many, by
+        # their index, until their result is written
+        pending: Dict[int, Tuple[int, dict]] = {}
+        passed = 0
+
+        def items() -> Iterator[Any]:
+            nonlocal failed, passed
+            source = sys.stdin if str(input_file) == "-" else input_file.open()
+            with source:
+                for line_no, line in enumerate(source):
+                    if line_no in done or not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                        prompt = entry["prompt"]
+                    except (ValueError, TypeError, KeyError):
+                        failed += 1
+                        _write_jsonl(
+                            sys.stdout,
+                            {"line": line_no, "error": "Invalid input line."},
+                        )
+                        continue
+                    pending[passed] = (line_no, entry)
+                    passed += 1
+                    key = entry.get("conversation")
+                    if key is None:
+                        yield prompt
+                        continue
+                    if key not in conversations:
+                        conversations[key] = chat.conversation()
+                    yield conversations[key], prompt
+
+        for result in send_many(
+            chat,
+            items(),
+            concurrency=concurrency,
+            requests_per_minute=requests_per_minute,
+        ):
+            line_no, entry = pending.pop(result.index)
+            record = {
+                "line": line_no,
+                "id": entry.get("id"),
+                "conversation": entry.get("conversation"),
+                "prompt": result.prompt,
+            }
+            if result.response is None:
+                failed += 1
+                record["error"] = repr(result.error)
+                _write_jsonl(sys.stdout, record)
+                continue
+            record["response"] = result.response.content
+            record["conversation_id"] = result.response.conversation_id
+            record["message_id"] = result.response.id
+            _write_jsonl(sys.stdout, record)
+            if checkpoint_file is not None:
+                _write_jsonl(
+                    checkpoint_file,
+                    {
+                        "line": line_no,
+                        "conversation": entry.get("conversation"),
+                        "conversation_id": result.response.conversation_id,
+                        "parent_message_id": result.response.id,
+                    },
+                )
+    if failed:
+        err_console.print(f"[bold red]{failed} prompt(s) failed.")
+        raise typer.Exit(1)
+
+
+@app.command()
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    concurrency: int = typer.Option(
+        8, help="Maximum number of replies generated at once."
+    ),
+    max_queue: int = typer.Option(
+        64, help="Requests waiting for a slot, beyond that they get 429."
+    ),
+    queue_timeout: float = 30.0,
+    cache_size: int = typer.Option(
+        1024, help="Replies kept in the response cache, 0 disables it."
+    ),
+    response_timeout: int = 60,
+    user_agent: Union[str, None] = None,
+    token_cache: bool = True,
+    max_retries: int = 3,
+    session_key_file: List[Path] = typer.Option(
+        [],
+        help="File with a session key, repeat it to spread load over "
+        "several accounts. Defaults to the key saved by `chatgpt setup`.",
+    ),
+):
+    """Serve an OpenAI-compatible chat completions API.
+
+    All callers share the authenticated sessions and connection pool.
+    """
+    from chatgpt.cache import LRUCache
+    from chatgpt.retry import CircuitBreaker
+    from chatgpt.server import COMPLETIONS_PATH
+    from chatgpt.server import serve as serve_completions
+
+    response_cache = LRUCache(cache_size) if cache_size else None
+    client: Any
+    if session_key_file:
+        from chatgpt.pool import SessionPool
+
+        client = SessionPool(
+            [path.read_text().strip() for path in session_key_file],
+            response_cache=response_cache,
+            **_client_kwargs(
+                response_timeout, user_agent, token_cache, max_retries
+            ),
+        )
+    else:
+        try:
+            session_key = SESSION_KEY_FILE.read_text()
+        except FileNotFoundError:
+            err_console.print(
+                "[red bold]Config file doesn't exist. "
+                "Use `chatgpt setup` command."
+            )
+            raise typer.Exit(1)
+        client = _create_client(
+            session_key,
+            response_timeout,
+            user_agent,
+            token_cache,
+            max_retries,
+            response_cache=response_cache,
+            circuit_breaker=CircuitBreaker(),
+        )
+    with client as chat:
+        console.print(
+            f"[bold green]Serving on http://{host}:{port}{COMPLETIONS_PATH}"
+        )
+        try:
+            serve_completions(
+                chat, host, port, concurrency, max_queue, queue_timeout
+            )
+        except KeyboardInterrupt:
+            console.print("[bold green]Bye!")
+
+
+@app.command("history")
+def history_(
+    query: Union[str, None] = typer.Argument(
+        None, help="Show only conversations containing these words."
+    ),
+    limit: int = 20,
+):
+    """List saved conversations, the most recent first."""
+    from rich.table import Table
+
+    from chatgpt.store import SQLiteConversationStore
+
+    store = SQLiteConversationStore()
+    try:
+        if query is None:
+            conversations = store.list_conversations(limit)
+        else:
+            conversations = store.search(query, limit)
+    finally:
+        store.close()
+    if not conversations:
+        console.print("No conversations found.")
+        return
+    table = Table("Id", "Title", "Updated")
+    for conversation in conversations:
+        table.add_row(
+            conversation.id,
+            conversation.title,
+            time.strftime(
+                "%Y-%m-%d %H:%M", time.localtime(conversation.updated_at)
+            ),
+        )
+    console.print(table)
+    console.print("Continue a conversation with `chatgpt start --resume ID`.")
+
+
+def _create_client(
+    session_key: str,
+    response_timeout: int,
+    user_agent: Union[str, None],
+    token_cache: bool,
+    max_retries: int,
+    history: bool = False,
+    **kwargs: Any,
+) -> "ChatGPT":
+    from chatgpt.api import ChatGPT
+
+    return ChatGPT(
+        session_token=session_key,
+        **_client_kwargs(
+            response_timeout, user_agent, token_cache, max_retries, history
+        ),
+        **kwargs,
+    )
+
+
+def _client_kwargs(
+    response_timeout: int,
+    user_agent: Union[str, None],
+    token_cache: bool,
+    max_retries: int,
+    history: bool = False,
+) -> Dict[str, Any]:
+    from chatgpt.retry import RetryPolicy
+    from chatgpt.store import SQLiteConversationStore
+    from chatgpt.tokens import FileTokenCache
+
+    return {
+        "response_timeout": response_timeout,
+        "user_agent": user_agent,
+        "token_cache": FileTokenCache() if token_cache else None,
+        "retry_policy": RetryPolicy(max_attempts=max_retries + 1),
+        "conversation_store": SQLiteConversationStore() if history else None,
+    }
+
+
+def _read_checkpoint(
+    path: Union[Path, None]
+) -> Tuple[Set[int], Dict[str, Tuple[str, str]]]:
+    """Returns completed input lines and last state of every conversation."""
+    done: Set[int] = set()
+    states: Dict[str, Tuple[str, str]] = {}
+    if path is None or not path.exists():
+        return done, states
+    with path.open() as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # The last line may be cut short by a crash
+                continue
+            done.add(entry["line"])
+            if entry.get("conversation") is not None:
+                states[entry["conversation"]] = (
+                    entry["conversation_id"],
+                    entry["parent_message_id"],
+                )
+    return done, states
+
+
+@contextmanager
+def _open_checkpoint(path: Union[Path, None]) -> Iterator[Union[TextIO, None]]:
+    if path is None:
+        yield None
+        return
+    with path.open("a") as f:
+        yield f
+
+
+def _write_jsonl(file: TextIO, record: dict) -> None:
+    file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    file.flush()
+
+
+def _render_reply(stream: Generator["Response", None, None]) -> None:
+    """Renders reply as it arrives, re-rendering markdown at a capped rate.
+
+    Ctrl+C stops the stream and closes its connection.
+    """
+    from rich.live import Live
+    from rich.markdown import Markdown
+    from rich.panel import Panel
+    from rich.spinner import Spinner
+
+    frame_time = 1 / REFRESH_PER_SECOND
+    with closing(stream), Live(
+        Spinner("dots", "[bold green]Waiting for response..."),
+        console=console,
+        refresh_per_second=REFRESH_PER_SECOND,
+    ) as live:
+        response = None
+        rendered_at = 0.0
+        for response in stream:
+            now = time.monotonic()
+            if now - rendered_at >= frame_time:
+                live.update(Panel(Markdown(response.content)))
+                rendered_at = now
+        if response is not None:
+            live.update(Panel(Markdown(response.content)), refresh=True)
@@ -2,3 +2,5 @@ from pathlib import Path
 
 PACKAGE_GH_URL = "https://github.com/mbroton/chatgpt-api"
 LOGGING_DIR = Path.home() / ".chatgpt_api" / "logs"
+TOKEN_CACHE_FILE = Path.home() / ".chatgpt_api" / "tokens.json"
+CONVERSATION_STORE_FILE = Path.home() / ".chatgpt_api" / "conversations.db"
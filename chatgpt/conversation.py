@@ -0,0 +1,187 @@
+import asyncio
+import threading
+import uuid
+from typing import AsyncIterator
+from typing import Generic
+from typing import Iterator
+from typing import Tuple
+from typing import TYPE_CHECKING
+from typing import TypeVar
+from typing import Union
+
+if TYPE_CHECKING:  # pragma: no cover
+    from chatgpt.api import _BaseChatGPT
+    from chatgpt.api import AsyncChatGPT
+    from chatgpt.api import ChatGPT
+    from chatgpt.api import Response
+    from chatgpt.scheduler import CancellationToken
+    from chatgpt.stop import Stop
+
+ClientT = TypeVar("ClientT", bound="_BaseChatGPT")
+
+
+class _BaseConversation(Generic[ClientT]):
+    """Conversation state kept apart from the client that sends messages.
+
+    Many conversations can share one authenticated client and its
+    connection pool. Messages within a single conversation are sent one
+    at a time, because every reply becomes the parent of the next message.
+    """
+
+    def __init__(
+        self,
+        client: ClientT,
+        conversation_id: Union[str, None] = None,
+        parent_message_id: Union[str, None] = None,
+    ) -> None:
+        self._client = client
+        self._conversation_id = conversation_id
+        self._parent_message_id = parent_message_id or str(uuid.uuid4())
+
+    @property
+    def conversation_id(self) -> Union[str, None]:
+        return self._conversation_id
+
+    @property
+    def parent_message_id(self) -> str:
+        return self._parent_message_id
+
+    def new_conversation(self) -> None:
+        """Starts new conversation."""
+        self._conversation_id = None
+        self._parent_message_id = str(uuid.uuid4())
+
+    def resume(self, conversation_id: str) -> None:
+        """Continues conversation saved in the client's conversation store."""
+        state = self._client._stored_state(conversation_id)
+        self._conversation_id, self._parent_message_id = state
+
+    def _fork_state(
+        self, message_id: Union[str, None]
+    ) -> Tuple[Union[str, None], str]:
+        if message_id is None:
+            return self._conversation_id, self._parent_message_id
+        return (
+            self._client.message_tree.conversation_id(message_id),
+            message_id,
+        )
+
+    def _update(self, resp: "Response") -> None:
+        self._conversation_id = resp.conversation_id
+        self._parent_message_id = resp.parent_message_id
+
+
+class Conversation(_BaseConversation["ChatGPT"]):
+    """Conversation handle bound to a `ChatGPT` client.
+
+    Safe to use from its own thread, concurrent calls on the same handle
+    are serialized.
+    """
+
+    def __init__(
+        self,
+        client: "ChatGPT",
+        conversation_id: Union[str, None] = None,
+        parent_message_id: Union[str, None] = None,
+    ) -> None:
+        super().__init__(client, conversation_id, parent_message_id)
+        self._lock = threading.Lock()
+
+    def fork(self, message_id: Union[str, None] = None) -> "Conversation":
+        """Creates an independent branch of this conversation.
+
+        The branch continues from `message_id`, a reply recorded by the
+        client, or from the latest reply of this conversation. Branches
+        share the history before the fork, so it isn't sent again, and can
+        be continued concurrently.
+        """
+        return Conversation(self._client, *self._fork_state(message_id))
+
+    def send_message(self, message: str, stop: "Stop" = None) -> "Response":
+        """Sends message within this conversation."""
+        resp = None
+        for resp in self._converse(message, snapshots=False, stop=stop):
+            pass
+        return resp  # type: ignore[return-value]
+
+    def stream_message(
+        self, message: str, stop: "Stop" = None
+    ) -> Iterator["Response"]:
+        """Sends message within this conversation, yields reply snapshots."""
+        return self._converse(message, snapshots=True, stop=stop)
+
+    def _converse(
+        self,
+        message: str,
+        snapshots: bool,
+        cancel: "Union[CancellationToken, None]" = None,
+        stop: "Stop" = None,
+    ) -> Iterator["Response"]:
+        with self._lock:
+            resp = None
+            for resp in self._client._stream(
+                message,
+                self._conversation_id,
+                self._parent_message_id,
+                snapshots=snapshots,
+                cancel=cancel,
+                stop=stop,
+            ):
+                yield resp
+            assert resp is not None
+            self._update(resp)
+
+
+class AsyncConversation(_BaseConversation["AsyncChatGPT"]):
+    """Conversation handle bound to an `AsyncChatGPT` client.
+
+    Safe to use from its own task, concurrent calls on the same handle
+    are serialized.
+    """
+
+    def __init__(
+        self,
+        client: "AsyncChatGPT",
+        conversation_id: Union[str, None] = None,
+        parent_message_id: Union[str, None] = None,
+    ) -> None:
+        super().__init__(client, conversation_id, parent_message_id)
+        # Created lazily, so that the lock binds to the running event loop
+        self._lock: Union[asyncio.Lock, None] = None
+
+    def fork(self, message_id: Union[str, None] = None) -> "AsyncConversation":
+        """Async counterpart of `Conversation.fork`."""
+        return AsyncConversation(self._client, *self._fork_state(message_id))
+
+    async def send_message(
+        self, message: str, stop: "Stop" = None
+    ) -> "Response":
+        """Sends message within this conversation."""
+        resp = None
+        async for resp in self._converse(message, snapshots=False, stop=stop):
+            pass
+        return resp  # type: ignore[return-value]
+
+    def stream_message(
+        self, message: str, stop: "Stop" = None
+    ) -> AsyncIterator["Response"]:
+        """Sends message within this conversation, yields reply snapshots."""
+        return self._converse(message, snapshots=True, stop=stop)
+
+    async def _converse(
+        self, message: str, snapshots: bool, stop: "Stop" = None
+    ) -> AsyncIterator["Response"]:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            resp = None
+            async for resp in self._client._stream(
+                message,
+                self._conversation_id,
+                self._parent_message_id,
+                snapshots=snapshots,
+                stop=stop,
+            ):
+                yield resp
+            assert resp is not None
+            self._update(resp)
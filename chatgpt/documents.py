@@ -0,0 +1,278 @@
+"""Map-reduce over documents larger than a single message.
+
+The document is read lazily and split into chunks of about `max_tokens`
+tokens along paragraph and sentence boundaries. Every chunk is sent with
+the map prompt in its own conversation, concurrently, then the replies
+are merged by the reduce prompt, in a tree of reduce steps when they
+don't fit a single message.
+"""
+import math
+import re
+from pathlib import Path
+from typing import AsyncIterator
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import TYPE_CHECKING
+from typing import Union
+
+from chatgpt.batch import async_send_many
+from chatgpt.batch import BatchResult
+from chatgpt.batch import send_many
+
+if TYPE_CHECKING:  # pragma: no cover
+    from chatgpt.api import AsyncChatGPT
+    from chatgpt.api import ChatGPT
+
+Document = Union[str, Path, Iterable[str]]
+
+MAP_PROMPT = (
+    "Summarize the following part of a longer document, keep every "
+    "important fact:\n\n{chunk}"
+)
+REDUCE_PROMPT = (
+    "Combine the following summaries of consecutive parts of a document "
+    "into a single summary:\n\n{results}"
+)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of English text, about four characters a token."""
+    return math.ceil(len(text) / 4)
+
+
+def read_paragraphs(document: Document) -> Iterator[str]:
+    """Yields paragraphs of a text, a file path or an iterable of lines.
+
+    A file is read line by line, it's never loaded whole.
+    """
+    if isinstance(document, str):
+        document = document.splitlines()
+    elif isinstance(document, Path):
+        with document.open(encoding="utf-8") as f:
+            yield from read_paragraphs(f)
+        return
+    lines: List[str] = []
+    for line in document:
+        if line.strip():
+            lines.append(line.rstrip("\n"))
+        elif lines:
+            yield "\n".join(lines)
+            lines = []
+    if lines:
+        yield "\n".join(lines)
+
+
+def split_document(
+    document: Document,
+    max_tokens: int = 2000,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> Iterator[str]:
+    """Yields chunks of at most `max_tokens` tokens, lazily.
+
+    Chunks hold whole paragraphs when they fit, a longer paragraph is split
+    into sentences and a longer sentence into words.
+    """
+    chunk = ""
+    tokens = 0
+    for paragraph in read_paragraphs(document):
+        separator = "\n\n"
+        for piece in _pieces(paragraph, max_tokens, count_tokens):
+            size = count_tokens(piece)
+            if chunk and tokens + size > max_tokens:
+                yield chunk
+                chunk, tokens = "", 0
+            chunk = chunk + separator + piece if chunk else piece
+            tokens += size
+            # Pieces of a split paragraph are sentences or words
+            separator = " "
+    if chunk:
+        yield chunk
+
+
+def map_reduce(
+    client: "ChatGPT",
+    document: Document,
+    map_prompt: str = MAP_PROMPT,
+    reduce_prompt: Union[str, None] = REDUCE_PROMPT,
+    *,
+    max_tokens: int = 2000,
+    concurrency: int = 4,
+    requests_per_minute: Union[float, None] = None,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> str:
+    """Runs `map_prompt` on chunks of the document, merges the replies.
+
+    `map_prompt` gets a chunk as `{chunk}`, `reduce_prompt` gets replies
+    joined by blank lines as `{results}`. Without a reduce prompt replies
+    are just joined. Raises the error of the first failed message.
+    """
+    prompts = _map_prompts(document, map_prompt, max_tokens, count_tokens)
+    results = _replies(
+        send_many(
+            client,
+            prompts,
+            concurrency=concurrency,
+            requests_per_minute=requests_per_minute,
+            ordered=True,
+        )
+    )
+    if reduce_prompt is None:
+        return "\n\n".join(results)
+    while len(results) > 1:
+        groups = _group(results, reduce_prompt, max_tokens, count_tokens)
+        replies = _replies(
+            send_many(
+                client,
+                _reduce_prompts(groups, reduce_prompt),
+                concurrency=concurrency,
+                requests_per_minute=requests_per_minute,
+                ordered=True,
+            )
+        )
+        results = _merge(groups, replies)
+    return results[0] if results else ""
+
+
+async def async_map_reduce(
+    client: "AsyncChatGPT",
+    document: Document,
+    map_prompt: str = MAP_PROMPT,
+    reduce_prompt: Union[str, None] = REDUCE_PROMPT,
+    *,
+    max_tokens: int = 2000,
+    concurrency: int = 4,
+    requests_per_minute: Union[float, None] = None,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> str:
+    """Async counterpart of `map_reduce`.
+
+    The document is read on the event loop, pass an iterable of lines
+    which doesn't block to keep it responsive.
+    """
+    prompts = _map_prompts(document, map_prompt, max_tokens, count_tokens)
+    results = await _async_replies(
+        async_send_many(
+            client,
+            prompts,
+            concurrency=concurrency,
+            requests_per_minute=requests_per_minute,
+            ordered=True,
+        )
+    )
+    if reduce_prompt is None:
+        return "\n\n".join(results)
+    while len(results) > 1:
+        groups = _group(results, reduce_prompt, max_tokens, count_tokens)
+        replies = await _async_replies(
+            async_send_many(
+                client,
+                _reduce_prompts(groups, reduce_prompt),
+                concurrency=concurrency,
+                requests_per_minute=requests_per_minute,
+                ordered=True,
+            )
+        )
+        results = _merge(groups, replies)
+    return results[0] if results else ""
+
+
+def _map_prompts(
+    document: Document,
+    map_prompt: str,
+    max_tokens: int,
+    count_tokens: Callable[[str], int],
+) -> Iterator[str]:
+    budget = max_tokens - count_tokens(map_prompt.format(chunk=""))
+    if budget <= 0:
+        raise ValueError("The map prompt leaves no room for a chunk.")
+    return (
+        map_prompt.format(chunk=chunk)
+        for chunk in split_document(document, budget, count_tokens)
+    )
+
+
+def _pieces(
+    paragraph: str, max_tokens: int, count_tokens: Callable[[str], int]
+) -> Iterator[str]:
+    """Splits a paragraph into pieces which fit in a chunk."""
+    if count_tokens(paragraph) <= max_tokens:
+        yield paragraph
+        return
+    for sentence in _SENTENCE_END.split(paragraph):
+        if count_tokens(sentence) <= max_tokens:
+            yield sentence
+            continue
+        words: List[str] = []
+        tokens = 0
+        for word in sentence.split():
+            size = count_tokens(word + " ")
+            if words and tokens + size > max_tokens:
+                yield " ".join(words)
+                words, tokens = [], 0
+            words.append(word)
+            tokens += size
+        if words:
+            yield " ".join(words)
+
+
+def _group(
+    results: List[str],
+    reduce_prompt: str,
+    max_tokens: int,
+    count_tokens: Callable[[str], int],
+) -> List[List[str]]:
+    """Groups consecutive results into as few reduce prompts as fit.
+
+    Every group but the last holds at least two results, so each level of
+    the tree shrinks even when single results are too long.
+    """
+    budget = max_tokens - count_tokens(reduce_prompt.format(results=""))
+    groups: List[List[str]] = []
+    tokens = 0
+    for result in results:
+        size = count_tokens(result)
+        if groups and (len(groups[-1]) < 2 or tokens + size <= budget):
+            groups[-1].append(result)
+            tokens += size
+        else:
+            groups.append([result])
+            tokens = size
+    return groups
+
+
+def _reduce_prompts(groups: List[List[str]], reduce_prompt: str) -> List[str]:
+    return [
+        reduce_prompt.format(results="\n\n".join(group))
+        for group in groups
+        if len(group) > 1
+    ]
+
+
+def _merge(groups: List[List[str]], replies: List[str]) -> List[str]:
+    """Returns results of the next level, a lone result is carried over."""
+    merged = iter(replies)
+    return [next(merged) if len(group) > 1 else group[0] for group in groups]
+
+
+def _replies(results: Iterable[BatchResult]) -> List[str]:
+    replies = []
+    for result in results:
+        if result.error is not None:
+            raise result.error
+        assert result.response is not None
+        replies.append(result.response.content)
+    return replies
+
+
+async def _async_replies(results: AsyncIterator[BatchResult]) -> List[str]:
+    replies = []
+    async for result in results:
+        if result.error is not None:
+            raise result.error
+        assert result.response is not None
+        replies.append(result.response.content)
+    return replies
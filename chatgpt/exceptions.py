@@ -1,9 +1,16 @@
+from typing import Union
+
+
 class APIClientException(Exception):
     pass
 
 
 class StatusCodeException(APIClientException):
-    pass
+    @property
+    def status_code(self) -> Union[int, None]:
+        """Status code of the response the exception was raised for."""
+        response = self.args[0] if self.args else None
+        return getattr(response, "status_code", None)
 
 
 class InvalidResponseException(APIClientException):
@@ -16,3 +23,31 @@ class UnauthorizedException(APIClientException):
 
 class ForbiddenException(APIClientException):
     pass
+
+
+class CircuitOpenException(APIClientException):
+    pass
+
+
+class ConversationNotFoundException(APIClientException):
+    pass
+
+
+class QueueFullException(APIClientException):
+    pass
+
+
+class NoSessionAvailableException(APIClientException):
+    pass
+
+
+class CancelledException(APIClientException):
+    pass
+
+
+class DeadlineExceededException(CancelledException):
+    pass
+
+
+class MessageNotFoundException(APIClientException):
+    pass
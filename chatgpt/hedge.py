@@ -0,0 +1,347 @@
+"""Hedged requests against the long tail of reply latency.
+
+When a reply sends no first byte within a delay derived from recent
+replies, the message is sent once more and the two requests race. The
+reply of the winner is used, the loser's stream is closed.
+"""
+import asyncio
+import collections
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Tuple
+from typing import Union
+
+import httpx
+
+
+@dataclass
+class HedgeStats:
+    requests: int = 0
+    # Requests for which a hedge was sent, and won
+    hedged: int = 0
+    hedge_wins: int = 0
+
+    @property
+    def hedge_rate(self) -> float:
+        return self.hedged / self.requests if self.requests else 0.0
+
+    @property
+    def win_rate(self) -> float:
+        """Share of hedges which replied before the original request."""
+        return self.hedge_wins / self.hedged if self.hedged else 0.0
+
+
+class HedgePolicy:
+    """Decides when a hedge is sent.
+
+    A hedge is sent when no first byte arrives within the `percentile` of
+    recent times to first byte, kept between `min_delay` and `max_delay`
+    seconds. `initial_delay` is used until `min_samples` replies are seen.
+    At most `max_ratio` of requests are hedged.
+
+    Streamed replies and replies with a stop condition go to the request
+    which sends a byte first, otherwise to the one which finishes first.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        initial_delay: float = 2.0,
+        min_delay: float = 0.1,
+        max_delay: float = 30.0,
+        max_ratio: float = 0.1,
+        window: int = 200,
+        min_samples: int = 20,
+    ) -> None:
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self._samples: Deque[float] = collections.deque(maxlen=window)
+        self._stats = HedgeStats()
+        self._lock = threading.Lock()
+
+    def stats(self) -> HedgeStats:
+        with self._lock:
+            return HedgeStats(**vars(self._stats))
+
+    def delay(self) -> float:
+        """Returns seconds to wait for a first byte before hedging."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.initial_delay
+            samples = sorted(self._samples)
+        index = round(self.percentile / 100 * (len(samples) - 1))
+        return min(self.max_delay, max(self.min_delay, samples[index]))
+
+    def record(self, time_to_first_byte: float) -> None:
+        with self._lock:
+            self._samples.append(time_to_first_byte)
+
+    def _request_started(self) -> None:
+        with self._lock:
+            self._stats.requests += 1
+
+    def _try_hedge(self) -> bool:
+        """Counts a hedge, unless it would exceed `max_ratio`."""
+        with self._lock:
+            if self._stats.hedged + 1 > self.max_ratio * self._stats.requests:
+                return False
+            self._stats.hedged += 1
+            return True
+
+    def _hedge_won(self) -> None:
+        with self._lock:
+            self._stats.hedge_wins += 1
+
+
+class _Race:
+    """Picks the winner among attempts at the same reply.
+
+    Chunks of attempts are buffered until the winner is known. An error of
+    an attempt is raised only if no other one is running. Times to first
+    byte are recorded in the policy, attempts which lose or are closed
+    before their first byte record the time they waited, a lower bound.
+    """
+
+    def __init__(
+        self,
+        policy: HedgePolicy,
+        first_byte: bool,
+        on_first_byte: Union[Callable[[], None], None],
+    ) -> None:
+        self.first_byte = first_byte
+        self.winner: Union[int, None] = None
+        self.done = False
+        self._policy = policy
+        self._on_first_byte = on_first_byte
+        self._chunks: Dict[int, List[bytes]] = {}
+        # Attempts waiting for their first byte, by the time they started
+        self._waiting: Dict[int, float] = {}
+
+    def started(self, index: int) -> None:
+        self._chunks[index] = []
+        self._waiting[index] = time.monotonic()
+
+    def event(self, index: int, kind: str, value: Any) -> List[bytes]:
+        """Returns chunks of the winner to pass on."""
+        started = self._waiting.pop(index, None)
+        if kind == "chunk" and started is not None:
+            self._policy.record(time.monotonic() - started)
+            # The first byte of any attempt is the first byte of the reply
+            if self._on_first_byte is not None:
+                self._on_first_byte()
+                self._on_first_byte = None
+        if self.winner is not None and index != self.winner:
+            return []
+        if kind == "chunk":
+            if self.winner is not None:
+                return [value]
+            self._chunks[index].append(value)
+            if self.first_byte:
+                self._win(index)
+                return self._chunks.pop(index)
+            return []
+        if kind == "done":
+            self.done = True
+            if self.winner is None:
+                self._win(index)
+            return self._chunks.pop(index, [])
+        # An error, the winner was already chosen or this was the last one
+        self._chunks.pop(index)
+        if self.winner is not None or not self._chunks:
+            raise value
+        return []
+
+    def end_waiting(self) -> None:
+        """Records lower bounds for attempts still waiting for a byte."""
+        now = time.monotonic()
+        for started in self._waiting.values():
+            self._policy.record(now - started)
+        self._waiting.clear()
+
+    def _win(self, index: int) -> None:
+        self.winner = index
+        # Losers are closed, they won't get a byte anymore
+        self.end_waiting()
+
+
+class _HedgedReply:
+    """Chunks of a reply raced by hedged requests, sent from threads."""
+
+    def __init__(
+        self,
+        policy: HedgePolicy,
+        send: Callable[[str], httpx.Response],
+        data: str,
+        hedge_data: Callable[[], str],
+        first_byte: bool,
+        on_first_byte: Union[Callable[[], None], None] = None,
+    ) -> None:
+        self._policy = policy
+        self._send = send
+        self._data = data
+        self._hedge_data = hedge_data
+        self._race = _Race(policy, first_byte, on_first_byte)
+        self._events: "queue.Queue[Tuple[int, str, Any]]" = queue.Queue()
+        self._responses: Dict[int, httpx.Response] = {}
+        self._closed = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        race, policy = self._race, self._policy
+        policy._request_started()
+        self._start(0, self._data)
+        hedge_at: Union[float, None] = time.monotonic() + policy.delay()
+        try:
+            while not race.done:
+                timeout = None
+                if hedge_at is not None:
+                    timeout = max(0.0, hedge_at - time.monotonic())
+                try:
+                    index, kind, value = self._events.get(timeout=timeout)
+                except queue.Empty:
+                    if policy._try_hedge():
+                        self._start(1, self._hedge_data())
+                    hedge_at = None
+                    continue
+                # Any event of the first request comes too late for a hedge
+                hedge_at = None
+                yield from race.event(index, kind, value)
+                if race.winner is not None:
+                    self._close_losers()
+            if race.winner == 1:
+                policy._hedge_won()
+        finally:
+            race.end_waiting()
+            self.close()
+
+    def close(self) -> None:
+        """Closes the streams of all requests, from any thread."""
+        self._closed = True
+        for response in list(self._responses.values()):
+            response.close()
+
+    def _close_losers(self) -> None:
+        for index, response in list(self._responses.items()):
+            if index != self._race.winner:
+                response.close()
+
+    def _start(self, index: int, data: str) -> None:
+        self._race.started(index)
+        threading.Thread(
+            target=self._attempt, args=(index, data), daemon=True
+        ).start()
+
+    def _attempt(self, index: int, data: str) -> None:
+        response = None
+        try:
+            response = self._send(data)
+            self._responses[index] = response
+            if self._lost(index):
+                return
+            for chunk in response.iter_bytes():
+                if self._lost(index):
+                    return
+                self._events.put((index, "chunk", chunk))
+            self._events.put((index, "done", None))
+        except BaseException as e:
+            self._events.put((index, "error", e))
+        finally:
+            if response is not None:
+                response.close()
+
+    def _lost(self, index: int) -> bool:
+        winner = self._race.winner
+        return self._closed or (winner is not None and winner != index)
+
+
+class _AsyncHedgedReply:
+    """Async counterpart of `_HedgedReply`, requests are sent from tasks."""
+
+    def __init__(
+        self,
+        policy: HedgePolicy,
+        send: Callable[[str], Awaitable[httpx.Response]],
+        data: str,
+        hedge_data: Callable[[], str],
+        first_byte: bool,
+        on_first_byte: Union[Callable[[], None], None] = None,
+    ) -> None:
+        self._policy = policy
+        self._send = send
+        self._data = data
+        self._hedge_data = hedge_data
+        self._race = _Race(policy, first_byte, on_first_byte)
+        self._events: "Union[asyncio.Queue[Tuple[int, str, Any]], None]"
+        self._events = None
+        self._tasks: Dict[int, "asyncio.Task[None]"] = {}
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        race, policy = self._race, self._policy
+        # Created here, so that the queue binds to the running event loop
+        events = self._events = asyncio.Queue()
+        policy._request_started()
+        self._start(0, self._data)
+        hedge_at: Union[float, None] = time.monotonic() + policy.delay()
+        try:
+            while not race.done:
+                timeout = None
+                if hedge_at is not None:
+                    timeout = max(0.0, hedge_at - time.monotonic())
+                try:
+                    index, kind, value = await asyncio.wait_for(
+                        events.get(), timeout
+                    )
+                except asyncio.TimeoutError:
+                    if policy._try_hedge():
+                        self._start(1, self._hedge_data())
+                    hedge_at = None
+                    continue
+                hedge_at = None
+                for chunk in race.event(index, kind, value):
+                    yield chunk
+                if race.winner is not None:
+                    self._cancel(lambda index: index != race.winner)
+            if race.winner == 1:
+                policy._hedge_won()
+        finally:
+            race.end_waiting()
+            self._cancel(lambda index: True)
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    def _cancel(self, which: Callable[[int], bool]) -> None:
+        for index, task in self._tasks.items():
+            if which(index):
+                task.cancel()
+
+    def _start(self, index: int, data: str) -> None:
+        self._race.started(index)
+        self._tasks[index] = asyncio.ensure_future(self._attempt(index, data))
+
+    async def _attempt(self, index: int, data: str) -> None:
+        assert self._events is not None
+        response = None
+        try:
+            response = await self._send(data)
+            async for chunk in response.aiter_bytes():
+                self._events.put_nowait((index, "chunk", chunk))
+            self._events.put_nowait((index, "done", None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._events.put_nowait((index, "error", e))
+        finally:
+            if response is not None:
+                await response.aclose()
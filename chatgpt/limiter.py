@@ -0,0 +1,213 @@
+"""Concurrency limit which adapts to the load upstream can take."""
+import asyncio
+import collections
+import threading
+import time
+from contextlib import asynccontextmanager
+from contextlib import contextmanager
+from typing import AsyncIterator
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import Iterator
+from typing import Union
+
+
+class _State:
+    __slots__ = (
+        "limit",
+        "in_flight",
+        "waiters",
+        "short_latency",
+        "long_latency",
+        "decreased_at",
+    )
+
+    def __init__(self, limit: float) -> None:
+        self.limit = limit
+        self.in_flight = 0
+        self.waiters: Deque[Callable[[], None]] = collections.deque()
+        # Recent and long-term averages of time to first byte
+        self.short_latency: Union[float, None] = None
+        self.long_latency: Union[float, None] = None
+        self.decreased_at = float("-inf")
+
+
+class LimiterSlot:
+    """Reply in progress, tells the limiter when its first byte came."""
+
+    __slots__ = ("_start", "latency", "at_limit")
+
+    def __init__(self, at_limit: bool = False) -> None:
+        self._start = time.monotonic()
+        self.latency: Union[float, None] = None
+        # Taken while the limit was reached, only then may the limit grow
+        self.at_limit = at_limit
+
+    def received(self) -> None:
+        if self.latency is None:
+            self.latency = time.monotonic() - self._start
+
+
+class AdaptiveLimiter:
+    """Limits replies in progress per session token, AIMD style.
+
+    The limit grows by one per `limit` replies started at the limit while
+    time to first byte is stable. It's multiplied by `backoff` on 429, 5xx
+    and timeouts and by `latency_backoff` when the recent time to first
+    byte exceeds its long-term average `latency_tolerance` times. It
+    decreases at most once per `backoff_interval` seconds, as errors of
+    requests sent at once come in bursts.
+
+    A limiter may be shared by clients of many session tokens, e.g. of a
+    `SessionPool`, every session gets its own limit. Requests over the
+    limit wait in arrival order.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        backoff: float = 0.5,
+        latency_backoff: float = 0.9,
+        latency_tolerance: float = 2.0,
+        backoff_interval: float = 1.0,
+    ) -> None:
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_backoff = latency_backoff
+        self.latency_tolerance = latency_tolerance
+        self.backoff_interval = backoff_interval
+        self._states: Dict[str, _State] = {}
+        self._lock = threading.Lock()
+
+    def limit(self, key: str) -> int:
+        with self._lock:
+            return self._allowed(self._state(key))
+
+    def limits(self) -> Dict[str, int]:
+        """Returns current limits by key, e.g. for a metrics gauge."""
+        with self._lock:
+            return {
+                key: self._allowed(state)
+                for key, state in self._states.items()
+            }
+
+    def in_flight(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                key: state.in_flight for key, state in self._states.items()
+            }
+
+    @contextmanager
+    def slot(self, key: str) -> Iterator[LimiterSlot]:
+        """Waits until a reply may start, holds the slot until it ends."""
+        slot = LimiterSlot(self._acquire(key))
+        try:
+            yield slot
+        finally:
+            self._release(key, slot.latency, slot.at_limit)
+
+    @asynccontextmanager
+    async def slot_async(self, key: str) -> AsyncIterator[LimiterSlot]:
+        """Async counterpart of `slot`."""
+        slot = LimiterSlot(await self._acquire_async(key))
+        try:
+            yield slot
+        finally:
+            self._release(key, slot.latency, slot.at_limit)
+
+    def overload(self, key: str) -> None:
+        """Backs off after a sign of overload, e.g. a 429 response."""
+        with self._lock:
+            self._decrease(self._state(key), self.backoff)
+
+    def _state(self, key: str) -> _State:
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _State(self.initial_limit)
+        return state
+
+    def _allowed(self, state: _State) -> int:
+        return max(self.min_limit, int(state.limit))
+
+    def _acquire(self, key: str) -> bool:
+        """Takes a slot, returns whether the limit was reached."""
+        with self._lock:
+            state = self._state(key)
+            if state.in_flight < self._allowed(state) and not state.waiters:
+                state.in_flight += 1
+                return state.in_flight >= self._allowed(state)
+            event = threading.Event()
+            state.waiters.append(event.set)
+        event.wait()
+        return True
+
+    async def _acquire_async(self, key: str) -> bool:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake() -> None:
+            loop.call_soon_threadsafe(_resolve, future)
+
+        with self._lock:
+            state = self._state(key)
+            if state.in_flight < self._allowed(state) and not state.waiters:
+                state.in_flight += 1
+                return state.in_flight >= self._allowed(state)
+            state.waiters.append(wake)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    state.waiters.remove(wake)
+                except ValueError:
+                    # The slot was handed over already
+                    pass
+                else:
+                    raise
+            self._release(key, None)
+            raise
+        return True
+
+    def _release(
+        self, key: str, latency: Union[float, None], at_limit: bool = False
+    ) -> None:
+        with self._lock:
+            state = self._state(key)
+            state.in_flight -= 1
+            if latency is not None:
+                self._record_latency(state, latency, at_limit)
+            while state.waiters and state.in_flight < self._allowed(state):
+                state.in_flight += 1
+                state.waiters.popleft()()
+
+    def _record_latency(
+        self, state: _State, latency: float, at_limit: bool
+    ) -> None:
+        if state.short_latency is None or state.long_latency is None:
+            state.short_latency = state.long_latency = latency
+            return
+        state.short_latency += 0.2 * (latency - state.short_latency)
+        state.long_latency += 0.02 * (latency - state.long_latency)
+        if state.short_latency > self.latency_tolerance * state.long_latency:
+            self._decrease(state, self.latency_backoff)
+        elif at_limit:
+            # A light load doesn't show that upstream can take more
+            state.limit = min(self.max_limit, state.limit + 1 / state.limit)
+
+    def _decrease(self, state: _State, factor: float) -> None:
+        now = time.monotonic()
+        if now - state.decreased_at < self.backoff_interval:
+            return
+        state.decreased_at = now
+        state.limit = max(self.min_limit, state.limit * factor)
+
+
+def _resolve(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
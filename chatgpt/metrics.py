@@ -0,0 +1,322 @@
+import threading
+import time
+from dataclasses import dataclass
+from types import TracebackType
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Sequence
+from typing import Tuple
+from typing import Type
+from typing import Union
+
+from chatgpt.exceptions import InvalidResponseException
+
+# Upper bounds of duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Upper bounds of response size histogram buckets, in bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+@dataclass
+class CallStats:
+    """Measurements of a single `authenticate` or `send_message` call.
+
+    Times are in seconds since the call started. Attempts include retries
+    and the repeated request after an access token refresh.
+    """
+
+    operation: str
+    duration: float = 0.0
+    time_to_first_byte: Union[float, None] = None
+    time_to_last_byte: Union[float, None] = None
+    response_bytes: int = 0
+    attempts: int = 0
+    # Status code of the last attempt, None if it got no response
+    status_code: Union[int, None] = None
+    error: Union[BaseException, None] = None
+
+    @property
+    def retries(self) -> int:
+        return max(self.attempts - 1, 0)
+
+    @property
+    def outcome(self) -> str:
+        """`ok` or name of the exception the call ended with."""
+        return "ok" if self.error is None else type(self.error).__name__
+
+
+class Hooks:
+    """Receives measurements of client calls.
+
+    `call_started` returns a value passed back to `call_finished`, e.g.
+    a span. Methods are called on the request path, so they should be
+    quick and must not raise.
+    """
+
+    def call_started(self, operation: str) -> Any:
+        return None
+
+    def call_finished(self, context: Any, stats: CallStats) -> None:
+        pass
+
+
+class MultiHooks(Hooks):
+    """Passes measurements to many hooks."""
+
+    def __init__(self, *hooks: Hooks) -> None:
+        self.hooks = hooks
+
+    def call_started(self, operation: str) -> Any:
+        return [hooks.call_started(operation) for hooks in self.hooks]
+
+    def call_finished(self, context: Any, stats: CallStats) -> None:
+        for hooks, hooks_context in zip(self.hooks, context):
+            hooks.call_finished(hooks_context, stats)
+
+
+class CallTracker:
+    """Measures a call, reports it to hooks when the block exits."""
+
+    __slots__ = ("stats", "_hooks", "_context", "_start")
+
+    def __init__(self, hooks: Hooks, operation: str) -> None:
+        self.stats = CallStats(operation)
+        self._hooks = hooks
+
+    def __enter__(self) -> "CallTracker":
+        self._context = self._hooks.call_started(self.stats.operation)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Union[Type[BaseException], None],
+        exc_value: Union[BaseException, None],
+        traceback: Union[TracebackType, None],
+    ) -> None:
+        self.stats.duration = time.perf_counter() - self._start
+        self.stats.error = exc_value
+        self._hooks.call_finished(self._context, self.stats)
+
+    def attempt(self, status_code: Union[int, None]) -> None:
+        self.stats.attempts += 1
+        self.stats.status_code = status_code
+
+    def received(self, size: int) -> None:
+        elapsed = time.perf_counter() - self._start
+        if self.stats.time_to_first_byte is None:
+            self.stats.time_to_first_byte = elapsed
+        self.stats.time_to_last_byte = elapsed
+        self.stats.response_bytes += size
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+_Labels = Tuple[Tuple[str, str], ...]
+
+
+class PrometheusMetrics(Hooks):
+    """Aggregates counters and histograms of calls.
+
+    `render` returns them in the Prometheus text exposition format, to be
+    served on a metrics endpoint.
+    """
+
+    def __init__(
+        self,
+        namespace: str = "chatgpt",
+        duration_buckets: Sequence[float] = DURATION_BUCKETS,
+        size_buckets: Sequence[float] = SIZE_BUCKETS,
+    ) -> None:
+        self.namespace = namespace
+        self._duration_buckets = duration_buckets
+        self._size_buckets = size_buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[_Labels, float]] = {}
+        self._histograms: Dict[str, Dict[_Labels, _Histogram]] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], Mapping[str, float]]]]
+        self._gauges = {}
+
+    def call_finished(self, context: Any, stats: CallStats) -> None:
+        operation = (("operation", stats.operation),)
+        with self._lock:
+            self._inc(
+                "calls_total",
+                operation
+                + (
+                    ("outcome", stats.outcome),
+                    ("status_code", str(stats.status_code or "")),
+                ),
+            )
+            self._inc("retries_total", operation, stats.retries)
+            if isinstance(stats.error, InvalidResponseException):
+                self._inc("parse_failures_total", operation)
+            self._observe(
+                "call_duration_seconds",
+                operation,
+                stats.duration,
+                self._duration_buckets,
+            )
+            if stats.time_to_first_byte is not None:
+                self._observe(
+                    "time_to_first_byte_seconds",
+                    operation,
+                    stats.time_to_first_byte,
+                    self._duration_buckets,
+                )
+            if stats.time_to_last_byte is not None:
+                self._observe(
+                    "time_to_last_byte_seconds",
+                    operation,
+                    stats.time_to_last_byte,
+                    self._duration_buckets,
+                )
+            self._observe(
+                "response_bytes",
+                operation,
+                stats.response_bytes,
+                self._size_buckets,
+            )
+
+    def add_gauge(
+        self, name: str, label: str, values: Callable[[], Mapping[str, float]]
+    ) -> None:
+        """Renders a gauge whose values are read on every `render`.
+
+        `values` returns them keyed by the value of `label`, e.g.
+        `add_gauge("concurrency_limit", "session", limiter.limits)`.
+        """
+        with self._lock:
+            self._gauges[name] = (label, values)
+
+    def counter(self, name: str, **labels: str) -> float:
+        """Returns value of a counter, e.g. `counter("retries_total")`.
+
+        Values of all label sets matching given labels are summed up.
+        """
+        with self._lock:
+            return sum(
+                value
+                for key, value in self._counters.get(name, {}).items()
+                if labels.items() <= dict(key).items()
+            )
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, (label, values) in sorted(self._gauges.items()):
+                full_name = f"{self.namespace}_{name}"
+                lines.append(f"# TYPE {full_name} gauge")
+                for key, value in values().items():
+                    labels: _Labels = ((label, key),)
+                    lines.append(f"{full_name}{_format(labels)} {value:g}")
+            for name, series in sorted(self._counters.items()):
+                full_name = f"{self.namespace}_{name}"
+                lines.append(f"# TYPE {full_name} counter")
+                for labels, value in series.items():
+                    lines.append(f"{full_name}{_format(labels)} {value:g}")
+            for name, histograms in sorted(self._histograms.items()):
+                full_name = f"{self.namespace}_{name}"
+                lines.append(f"# TYPE {full_name} histogram")
+                for labels, histogram in histograms.items():
+                    cumulative = 0
+                    for bound, count in zip(
+                        histogram.buckets, histogram.counts
+                    ):
+                        cumulative += count
+                        bucket = labels + (("le", f"{bound:g}"),)
+                        lines.append(
+                            f"{full_name}_bucket{_format(bucket)} {cumulative}"
+                        )
+                    bucket = labels + (("le", "+Inf"),)
+                    lines += [
+                        f"{full_name}_bucket{_format(bucket)} "
+                        f"{histogram.count}",
+                        f"{full_name}_sum{_format(labels)} {histogram.sum:g}",
+                        f"{full_name}_count{_format(labels)} "
+                        f"{histogram.count}",
+                    ]
+        return "\n".join(lines) + "\n"
+
+    def _inc(self, name: str, labels: _Labels, value: float = 1) -> None:
+        series = self._counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + value
+
+    def _observe(
+        self,
+        name: str,
+        labels: _Labels,
+        value: float,
+        buckets: Sequence[float],
+    ) -> None:
+        histograms = self._histograms.setdefault(name, {})
+        if labels not in histograms:
+            histograms[labels] = _Histogram(buckets)
+        histograms[labels].observe(value)
+
+
+class OpenTelemetryHooks(Hooks):
+    """Records every call as a span of an OpenTelemetry tracer.
+
+    The tracer comes from `opentelemetry.trace.get_tracer(...)`, this
+    module doesn't depend on OpenTelemetry itself.
+    """
+
+    def __init__(self, tracer: Any) -> None:
+        self._tracer = tracer
+
+    def call_started(self, operation: str) -> Any:
+        return self._tracer.start_span(f"chatgpt.{operation}")
+
+    def call_finished(self, span: Any, stats: CallStats) -> None:
+        span.set_attribute("chatgpt.attempts", stats.attempts)
+        span.set_attribute("chatgpt.response_bytes", stats.response_bytes)
+        if stats.status_code is not None:
+            span.set_attribute("http.status_code", stats.status_code)
+        if stats.time_to_first_byte is not None:
+            span.set_attribute(
+                "chatgpt.time_to_first_byte", stats.time_to_first_byte
+            )
+        if stats.time_to_last_byte is not None:
+            span.set_attribute(
+                "chatgpt.time_to_last_byte", stats.time_to_last_byte
+            )
+        if stats.error is not None:
+            from opentelemetry.trace import Status
+            from opentelemetry.trace import StatusCode
+
+            span.record_exception(stats.error)
+            span.set_status(Status(StatusCode.ERROR, stats.outcome))
+        span.end()
+
+
+def _format(labels: _Labels) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            value.replace("\\", "\\\\").replace('"', '\\"'),
+        )
+        for name, value in labels
+    )
+    return "{" + pairs + "}"
@@ -1,28 +1,68 @@
+import hashlib
 import json
 from typing import Union
 
+MODEL = "text-davinci-002-render"
+
 
 def send_message(
     message: str,
     id_: str,
     conv_id: Union[str, None],
     parent_msg_id: Union[str, None],
+    model: str = MODEL,
 ) -> str:
     return json.dumps(
-        {
-            "action": "next",
-            "messages": [
-                {
-                    "id": id_,
-                    "role": "user",
-                    "content": {
-                        "content_type": "text",
-                        "parts": [message],
-                    },
-                }
-            ],
-            "conversation_id": conv_id,
-            "parent_message_id": parent_msg_id,
-            "model": "text-davinci-002-render",
-        }
+        _send_message_data(message, id_, conv_id, parent_msg_id, model)
+    )
+
+
+def send_message_key(
+    message: str,
+    conv_id: Union[str, None],
+    parent_msg_id: Union[str, None],
+    model: str = MODEL,
+    session: Union[str, None] = None,
+) -> str:
+    """Identifies `send_message` payloads which get interchangeable replies.
+
+    Message id is left out, as well as the parent message id of a new
+    conversation, because both are randomly generated. `session` tells
+    accounts apart, a reply continues a conversation of its own account.
+    """
+    data = _send_message_data(
+        message,
+        id_=None,
+        conv_id=conv_id,
+        parent_msg_id=parent_msg_id if conv_id is not None else None,
+        model=model,
     )
+    data["session"] = session
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def _send_message_data(
+    message: str,
+    id_: Union[str, None],
+    conv_id: Union[str, None],
+    parent_msg_id: Union[str, None],
+    model: str,
+) -> dict:
+    return {
+        "action": "next",
+        "messages": [
+            {
+                "id": id_,
+                "role": "user",
+                "content": {
+                    "content_type": "text",
+                    "parts": [message],
+                },
+            }
+        ],
+        "conversation_id": conv_id,
+        "parent_message_id": parent_msg_id,
+        "model": model,
+    }
@@ -0,0 +1,318 @@
+import collections
+import threading
+import time
+import uuid
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import TYPE_CHECKING
+from typing import Union
+
+from chatgpt.api import ChatGPT
+from chatgpt.exceptions import ForbiddenException
+from chatgpt.exceptions import InvalidResponseException
+from chatgpt.exceptions import MessageNotFoundException
+from chatgpt.exceptions import NoSessionAvailableException
+from chatgpt.exceptions import StatusCodeException
+from chatgpt.exceptions import UnauthorizedException
+from chatgpt.retry import _parse_retry_after
+
+if TYPE_CHECKING:  # pragma: no cover
+    from chatgpt.api import Response
+    from chatgpt.scheduler import CancellationToken
+    from chatgpt.stop import Stop
+
+# Statuses which take a session out of rotation
+COOLDOWN_STATUSES = frozenset((401, 403, 429))
+
+
+class _Session:
+    __slots__ = (
+        "client",
+        "in_flight",
+        "started",
+        "cooldown_until",
+        "authenticated",
+        "auth_lock",
+    )
+
+    def __init__(self, client: ChatGPT) -> None:
+        self.client = client
+        self.in_flight = 0
+        # Conversations started, spreads load between idle sessions
+        self.started = 0
+        self.cooldown_until = 0.0
+        self.authenticated = False
+        self.auth_lock = threading.Lock()
+
+    def is_healthy(self, now: float) -> bool:
+        return self.cooldown_until <= now
+
+
+class SessionPool:
+    """Spreads conversations over clients of several session tokens.
+
+    New conversations go to the healthy session with the fewest replies
+    in progress, a conversation stays with the session that created it.
+    A session which gets 401, 403 or 429 is taken out of rotation for
+    `cooldown` seconds, or as long as the `Retry-After` header says.
+    Sessions are authenticated on first use. Other keyword arguments are
+    passed to every `ChatGPT` client, e.g. a shared `transport`.
+
+    The pool can be used in place of a client by `send_many` and
+    `chatgpt.server`.
+    """
+
+    # Conversations whose session is remembered
+    MAX_OWNERS = 100_000
+
+    def __init__(
+        self,
+        session_tokens: Iterable[str],
+        *,
+        cooldown: float = 60.0,
+        **client_kwargs: Any,
+    ) -> None:
+        self._sessions = [
+            _Session(ChatGPT(session_token=token, **client_kwargs))
+            for token in session_tokens
+        ]
+        if not self._sessions:
+            raise ValueError("At least one session token is required.")
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._owners: "collections.OrderedDict[str, _Session]"
+        self._owners = collections.OrderedDict()
+
+    def __enter__(self) -> "SessionPool":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for session in self._sessions:
+            session.client.close()
+
+    @property
+    def clients(self) -> List[ChatGPT]:
+        return [session.client for session in self._sessions]
+
+    def healthy_count(self) -> int:
+        now = time.monotonic()
+        return sum(session.is_healthy(now) for session in self._sessions)
+
+    def conversation(
+        self,
+        conversation_id: Union[str, None] = None,
+        parent_message_id: Union[str, None] = None,
+    ) -> "PooledConversation":
+        """Creates conversation handle.
+
+        A conversation started by the pool continues on its session.
+        """
+        session = None
+        if conversation_id is not None:
+            with self._lock:
+                session = self._owners.get(conversation_id)
+        return PooledConversation(
+            self, session, conversation_id, parent_message_id
+        )
+
+    def send_message(self, message: str, stop: "Stop" = None) -> "Response":
+        """Sends message in a new conversation."""
+        return self.conversation().send_message(message, stop)
+
+    def stream_message(
+        self, message: str, stop: "Stop" = None
+    ) -> Iterator["Response"]:
+        """Sends message in a new conversation, yields reply snapshots."""
+        return self.conversation().stream_message(message, stop)
+
+    def _pick(self) -> _Session:
+        now = time.monotonic()
+        with self._lock:
+            healthy = [s for s in self._sessions if s.is_healthy(now)]
+            if not healthy:
+                retry_in = min(s.cooldown_until for s in self._sessions) - now
+                raise NoSessionAvailableException(
+                    "All sessions are cooling down, "
+                    f"the first is back in {retry_in:.0f}s."
+                )
+            session = min(healthy, key=lambda s: (s.in_flight, s.started))
+            session.started += 1
+            return session
+
+    def _checkout(self, session: _Session) -> None:
+        with self._lock:
+            session.in_flight += 1
+        try:
+            self._authenticate(session)
+        except InvalidResponseException as e:
+            # Raised when the session token isn't accepted
+            self._checkin(session, UnauthorizedException(*e.args))
+            raise
+        except BaseException as e:
+            self._checkin(session, e)
+            raise
+
+    def _checkin(
+        self,
+        session: _Session,
+        error: Union[BaseException, None] = None,
+        response: Union["Response", None] = None,
+    ) -> None:
+        with self._lock:
+            session.in_flight -= 1
+            if error is not None:
+                cooldown = self._cooldown(error)
+                if cooldown is not None:
+                    session.cooldown_until = max(
+                        session.cooldown_until, time.monotonic() + cooldown
+                    )
+                    # Token may be revoked, authenticate once it's back
+                    session.authenticated = False
+            if response is not None:
+                # Only the session which started a conversation can
+                # continue it, a reply never moves it elsewhere
+                owner = self._owners.setdefault(
+                    response.conversation_id, session
+                )
+                if owner is not session:
+                    return
+                self._owners.move_to_end(response.conversation_id)
+                while len(self._owners) > self.MAX_OWNERS:
+                    self._owners.popitem(last=False)
+
+    def _authenticate(self, session: _Session) -> None:
+        if session.authenticated:
+            return
+        with session.auth_lock:
+            if not session.authenticated:
+                session.client.authenticate()
+                session.authenticated = True
+
+    def _cooldown(self, error: BaseException) -> Union[float, None]:
+        """Returns how long a session is out of rotation after the error."""
+        if isinstance(error, (UnauthorizedException, ForbiddenException)):
+            return self.cooldown
+        if (
+            isinstance(error, StatusCodeException)
+            and error.status_code in COOLDOWN_STATUSES
+        ):
+            response = error.args[0]
+            retry_after = _parse_retry_after(
+                response.headers.get("Retry-After")
+            )
+            return max(self.cooldown, retry_after or 0)
+        return None
+
+
+class PooledConversation:
+    """Conversation handle bound to a session of a `SessionPool`.
+
+    The session is chosen when the first message is sent. Until the
+    conversation has started, it moves to another session if its own one
+    is taken out of rotation.
+    """
+
+    def __init__(
+        self,
+        pool: SessionPool,
+        session: Union[_Session, None],
+        conversation_id: Union[str, None] = None,
+        parent_message_id: Union[str, None] = None,
+    ) -> None:
+        self._pool = pool
+        self._session = session
+        self._conversation_id = conversation_id
+        self._parent_message_id = parent_message_id or str(uuid.uuid4())
+        self._lock = threading.Lock()
+
+    @property
+    def conversation_id(self) -> Union[str, None]:
+        return self._conversation_id
+
+    @property
+    def parent_message_id(self) -> str:
+        return self._parent_message_id
+
+    @property
+    def client(self) -> Union[ChatGPT, None]:
+        """Client of the session, None until the first message."""
+        return self._session.client if self._session is not None else None
+
+    def new_conversation(self) -> None:
+        """Starts new conversation, possibly on another session."""
+        self._conversation_id = None
+        self._parent_message_id = str(uuid.uuid4())
+        self._session = None
+
+    def fork(
+        self, message_id: Union[str, None] = None
+    ) -> "PooledConversation":
+        """Creates a branch of this conversation on the same session.
+
+        See `Conversation.fork`, `message_id` has to be a reply recorded
+        by the session's client.
+        """
+        if message_id is None:
+            return PooledConversation(
+                self._pool,
+                self._session,
+                self._conversation_id,
+                self._parent_message_id,
+            )
+        if self._session is None:
+            raise MessageNotFoundException(message_id)
+        return PooledConversation(
+            self._pool,
+            self._session,
+            self._session.client.message_tree.conversation_id(message_id),
+            message_id,
+        )
+
+    def send_message(self, message: str, stop: "Stop" = None) -> "Response":
+        """Sends message within this conversation."""
+        resp = None
+        for resp in self._converse(message, snapshots=False, stop=stop):
+            pass
+        return resp  # type: ignore[return-value]
+
+    def stream_message(
+        self, message: str, stop: "Stop" = None
+    ) -> Iterator["Response"]:
+        """Sends message within this conversation, yields reply snapshots."""
+        return self._converse(message, snapshots=True, stop=stop)
+
+    def _converse(
+        self,
+        message: str,
+        snapshots: bool,
+        cancel: "Union[CancellationToken, None]" = None,
+        stop: "Stop" = None,
+    ) -> Iterator["Response"]:
+        with self._lock:
+            session = self._session
+            if session is None or (
+                self._conversation_id is None
+                and not session.is_healthy(time.monotonic())
+            ):
+                session = self._session = self._pool._pick()
+            self._pool._checkout(session)
+            conversation = session.client.conversation(
+                self._conversation_id, self._parent_message_id
+            )
+            resp = None
+            try:
+                for resp in conversation._converse(
+                    message, snapshots, cancel, stop
+                ):
+                    yield resp
+            except BaseException as e:
+                self._pool._checkin(session, e)
+                raise
+            self._pool._checkin(session, response=resp)
+            self._conversation_id = conversation.conversation_id
+            self._parent_message_id = conversation.parent_message_id
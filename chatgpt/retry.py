@@ -0,0 +1,149 @@
+import random
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import FrozenSet
+from typing import Union
+
+import httpx
+
+from chatgpt.exceptions import CircuitOpenException
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter for failed requests.
+
+    Only failures after which the message was certainly not processed are
+    retried: connection errors and `retry_statuses`. A reply is never
+    retried once it started streaming. Read timeouts are retried only when
+    `retry_read_timeouts` is set, the server could have received the
+    message already.
+    """
+
+    max_attempts: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 30.0
+    retry_statuses: FrozenSet[int] = frozenset({429, 500, 502, 503, 504})
+    retry_read_timeouts: bool = False
+
+    def is_retryable_error(self, error: Exception) -> bool:
+        if isinstance(
+            error,
+            (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout),
+        ):
+            return True
+        return self.retry_read_timeouts and isinstance(
+            error, httpx.ReadTimeout
+        )
+
+    def delay(
+        self,
+        attempt: int,
+        response: Union[httpx.Response, None] = None,
+        error: Union[Exception, None] = None,
+    ) -> Union[float, None]:
+        """Returns seconds to wait before the next attempt.
+
+        `attempt` counts failed attempts so far, starting from 1. None
+        means that the request shouldn't be retried.
+        """
+        if attempt >= self.max_attempts:
+            return None
+        if error is not None and not self.is_retryable_error(error):
+            return None
+        if response is not None:
+            if response.status_code not in self.retry_statuses:
+                return None
+            retry_after = _parse_retry_after(
+                response.headers.get("Retry-After")
+            )
+            if retry_after is not None:
+                # Waiting longer than allowed is worse than failing fast
+                if retry_after > self.backoff_max:
+                    return None
+                return retry_after
+        cap = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return random.uniform(0, cap)
+
+
+class CircuitBreaker:
+    """Fails fast after repeated upstream errors.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    requests raise `CircuitOpenException` for `reset_timeout` seconds.
+    Then a single trial request is let through, its outcome either closes
+    the circuit or opens it again.
+    """
+
+    def __init__(
+        self, failure_threshold: int = 5, reset_timeout: float = 30.0
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Union[float, None] = None
+        self._trial_in_progress = False
+        self._trials = 0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def before_request(self) -> Union[int, None]:
+        """Raises while the circuit is open.
+
+        Returns number of the trial when the request is the trial one, its
+        outcome has to be recorded or the trial released.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return None
+            elapsed = time.monotonic() - self._opened_at
+            if elapsed < self.reset_timeout or self._trial_in_progress:
+                raise CircuitOpenException(
+                    "Too many upstream errors, requests are suspended."
+                )
+            self._trial_in_progress = True
+            self._trials += 1
+            return self._trials
+
+    def release_trial(self, trial: int) -> None:
+        """Ends trial which had no outcome, e.g. a cancelled one.
+
+        The circuit stays open and the next request becomes the trial.
+        """
+        with self._lock:
+            if self._trial_in_progress and trial == self._trials:
+                self._trial_in_progress = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if (
+                self._trial_in_progress
+                or self._failures >= self.failure_threshold
+            ):
+                self._opened_at = time.monotonic()
+                self._trial_in_progress = False
+
+
+def _parse_retry_after(value: Union[str, None]) -> Union[float, None]:
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
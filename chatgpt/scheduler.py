@@ -0,0 +1,279 @@
+"""Priority scheduling of requests sent through a client.
+
+A `Scheduler` caps the number of replies in progress and hands free
+slots to waiting requests by priority class, then in arrival order, so
+that interactive prompts don't queue behind batch jobs. Requests may
+have a deadline and a `CancellationToken`.
+"""
+import enum
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable
+from typing import Iterator
+from typing import List
+from typing import TYPE_CHECKING
+from typing import Union
+
+from chatgpt.exceptions import CancelledException
+from chatgpt.exceptions import DeadlineExceededException
+
+if TYPE_CHECKING:  # pragma: no cover
+    from chatgpt.api import ChatGPT
+    from chatgpt.api import Response
+    from chatgpt.conversation import Conversation
+    from chatgpt.pool import PooledConversation
+    from chatgpt.pool import SessionPool
+    from chatgpt.stop import Stop
+
+
+class Priority(enum.IntEnum):
+    """Priority classes, lower values are scheduled first."""
+
+    INTERACTIVE = 0
+    NORMAL = 1
+    BATCH = 2
+
+
+class CancellationToken:
+    """Cancels the requests it is passed to, from any thread.
+
+    Cancelling a request which is in progress closes its HTTP response.
+    Past `deadline`, a `time.monotonic()` value, the token counts as
+    cancelled with `DeadlineExceededException`, and waiting for a response
+    doesn't last longer than the time left.
+    """
+
+    def __init__(self, deadline: Union[float, None] = None) -> None:
+        self.deadline = deadline
+        self._error: Union[CancelledException, None] = None
+        self._callbacks: List[Callable[[], None]] = []
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._error is not None
+
+    @property
+    def error(self) -> Union[CancelledException, None]:
+        """Exception raised by the cancelled requests."""
+        return self._error
+
+    def cancel(self, error: Union[CancelledException, None] = None) -> None:
+        with self._lock:
+            if self._error is not None:
+                return
+            self._error = error or CancelledException("Request was cancelled.")
+            callbacks, self._callbacks = self._callbacks, []
+        self._cancelled.set()
+        for callback in callbacks:
+            callback()
+
+    def raise_if_cancelled(self) -> None:
+        if (
+            self._error is None
+            and self.deadline is not None
+            and time.monotonic() >= self.deadline
+        ):
+            self.cancel(DeadlineExceededException("Deadline exceeded."))
+        if self._error is not None:
+            raise self._error
+
+    def remaining(self) -> Union[float, None]:
+        """Returns seconds left before the deadline, None without one."""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def sleep(self, seconds: float) -> None:
+        """Waits `seconds`, raises once cancelled in the meantime."""
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+        self._cancelled.wait(seconds)
+        self.raise_if_cancelled()
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Calls `callback` once cancelled, returns function removing it."""
+        with self._lock:
+            if self._error is None:
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            try:
+                self._callbacks.remove(callback)
+            except ValueError:
+                pass
+
+
+class _Waiter:
+    __slots__ = ("key", "event", "granted")
+
+    def __init__(self, key: tuple) -> None:
+        self.key = key
+        self.event = threading.Event()
+        self.granted = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return self.key < other.key
+
+
+class Scheduler:
+    """Runs requests of a `ChatGPT` client or `SessionPool` by priority.
+
+    At most `concurrency` replies are in progress. A request with a
+    `timeout` is dropped with `DeadlineExceededException` if it can't start
+    within `timeout` seconds, and cancelled with the same exception if its
+    reply is still streaming once they have passed.
+    """
+
+    def __init__(
+        self, client: "Union[ChatGPT, SessionPool]", concurrency: int = 4
+    ) -> None:
+        self.client = client
+        self.concurrency = concurrency
+        self._active = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def send_message(
+        self,
+        message: str,
+        conversation: "Union[Conversation, PooledConversation, None]" = None,
+        *,
+        priority: int = Priority.NORMAL,
+        timeout: Union[float, None] = None,
+        cancel: Union[CancellationToken, None] = None,
+        stop: "Stop" = None,
+    ) -> "Response":
+        """Sends message once scheduled, in a new conversation by default."""
+        resp = None
+        for resp in self._run(
+            message,
+            conversation,
+            priority,
+            timeout,
+            cancel,
+            stop,
+            snapshots=False,
+        ):
+            pass
+        return resp  # type: ignore[return-value]
+
+    def stream_message(
+        self,
+        message: str,
+        conversation: "Union[Conversation, PooledConversation, None]" = None,
+        *,
+        priority: int = Priority.NORMAL,
+        timeout: Union[float, None] = None,
+        cancel: Union[CancellationToken, None] = None,
+        stop: "Stop" = None,
+    ) -> Iterator["Response"]:
+        """Sends message once scheduled, yields reply snapshots."""
+        return self._run(
+            message,
+            conversation,
+            priority,
+            timeout,
+            cancel,
+            stop,
+            snapshots=True,
+        )
+
+    def _run(
+        self,
+        message: str,
+        conversation: "Union[Conversation, PooledConversation, None]",
+        priority: int,
+        timeout: Union[float, None],
+        cancel: Union[CancellationToken, None],
+        stop: "Stop",
+        snapshots: bool,
+    ) -> Iterator["Response"]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # Cancelled by the caller or once the deadline has passed
+        token = CancellationToken(deadline)
+        unlink = None
+        if cancel is not None:
+            caller = cancel
+            unlink = caller.on_cancel(lambda: token.cancel(caller.error))
+        try:
+            self._acquire(priority, deadline, token)
+            timer = None
+            try:
+                if deadline is not None:
+                    timer = threading.Timer(
+                        deadline - time.monotonic(),
+                        token.cancel,
+                        (DeadlineExceededException("Deadline exceeded."),),
+                    )
+                    timer.daemon = True
+                    timer.start()
+                if conversation is None:
+                    conversation = self.client.conversation()
+                yield from conversation._converse(
+                    message, snapshots, token, stop
+                )
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                self._release()
+        finally:
+            if unlink is not None:
+                unlink()
+
+    def _acquire(
+        self,
+        priority: int,
+        deadline: Union[float, None],
+        token: CancellationToken,
+    ) -> None:
+        token.raise_if_cancelled()
+        with self._lock:
+            if self._active < self.concurrency and not self._waiters:
+                self._active += 1
+                return
+            waiter = _Waiter((priority, next(self._seq)))
+            heapq.heappush(self._waiters, waiter)
+        unregister = token.on_cancel(waiter.event.set)
+        try:
+            waiter.event.wait(
+                None if deadline is None else deadline - time.monotonic()
+            )
+        finally:
+            unregister()
+        with self._lock:
+            # The slot may have been handed over right after the wake-up
+            granted = waiter.granted
+            if not granted:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+        if granted and not token.cancelled:
+            return
+        if granted:
+            self._release()
+        token.raise_if_cancelled()
+        raise DeadlineExceededException("Request couldn't start in time.")
+
+    def _release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                # The slot passes to the first waiter, so it can't be taken
+                # by one which hasn't waited
+                waiter = heapq.heappop(self._waiters)
+                waiter.granted = True
+                waiter.event.set()
+            else:
+                self._active -= 1
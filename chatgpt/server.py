@@ -0,0 +1,420 @@
+"""Chat completions HTTP API in front of a `ChatGPT` client.
+
+Serves `POST /v1/chat/completions` (streaming and non-streaming) and
+`GET /v1/models` in the shape of the OpenAI API, so that many local
+services can share one authenticated client, its connection pool, cache
+and retry policy. A `SessionPool` can be served in place of the client.
+"""
+import collections
+import hashlib
+import json
+import threading
+import time
+from contextlib import closing
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Any
+from typing import Deque
+from typing import Dict
+from typing import Generator
+from typing import Iterator
+from typing import List
+from typing import Tuple
+from typing import TYPE_CHECKING
+from typing import Union
+
+import httpx
+
+from chatgpt import payloads
+from chatgpt.exceptions import APIClientException
+from chatgpt.exceptions import CircuitOpenException
+from chatgpt.exceptions import NoSessionAvailableException
+from chatgpt.exceptions import QueueFullException
+from chatgpt.exceptions import StatusCodeException
+
+if TYPE_CHECKING:  # pragma: no cover
+    from chatgpt.api import ChatGPT
+    from chatgpt.api import Response
+
+COMPLETIONS_PATH = "/v1/chat/completions"
+MODELS_PATH = "/v1/models"
+
+Message = Dict[str, Any]
+
+
+class RequestQueue:
+    """Caps concurrent upstream requests, queues a bounded number more.
+
+    Waiting requests are admitted in arrival order. A request is rejected
+    with `QueueFullException` when `max_queue` requests are already
+    waiting, or when it waits longer than `timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        max_queue: int = 64,
+        timeout: Union[float, None] = 30.0,
+    ) -> None:
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._active = 0
+        self._waiters: Deque[threading.Event] = collections.deque()
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if self._active < self.concurrency and not self._waiters:
+                self._active += 1
+                return
+            if len(self._waiters) >= self.max_queue:
+                raise QueueFullException("Too many requests are waiting.")
+            event = threading.Event()
+            self._waiters.append(event)
+        if event.wait(self.timeout):
+            return
+        with self._lock:
+            # The slot may have been handed over right after the timeout
+            if event.is_set():
+                return
+            self._waiters.remove(event)
+        raise QueueFullException("Timed out waiting for a free slot.")
+
+    def _release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                # The slot passes to the next request, so it can't be taken
+                # by one which hasn't waited
+                self._waiters.popleft().set()
+            else:
+                self._active -= 1
+
+
+class ConversationIndex:
+    """Maps chat histories to the conversations holding them.
+
+    A request whose history ends with a reply given by this server
+    continues that conversation with just the last message, instead of
+    replaying the whole history in a new one.
+    """
+
+    def __init__(self, maxsize: int = 10_000) -> None:
+        self.maxsize = maxsize
+        self._entries: "collections.OrderedDict[str, Tuple[str, str]]"
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, messages: List[Message]) -> Union[Tuple[str, str], None]:
+        key = _history_key(messages)
+        with self._lock:
+            state = self._entries.get(key)
+            if state is not None:
+                self._entries.move_to_end(key)
+            return state
+
+    def set(self, messages: List[Message], response: "Response") -> None:
+        key = _history_key(messages)
+        with self._lock:
+            self._entries[key] = (
+                response.conversation_id,
+                response.parent_message_id,
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+class ProxyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        client: "ChatGPT",
+        queue: RequestQueue,
+        conversations: Union[ConversationIndex, None] = None,
+    ) -> None:
+        super().__init__(address, _Handler)
+        self.client = client
+        self.queue = queue
+        self.conversations = conversations or ConversationIndex()
+
+    def complete(
+        self, messages: List[Message], stream: bool = True
+    ) -> Generator["Response", None, None]:
+        """Yields reply snapshots to the last message of a chat history.
+
+        Unless `stream` is set, only the completed reply is yielded.
+        """
+        state = self.conversations.get(messages[:-1])
+        if state is not None:
+            prompt = _content(messages[-1])
+            conversation = self.client.conversation(*state)
+        else:
+            prompt = _render_history(messages)
+            conversation = self.client.conversation()
+        with self.queue.slot():
+            resp = None
+            for resp in conversation._converse(prompt, snapshots=stream):
+                yield resp
+        if resp is not None:
+            self.conversations.set(
+                messages + [{"role": "assistant", "content": resp.content}],
+                resp,
+            )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: ProxyServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path != MODELS_PATH:
+            return self._send_error(404, "Not found.", "invalid_request_error")
+        self._send_json(
+            200,
+            {
+                "object": "list",
+                "data": [
+                    {"id": payloads.MODEL, "object": "model", "owned_by": ""}
+                ],
+            },
+        )
+
+    def do_POST(self) -> None:
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length))
+            messages = body["messages"]
+            stream = bool(body.get("stream", False))
+            model = body.get("model") or payloads.MODEL
+            if not messages:
+                raise ValueError("`messages` must not be empty.")
+            for message in messages:
+                _content(message)
+        except (ValueError, TypeError, KeyError):
+            return self._send_error(
+                400, "Invalid request body.", "invalid_request_error"
+            )
+        if self.path != COMPLETIONS_PATH:
+            return self._send_error(404, "Not found.", "invalid_request_error")
+
+        replies = self.server.complete(messages, stream)
+        with closing(replies):
+            try:
+                # Errors before the first snapshot are sent with a status
+                first = next(replies, None)
+            except QueueFullException as e:
+                return self._send_error(
+                    429,
+                    str(e),
+                    "rate_limit_error",
+                    headers={"Retry-After": "1"},
+                )
+            except Exception as e:
+                return self._send_upstream_error(e)
+            if first is None:
+                return self._send_upstream_error(None)
+            if stream:
+                return self._stream_completion(first, replies, model)
+            resp = first
+            try:
+                for resp in replies:
+                    pass
+            except Exception as e:
+                return self._send_upstream_error(e)
+            self._send_json(200, _completion(resp, model))
+
+    def _stream_completion(
+        self, first: "Response", replies: Iterator["Response"], model: str
+    ) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        created = int(time.time())
+        sent = 0
+        resp = first
+        try:
+            try:
+                for resp in _chain(first, replies):
+                    # Snapshots hold the whole reply, send what's new
+                    delta = resp.content[sent:]
+                    sent = len(resp.content)
+                    if delta:
+                        self._send_event(
+                            _chunk(resp, model, created, {"content": delta})
+                        )
+                finish_reason = "stop"
+            except Exception:
+                # Status was already sent, end the stream
+                finish_reason = "error"
+            self._send_event(
+                _chunk(resp, model, created, {}, finish_reason=finish_reason)
+            )
+            self._send_chunk(b"data: [DONE]\n\n")
+            self._send_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away, closing `replies` cancels the upstream reply
+            self.close_connection = True
+
+    def _send_event(self, data: dict) -> None:
+        self._send_chunk(f"data: {json.dumps(data)}\n\n".encode())
+
+    def _send_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send_upstream_error(self, error: Union[Exception, None]) -> None:
+        if isinstance(error, httpx.TimeoutException):
+            status, message = 504, "ChatGPT didn't respond in time."
+        elif isinstance(
+            error, (CircuitOpenException, NoSessionAvailableException)
+        ):
+            status, message = 503, str(error)
+        elif isinstance(error, StatusCodeException):
+            status = 502
+            message = f"ChatGPT responded with status {error.status_code}."
+        elif isinstance(error, (APIClientException, httpx.HTTPError)):
+            status, message = 502, f"{type(error).__name__}: {error}"
+        elif error is None:
+            status, message = 502, "ChatGPT sent no reply."
+        else:
+            status, message = 500, "Internal server error."
+        self._send_error(status, message, "api_error")
+
+    def _send_error(
+        self,
+        status: int,
+        message: str,
+        type_: str,
+        headers: Union[Dict[str, str], None] = None,
+    ) -> None:
+        self._send_json(
+            status, {"error": {"message": message, "type": type_}}, headers
+        )
+
+    def _send_json(
+        self,
+        status: int,
+        data: dict,
+        headers: Union[Dict[str, str], None] = None,
+    ) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(
+    client: "ChatGPT",
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    concurrency: int = 8,
+    max_queue: int = 64,
+    queue_timeout: Union[float, None] = 30.0,
+) -> None:
+    """Serves chat completions until interrupted."""
+    server = ProxyServer(
+        (host, port),
+        client,
+        RequestQueue(concurrency, max_queue, queue_timeout),
+    )
+    with server:
+        server.serve_forever()
+
+
+def _chain(
+    first: "Response", rest: Iterator["Response"]
+) -> Iterator["Response"]:
+    yield first
+    yield from rest
+
+
+def _completion(resp: "Response", model: str) -> dict:
+    return {
+        "id": f"chatcmpl-{resp.id}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": resp.content},
+                "finish_reason": "stop",
+            }
+        ],
+    }
+
+
+def _chunk(
+    resp: "Response",
+    model: str,
+    created: int,
+    delta: dict,
+    finish_reason: Union[str, None] = None,
+) -> dict:
+    return {
+        "id": f"chatcmpl-{resp.id}",
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [
+            {"index": 0, "delta": delta, "finish_reason": finish_reason}
+        ],
+    }
+
+
+def _content(message: Message) -> str:
+    """Returns text of a message, content may be a list of parts."""
+    content = message["content"]
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        if not all(isinstance(part, dict) for part in content):
+            raise TypeError("Unsupported message content part.")
+        return "\n".join(
+            part["text"] for part in content if part.get("type") == "text"
+        )
+    raise TypeError("Unsupported message content.")
+
+
+def _render_history(messages: List[Message]) -> str:
+    if len(messages) == 1 and messages[0].get("role", "user") == "user":
+        return _content(messages[0])
+    return "\n\n".join(
+        f"{message.get('role', 'user').capitalize()}: {_content(message)}"
+        for message in messages
+    )
+
+
+def _history_key(messages: List[Message]) -> str:
+    history = [
+        (message.get("role", "user"), _content(message))
+        for message in messages
+    ]
+    return hashlib.sha256(
+        json.dumps(history, ensure_ascii=False).encode()
+    ).hexdigest()
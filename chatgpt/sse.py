@@ -0,0 +1,84 @@
+import json
+from typing import Any
+from typing import List
+
+DONE = b"[DONE]"
+
+
+class Event:
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+    def __repr__(self) -> str:
+        return f"Event({self.data!r})"
+
+    @property
+    def done(self) -> bool:
+        """Whether this is the `[DONE]` event ending the stream."""
+        return self.data == DONE
+
+    def json(self) -> Any:
+        return json.loads(self.data)
+
+
+class EventStreamParser:
+    """Splits a byte stream into events.
+
+    Lines may end with LF or CRLF and may be split across chunks. Data
+    of an event may span many `data:` lines, other fields and comments
+    are ignored. An event ends with an empty line or the end of stream.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._data: List[bytes] = []
+
+    def feed(self, chunk: bytes) -> List[Event]:
+        """Parses a chunk, returns events completed by it."""
+        events: List[Event] = []
+        if not chunk:
+            return events
+        buffer = self._buffer
+        # Search only the new bytes, the buffer holds no line end
+        start = len(buffer)
+        buffer += chunk
+        line_start = 0
+        while True:
+            line_end = buffer.find(b"\n", start)
+            if line_end == -1:
+                break
+            self._parse_line(bytes(buffer[line_start:line_end]), events)
+            line_start = start = line_end + 1
+        del buffer[:line_start]
+        return events
+
+    def close(self) -> List[Event]:
+        """Parses what's left once the stream has ended."""
+        events: List[Event] = []
+        if self._buffer:
+            self._parse_line(bytes(self._buffer), events)
+            self._buffer.clear()
+        self._dispatch(events)
+        return events
+
+    def _parse_line(self, line: bytes, events: List[Event]) -> None:
+        if line.endswith(b"\r"):
+            line = line[:-1]
+        if not line:
+            self._dispatch(events)
+        elif line.startswith(b"data:"):
+            value = line[5:]
+            if value.startswith(b" "):
+                value = value[1:]
+            self._data.append(value)
+
+    def _dispatch(self, events: List[Event]) -> None:
+        if not self._data:
+            return
+        if len(self._data) == 1:
+            events.append(Event(self._data[0]))
+        else:
+            events.append(Event(b"\n".join(self._data)))
+        self._data = []
@@ -0,0 +1,116 @@
+"""Conditions which end a reply before the chat bot finishes it.
+
+A stop condition is called with the reply text received so far and
+returns how many characters of it to keep once it matches, or None. When
+one matches, the reply stream is closed and the reply is cut to that
+length. Any such callable can be used as a condition.
+"""
+import json
+import re
+from typing import Callable
+from typing import Sequence
+from typing import Union
+
+StopCondition = Callable[[str], Union[int, None]]
+# One condition or many, any of which ends the reply
+Stop = Union[StopCondition, Sequence[StopCondition], None]
+
+_OPENING = re.compile(r"[\[{]")
+# What a value cut off inside a number or a literal may end with
+_PARTIAL_TOKEN = re.compile(r"[-+.eE0-9]+|t(ru?)?|f(a(ls?)?)?|n(ul?)?")
+
+
+class StopSequence:
+    """Matches the first of `sequences`, which is kept with `include`."""
+
+    def __init__(self, *sequences: str, include: bool = False) -> None:
+        if not sequences or not all(sequences):
+            raise ValueError("Stop sequences must not be empty.")
+        self.sequences = sequences
+        self.include = include
+
+    def __call__(self, text: str) -> Union[int, None]:
+        match = None
+        for sequence in self.sequences:
+            index = text.find(sequence)
+            if index == -1:
+                continue
+            end = index + len(sequence) if self.include else index
+            if match is None or end < match:
+                match = end
+        return match
+
+
+class MaxChars:
+    """Matches once the reply is `max_chars` characters long."""
+
+    def __init__(self, max_chars: int) -> None:
+        self.max_chars = max_chars
+
+    def __call__(self, text: str) -> Union[int, None]:
+        return self.max_chars if len(text) >= self.max_chars else None
+
+
+class FirstJSONValue:
+    """Matches once the first JSON object or array in the reply is complete.
+
+    Text before it is kept, e.g. the opening of a Markdown code block.
+    Brackets which don't start a JSON value, e.g. of a link, are skipped.
+    """
+
+    def __init__(self) -> None:
+        self._decoder = json.JSONDecoder()
+
+    def __call__(self, text: str) -> Union[int, None]:
+        # A value can't be complete until some bracket closes after it
+        last_close = max(text.rfind("}"), text.rfind("]"))
+        opening = _OPENING.search(text)
+        while opening is not None and opening.start() < last_close:
+            try:
+                _, end = self._decoder.raw_decode(text, opening.start())
+            except json.JSONDecodeError as e:
+                if _is_cut_off(text, e):
+                    return None
+                # Not JSON, e.g. a Markdown link, the value may come later
+                opening = _OPENING.search(text, opening.start() + 1)
+                continue
+            return end
+        return None
+
+
+def _is_cut_off(text: str, error: json.JSONDecodeError) -> bool:
+    """Tells if decoding failed only because the value isn't complete yet."""
+    pos = error.pos
+    rest = text[pos:].rstrip()
+    return (
+        not rest
+        or error.msg.startswith("Unterminated string")
+        or _PARTIAL_TOKEN.fullmatch(rest) is not None
+    )
+
+
+class StopWhen:
+    """Matches when `predicate` is true for the reply, which is kept whole."""
+
+    def __init__(self, predicate: Callable[[str], bool]) -> None:
+        self.predicate = predicate
+
+    def __call__(self, text: str) -> Union[int, None]:
+        return len(text) if self.predicate(text) else None
+
+
+def combine(stop: Stop) -> Union[StopCondition, None]:
+    """Returns condition matching when any of `stop` does, at the earliest."""
+    if stop is None or callable(stop):
+        return stop
+    conditions = list(stop)
+    if not conditions:
+        return None
+
+    def first_match(text: str) -> Union[int, None]:
+        ends = [
+            end for end in (c(text) for c in conditions) if end is not None
+        ]
+        return min(ends) if ends else None
+
+    return first_match
@@ -0,0 +1,211 @@
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+from typing import TYPE_CHECKING
+from typing import Union
+
+from chatgpt.const import CONVERSATION_STORE_FILE
+
+if TYPE_CHECKING:  # pragma: no cover
+    from chatgpt.api import Response
+
+# Length of the first prompt kept as conversation title
+TITLE_LENGTH = 100
+
+
+@dataclass
+class StoredConversation:
+    id: str
+    title: str
+    # Id of the last reply, the parent of the next message
+    parent_message_id: str
+    created_at: float
+    updated_at: float
+
+
+@dataclass
+class Turn:
+    message_id: str
+    # Id of the message the reply answers
+    parent_message_id: str
+    prompt: str
+    reply: str
+    created_at: float
+
+
+class ConversationStore:
+    """Keeps conversation turns, so that conversations can be resumed."""
+
+    def save_turn(
+        self, prompt: str, parent_message_id: str, response: "Response"
+    ) -> None:
+        raise NotImplementedError
+
+    def get(self, conversation_id: str) -> Union[StoredConversation, None]:
+        raise NotImplementedError
+
+    def list_conversations(
+        self, limit: int = 20, offset: int = 0
+    ) -> List[StoredConversation]:
+        """Returns conversations, the most recently updated first."""
+        raise NotImplementedError
+
+    def search(self, query: str, limit: int = 20) -> List[StoredConversation]:
+        """Returns conversations with turns containing all query words."""
+        raise NotImplementedError
+
+    def turns(self, conversation_id: str) -> List[Turn]:
+        """Returns turns of a conversation, the oldest first."""
+        raise NotImplementedError
+
+
+class SQLiteConversationStore(ConversationStore):
+    """Keeps conversations in an SQLite database.
+
+    Resuming reads a single row by primary key. Search uses a full-text
+    index when SQLite is built with FTS5, otherwise it scans the turns.
+    """
+
+    def __init__(self, path: Union[Path, str, None] = None) -> None:
+        path = Path(path) if path is not None else CONVERSATION_STORE_FILE
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        with self._db:
+            self._db.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    parent_message_id TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS conversations_updated_at
+                    ON conversations (updated_at);
+                CREATE TABLE IF NOT EXISTS turns (
+                    id INTEGER PRIMARY KEY,
+                    conversation_id TEXT NOT NULL,
+                    message_id TEXT NOT NULL,
+                    parent_message_id TEXT NOT NULL,
+                    prompt TEXT NOT NULL,
+                    reply TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS turns_conversation_id
+                    ON turns (conversation_id, created_at);
+                """
+            )
+            try:
+                self._db.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING "
+                    "fts5(text, content='')"
+                )
+                self._fts = True
+            except sqlite3.OperationalError:
+                self._fts = False
+
+    def close(self) -> None:
+        self._db.close()
+
+    def save_turn(
+        self, prompt: str, parent_message_id: str, response: "Response"
+    ) -> None:
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO conversations (id, title, parent_message_id, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET "
+                "parent_message_id = excluded.parent_message_id, "
+                "updated_at = excluded.updated_at",
+                (
+                    response.conversation_id,
+                    prompt[:TITLE_LENGTH],
+                    response.parent_message_id,
+                    now,
+                    now,
+                ),
+            )
+            rowid = self._db.execute(
+                "INSERT INTO turns (conversation_id, message_id, "
+                "parent_message_id, prompt, reply, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    response.conversation_id,
+                    response.id,
+                    parent_message_id,
+                    prompt,
+                    response.content,
+                    now,
+                ),
+            ).lastrowid
+            if self._fts:
+                self._db.execute(
+                    "INSERT INTO turns_fts (rowid, text) VALUES (?, ?)",
+                    (rowid, f"{prompt}\n{response.content}"),
+                )
+
+    def get(self, conversation_id: str) -> Union[StoredConversation, None]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, title, parent_message_id, created_at, updated_at "
+                "FROM conversations WHERE id = ?",
+                (conversation_id,),
+            ).fetchone()
+        return StoredConversation(*row) if row is not None else None
+
+    def list_conversations(
+        self, limit: int = 20, offset: int = 0
+    ) -> List[StoredConversation]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, title, parent_message_id, created_at, updated_at "
+                "FROM conversations ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return [StoredConversation(*row) for row in rows]
+
+    def search(self, query: str, limit: int = 20) -> List[StoredConversation]:
+        words = query.split()
+        if not words:
+            return []
+        if self._fts:
+            condition = (
+                "id IN (SELECT rowid FROM turns_fts WHERE turns_fts MATCH ?)"
+            )
+            params = [" ".join(_quote(word) for word in words)]
+        else:
+            condition = " AND ".join(
+                "(prompt LIKE ? OR reply LIKE ?)" for _ in words
+            )
+            params = []
+            for word in words:
+                params += [f"%{word}%"] * 2
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, title, parent_message_id, created_at, updated_at "
+                "FROM conversations WHERE id IN (SELECT conversation_id "
+                f"FROM turns WHERE {condition}) "
+                "ORDER BY updated_at DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [StoredConversation(*row) for row in rows]
+
+    def turns(self, conversation_id: str) -> List[Turn]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT message_id, parent_message_id, prompt, reply, "
+                "created_at FROM turns WHERE conversation_id = ? "
+                "ORDER BY created_at, id",
+                (conversation_id,),
+            ).fetchall()
+        return [Turn(*row) for row in rows]
+
+
+def _quote(word: str) -> str:
+    """Quotes word for FTS5 query, so that it's matched literally."""
+    return '"{}"'.format(word.replace('"', '""'))
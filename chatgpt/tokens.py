@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict
+from typing import Union
+
+from chatgpt.const import TOKEN_CACHE_FILE
+
+
+@dataclass
+class AccessToken:
+    value: str
+    expires_at: Union[float, None] = None
+
+    def is_expired(self, margin: float = 0) -> bool:
+        """Whether token expires within `margin` seconds."""
+        if self.expires_at is None:
+            return False
+        return time.time() + margin >= self.expires_at
+
+
+class TokenCache:
+    """Stores access tokens between clients and processes."""
+
+    def get(self, session_token: str) -> Union[AccessToken, None]:
+        raise NotImplementedError
+
+    def set(self, session_token: str, token: AccessToken) -> None:
+        raise NotImplementedError
+
+    def delete(self, session_token: str) -> None:
+        raise NotImplementedError
+
+
+class MemoryTokenCache(TokenCache):
+    def __init__(self) -> None:
+        self._tokens: Dict[str, AccessToken] = {}
+
+    def get(self, session_token: str) -> Union[AccessToken, None]:
+        return self._tokens.get(session_token)
+
+    def set(self, session_token: str, token: AccessToken) -> None:
+        self._tokens[session_token] = token
+
+    def delete(self, session_token: str) -> None:
+        self._tokens.pop(session_token, None)
+
+
+class FileTokenCache(TokenCache):
+    """Keeps tokens in a JSON file, readable only by its owner.
+
+    Session tokens are not stored, entries are keyed by their hash.
+    """
+
+    def __init__(self, path: Union[Path, str, None] = None) -> None:
+        self._path = Path(path) if path is not None else TOKEN_CACHE_FILE
+        self._lock = threading.Lock()
+
+    def get(self, session_token: str) -> Union[AccessToken, None]:
+        with self._lock:
+            entry = self._read().get(_fingerprint(session_token))
+        if entry is None:
+            return None
+        return AccessToken(entry["access_token"], entry.get("expires_at"))
+
+    def set(self, session_token: str, token: AccessToken) -> None:
+        with self._lock:
+            entries = self._read()
+            entries[_fingerprint(session_token)] = {
+                "access_token": token.value,
+                "expires_at": token.expires_at,
+            }
+            self._write(entries)
+
+    def delete(self, session_token: str) -> None:
+        with self._lock:
+            entries = self._read()
+            if entries.pop(_fingerprint(session_token), None) is not None:
+                self._write(entries)
+
+    def _read(self) -> dict:
+        try:
+            with open(self._path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, entries: dict) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.with_name(self._path.name + ".tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self._path)
+
+
+def parse_expires(value: Union[str, None]) -> Union[float, None]:
+    """Converts `expires` field of the session response to a timestamp."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def _fingerprint(session_token: str) -> str:
+    return hashlib.sha256(str(session_token).encode()).hexdigest()
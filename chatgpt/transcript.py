@@ -0,0 +1,106 @@
+import atexit
+import json
+import logging.handlers
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any
+from typing import Union
+
+from chatgpt.const import LOGGING_DIR
+
+
+class JSONLFormatter(logging.Formatter):
+    """Serializes transcript entries, one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(
+            getattr(record, "transcript", {}), ensure_ascii=False
+        )
+
+
+class Transcript:
+    """Records conversation turns without blocking the caller.
+
+    Entries are put on a queue and written by a background listener
+    thread, so the request path never waits for file I/O. A single
+    transcript can be shared by any number of clients.
+    """
+
+    def __init__(self, handler: logging.Handler) -> None:
+        handler.setFormatter(JSONLFormatter())
+        self._handler = handler
+        self._queue: "queue.Queue[Any]" = queue.Queue(-1)
+        self._listener = logging.handlers.QueueListener(self._queue, handler)
+        # Every transcript has its own logger, so entries don't leak to
+        # the handlers of other transcripts or the root logger
+        self._logger = logging.Logger(
+            f"ChatGPT.transcript.{id(self)}", level=logging.INFO
+        )
+        self._logger.addHandler(logging.handlers.QueueHandler(self._queue))
+        self._listener.start()
+        self._closed = False
+
+    @classmethod
+    def to_file(
+        cls,
+        path: Union[Path, str],
+        *,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+        when: Union[str, None] = None,
+    ) -> "Transcript":
+        """Creates transcript written to a rotating JSONL file.
+
+        The file is rotated when it reaches `max_bytes`, or on the time
+        interval given by `when` (as in `TimedRotatingFileHandler`).
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        handler: logging.Handler
+        if when is not None:
+            handler = logging.handlers.TimedRotatingFileHandler(
+                str(path),
+                when=when,
+                backupCount=backup_count,
+                encoding="utf-8",
+            )
+        else:
+            handler = logging.handlers.RotatingFileHandler(
+                str(path),
+                maxBytes=max_bytes,
+                backupCount=backup_count,
+                encoding="utf-8",
+            )
+        return cls(handler)
+
+    def record(self, **fields: Any) -> None:
+        """Queues an entry, fields have to be JSON serializable."""
+        if self._closed:
+            return
+        fields.setdefault("timestamp", time.time())
+        self._logger.info("", extra={"transcript": fields})
+
+    def close(self) -> None:
+        """Writes queued entries and releases the file."""
+        if self._closed:
+            return
+        self._closed = True
+        self._listener.stop()
+        self._handler.close()
+
+
+_default_transcript: Union[Transcript, None] = None
+_default_lock = threading.Lock()
+
+
+def get_default_transcript() -> Transcript:
+    """Returns transcript shared by all clients of this process."""
+    global _default_transcript
+    with _default_lock:
+        if _default_transcript is None:
+            _default_transcript = Transcript.to_file(
+                LOGGING_DIR / "transcript.jsonl"
+            )
+            atexit.register(_default_transcript.close)
+        return _default_transcript
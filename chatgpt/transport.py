@@ -0,0 +1,118 @@
+from dataclasses import dataclass
+from types import TracebackType
+from typing import Type
+from typing import Union
+
+import httpx
+
+
+@dataclass
+class TransportConfig:
+    """Timeouts and connection pool settings of a client.
+
+    `read_timeout` bounds the wait for the next chunk of a reply, not the
+    whole reply, so long answers aren't aborted while dead connections
+    are detected quickly. None disables a timeout. HTTP/2 requires the
+    `h2` package (`pip install httpx[http2]`).
+    """
+
+    connect_timeout: Union[float, None] = 10.0
+    read_timeout: Union[float, None] = 60.0
+    write_timeout: Union[float, None] = 10.0
+    # Wait for a free connection when all `max_connections` are in use
+    pool_timeout: Union[float, None] = 30.0
+    max_connections: Union[int, None] = 100
+    max_keepalive_connections: Union[int, None] = 50
+    # Seconds an idle connection is kept open
+    keepalive_expiry: Union[float, None] = 60.0
+    http2: bool = False
+    retries: int = 0
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout,
+        )
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def create_transport(self) -> httpx.HTTPTransport:
+        return httpx.HTTPTransport(
+            limits=self.limits, http2=self.http2, retries=self.retries
+        )
+
+    def create_async_transport(self) -> httpx.AsyncHTTPTransport:
+        return httpx.AsyncHTTPTransport(
+            limits=self.limits, http2=self.http2, retries=self.retries
+        )
+
+    def shared_transport(self) -> "SharedTransport":
+        """Creates connection pool to be passed to many `ChatGPT` clients."""
+        return SharedTransport(self.create_transport())
+
+    def shared_async_transport(self) -> "AsyncSharedTransport":
+        """Creates connection pool to be passed to many `AsyncChatGPT`."""
+        return AsyncSharedTransport(self.create_async_transport())
+
+
+class SharedTransport(httpx.BaseTransport):
+    """Transport used by many clients.
+
+    Closing a client leaves the pool open for the other clients, the
+    owner closes it with `shutdown` once all of them are done.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport) -> None:
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self._transport.handle_request(request)
+
+    def close(self) -> None:
+        pass
+
+    def __exit__(
+        self,
+        exc_type: Union[Type[BaseException], None] = None,
+        exc_value: Union[BaseException, None] = None,
+        traceback: Union[TracebackType, None] = None,
+    ) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        self._transport.close()
+
+
+class AsyncSharedTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of `SharedTransport`."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self._transport = transport
+
+    async def handle_async_request(
+        self, request: httpx.Request
+    ) -> httpx.Response:
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        pass
+
+    async def __aexit__(
+        self,
+        exc_type: Union[Type[BaseException], None] = None,
+        exc_value: Union[BaseException, None] = None,
+        traceback: Union[TracebackType, None] = None,
+    ) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        await self._transport.aclose()
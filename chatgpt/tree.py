@@ -0,0 +1,81 @@
+import collections
+import threading
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Union
+
+from chatgpt.exceptions import MessageNotFoundException
+
+
+class MessageTree:
+    """Ids of replies linked to the message each one answered.
+
+    Every reply a client receives is recorded, so that a conversation can
+    be forked at any of them. Only ids are kept, no content. The oldest
+    replies are forgotten above `max_messages` entries.
+    """
+
+    def __init__(self, max_messages: int = 100_000) -> None:
+        self.max_messages = max_messages
+        # message id -> (parent message id, conversation id)
+        self._nodes: "collections.OrderedDict[str, Tuple[str, str]]"
+        self._nodes = collections.OrderedDict()
+        # parent message id -> replies to it, parents may be unrecorded
+        self._children: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, message_id: object) -> bool:
+        return message_id in self._nodes
+
+    def add(
+        self, message_id: str, parent_message_id: str, conversation_id: str
+    ) -> None:
+        with self._lock:
+            if message_id in self._nodes:
+                return
+            self._nodes[message_id] = (parent_message_id, conversation_id)
+            self._children.setdefault(parent_message_id, []).append(message_id)
+            while len(self._nodes) > self.max_messages:
+                self._forget(*self._nodes.popitem(last=False))
+
+    def conversation_id(self, message_id: str) -> str:
+        """Returns conversation of a recorded reply."""
+        node = self._nodes.get(message_id)
+        if node is None:
+            raise MessageNotFoundException(message_id)
+        return node[1]
+
+    def parent(self, message_id: str) -> Union[str, None]:
+        """Returns message the reply answered, None if it isn't recorded."""
+        node = self._nodes.get(message_id)
+        return node[0] if node is not None else None
+
+    def children(self, message_id: str) -> List[str]:
+        """Returns replies to messages sent after `message_id`, oldest first.
+
+        More than one means the conversation was forked there.
+        """
+        with self._lock:
+            return list(self._children.get(message_id, ()))
+
+    def path(self, message_id: str) -> List[str]:
+        """Returns recorded replies leading to `message_id`, oldest first."""
+        path = []
+        with self._lock:
+            node = self._nodes.get(message_id)
+            while node is not None:
+                path.append(message_id)
+                message_id = node[0]
+                node = self._nodes.get(message_id)
+        path.reverse()
+        return path
+
+    def _forget(self, message_id: str, node: Tuple[str, str]) -> None:
+        siblings = self._children[node[0]]
+        siblings.remove(message_id)
+        if not siblings:
+            del self._children[node[0]]
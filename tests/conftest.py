@@ -1,7 +1,12 @@
+import json
+
 import httpx
 import pytest
 
 from chatgpt import api
+from chatgpt import store
+from chatgpt import tokens
+from chatgpt import transcript
 
 
 @pytest.fixture
@@ -9,6 +14,32 @@ def assert_all_responses_were_requested() -> bool:
     return True
 
 
+@pytest.fixture(autouse=True)
+def token_cache_file(tmp_path, monkeypatch):
+    """Keeps file token cache away from the user's home directory."""
+    path = tmp_path / "tokens.json"
+    monkeypatch.setattr(tokens, "TOKEN_CACHE_FILE", path)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def conversation_store_file(tmp_path, monkeypatch):
+    """Keeps conversation store away from the user's home directory."""
+    path = tmp_path / "conversations.db"
+    monkeypatch.setattr(store, "CONVERSATION_STORE_FILE", path)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def default_transcript(tmp_path, monkeypatch):
+    """Keeps shared transcript away from the user's home directory."""
+    monkeypatch.setattr(transcript, "LOGGING_DIR", tmp_path / "logs")
+    monkeypatch.setattr(transcript, "_default_transcript", None)
+    yield tmp_path / "logs" / "transcript.jsonl"
+    if transcript._default_transcript is not None:
+        transcript._default_transcript.close()
+
+
 @pytest.fixture
 def session_token():
     return "abf7194fa9c841dfb9e57fd86b00c189"
@@ -38,3 +69,41 @@ def chatgpt_authenticated(httpx_mock, session_token):
 def valid_response_data():
     with open("tests/valid_response_test_data.txt") as f:
         return f.read()
+
+
+@pytest.fixture
+def echo_reply():
+    """Replies with the upper-cased message, ids are derived from it."""
+
+    def custom_response(request):
+        body = json.loads(request.content)
+        message = body["messages"][0]["content"]["parts"][0]
+        conv_id = body["conversation_id"] or f"conv-{message}"
+        data = {
+            "message": {
+                "id": f"msg-{message}",
+                "content": {
+                    "content_type": "text",
+                    "parts": [message.upper()],
+                },
+            },
+            "conversation_id": conv_id,
+        }
+        return httpx.Response(
+            status_code=200,
+            content=f"data: {json.dumps(data)}\n\ndata: [DONE]",
+        )
+
+    return custom_response
+
+
+@pytest.fixture
+def auth_reply():
+    def custom_response(request):
+        return httpx.Response(
+            status_code=200,
+            json={"accessToken": "access123"},
+            headers={"Set-Cookie": f"{api.ChatGPT._AUTH_COOKIE_NAME}=12345"},
+        )
+
+    return custom_response
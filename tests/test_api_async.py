@@ -0,0 +1,87 @@
+import asyncio
+
+import httpx
+import pytest
+
+from chatgpt import api
+from chatgpt import exceptions
+
+
+def _auth_response(request):
+    return httpx.Response(
+        status_code=200,
+        json={"accessToken": "access123"},
+        headers={"Set-Cookie": f"{api.ChatGPT._AUTH_COOKIE_NAME}=12345"},
+    )
+
+
+def test_async_api_send_message_valid(
+    httpx_mock, session_token, valid_response_data
+):
+    def custom_response(request):
+        return httpx.Response(status_code=200, content=valid_response_data)
+
+    httpx_mock.add_callback(_auth_response, url=api.AsyncChatGPT._AUTH_URL)
+    httpx_mock.add_callback(custom_response, url=api.AsyncChatGPT._CONV_URL)
+
+    async def main():
+        async with api.AsyncChatGPT(session_token=session_token) as chat:
+            assert chat._auth_flag is True
+            response = await chat.send_message("foo")
+            return chat, response
+
+    chat, response = asyncio.run(main())
+    assert response.content == "Avocado"
+    assert chat.conversation_id == "234"
+    assert chat._parent_message_id == "123"
+
+
+def test_async_api_stream_message_valid(
+    httpx_mock, session_token, valid_response_data
+):
+    def custom_response(request):
+        return httpx.Response(status_code=200, content=valid_response_data)
+
+    httpx_mock.add_callback(_auth_response, url=api.AsyncChatGPT._AUTH_URL)
+    httpx_mock.add_callback(custom_response, url=api.AsyncChatGPT._CONV_URL)
+
+    async def main():
+        async with api.AsyncChatGPT(session_token=session_token) as chat:
+            return [r.content async for r in chat.stream_message("foo")]
+
+    assert asyncio.run(main()) == ["ghijkl", "abcdef", "Avocado"]
+
+
+def test_async_api_send_message_not_authenticated(session_token):
+    chat = api.AsyncChatGPT(session_token=session_token)
+    with pytest.raises(exceptions.UnauthorizedException):
+        asyncio.run(chat.send_message("foo"))
+
+
+def test_async_api_send_message_invalid_401_status_code(
+    httpx_mock, session_token
+):
+    def custom_response(request):
+        return httpx.Response(status_code=401)
+
+    httpx_mock.add_callback(_auth_response, url=api.AsyncChatGPT._AUTH_URL)
+    httpx_mock.add_callback(custom_response, url=api.AsyncChatGPT._CONV_URL)
+
+    async def main():
+        async with api.AsyncChatGPT(session_token=session_token) as chat:
+            await chat.send_message("foo")
+
+    with pytest.raises(exceptions.UnauthorizedException):
+        asyncio.run(main())
+
+
+def test_async_api_invalid_authentication_403_status_code(
+    httpx_mock, session_token
+):
+    def custom_response(request):
+        return httpx.Response(status_code=403)
+
+    httpx_mock.add_callback(custom_response)
+    chat = api.AsyncChatGPT(session_token=session_token)
+    with pytest.raises(exceptions.ForbiddenException):
+        asyncio.run(chat.authenticate())
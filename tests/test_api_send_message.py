@@ -91,3 +91,48 @@ def test_api_send_message_invalid_json_response_structure(
     httpx_mock.add_callback(custom_response, url=api.ChatGPT._CONV_URL)
     with pytest.raises(exceptions.InvalidResponseException):
         chatgpt_authenticated.send_message("foo")
+
+
+def test_api_stream_message_valid(
+    httpx_mock, chatgpt_authenticated: api.ChatGPT, valid_response_data
+):
+    def custom_response(request):
+        return httpx.Response(
+            status_code=200,
+            content=valid_response_data,
+        )
+
+    httpx_mock.add_callback(custom_response, url=api.ChatGPT._CONV_URL)
+    responses = list(chatgpt_authenticated.stream_message("foo"))
+    assert [r.content for r in responses] == ["ghijkl", "abcdef", "Avocado"]
+    assert chatgpt_authenticated.conversation_id == "234"
+    assert chatgpt_authenticated._parent_message_id == "123"
+
+
+def test_api_stream_message_closed_early_keeps_state(
+    httpx_mock, chatgpt_authenticated: api.ChatGPT, valid_response_data
+):
+    def custom_response(request):
+        return httpx.Response(
+            status_code=200,
+            content=valid_response_data,
+        )
+
+    httpx_mock.add_callback(custom_response, url=api.ChatGPT._CONV_URL)
+    parent_id = chatgpt_authenticated._parent_message_id
+    stream = chatgpt_authenticated.stream_message("foo")
+    assert next(stream).content == "ghijkl"
+    stream.close()
+    assert chatgpt_authenticated.conversation_id is None
+    assert chatgpt_authenticated._parent_message_id == parent_id
+
+
+def test_api_stream_message_invalid_not_200_status_code(
+    httpx_mock, chatgpt_authenticated
+):
+    def custom_response(request):
+        return httpx.Response(status_code=503)
+
+    httpx_mock.add_callback(custom_response, url=api.ChatGPT._CONV_URL)
+    with pytest.raises(exceptions.StatusCodeException):
+        list(chatgpt_authenticated.stream_message("foo"))
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+import pytest
+
+from chatgpt import api
+from chatgpt import batch
+from chatgpt import exceptions
+
+
+def test_send_many_ordered(httpx_mock, chatgpt_authenticated, echo_reply):
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    prompts = [f"p{i}" for i in range(10)]
+    results = list(
+        batch.send_many(
+            chatgpt_authenticated, prompts, concurrency=3, ordered=True
+        )
+    )
+    assert [r.index for r in results] == list(range(10))
+    assert [r.response.content for r in results] == [
+        p.upper() for p in prompts
+    ]
+    assert all(r.ok for r in results)
+
+
+def test_send_many_reports_errors_per_item(
+    httpx_mock, chatgpt_authenticated, echo_reply
+):
+    def custom_response(request):
+        body = json.loads(request.content)
+        if body["messages"][0]["content"]["parts"][0] == "bad":
+            return httpx.Response(status_code=503)
+        return echo_reply(request)
+
+    httpx_mock.add_callback(custom_response, url=api.ChatGPT._CONV_URL)
+    results = sorted(
+        batch.send_many(chatgpt_authenticated, ["a", "bad", "c"]),
+        key=lambda r: r.index,
+    )
+    assert [r.ok for r in results] == [True, False, True]
+    assert isinstance(results[1].error, exceptions.StatusCodeException)
+
+
+def test_send_many_keeps_conversation_order(
+    httpx_mock, chatgpt_authenticated, echo_reply
+):
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    conv = chatgpt_authenticated.conversation()
+    items = [(conv, f"m{i}") for i in range(5)] + ["x", "y"]
+    results = list(
+        batch.send_many(chatgpt_authenticated, items, concurrency=4)
+    )
+    assert len(results) == 7
+    sent = [
+        json.loads(r.content)["messages"][0]["content"]["parts"][0]
+        for r in httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)
+    ]
+    assert [m for m in sent if m.startswith("m")] == [
+        f"m{i}" for i in range(5)
+    ]
+    assert conv.parent_message_id == "msg-m4"
+
+
+def test_send_many_reads_conversation_items_lazily(
+    httpx_mock, chatgpt_authenticated, echo_reply
+):
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    conv = chatgpt_authenticated.conversation()
+    pulled = []
+
+    def items():
+        for i in range(1000):
+            pulled.append(i)
+            yield conv, f"m{i}"
+
+    results = batch.send_many(chatgpt_authenticated, items(), concurrency=2)
+    assert next(results).prompt == "m0"
+    # One running and up to `concurrency` waiting, plus the one just queued
+    assert len(pulled) <= 4
+    results.close()
+
+
+def test_send_many_ordered_bounds_held_results(
+    httpx_mock, chatgpt_authenticated, echo_reply
+):
+    head_released = threading.Event()
+
+    def slow_head(request):
+        body = json.loads(request.content)
+        if body["messages"][0]["content"]["parts"][0] == "m0":
+            head_released.wait(5)
+        return echo_reply(request)
+
+    httpx_mock.add_callback(slow_head, url=api.ChatGPT._CONV_URL)
+    pulled = []
+
+    def items():
+        for i in range(1000):
+            pulled.append(i)
+            yield f"m{i}"
+
+    results = batch.send_many(
+        chatgpt_authenticated, items(), concurrency=2, ordered=True
+    )
+    pulled_while_head_ran = []
+
+    def release_head():
+        time.sleep(0.2)
+        pulled_while_head_ran.append(len(pulled))
+        head_released.set()
+
+    threading.Thread(target=release_head).start()
+    assert next(results).prompt == "m0"
+    # The head, up to `concurrency` held back and the one which completed
+    # after the limit was reached
+    assert pulled_while_head_ran[0] <= 4
+    results.close()
+
+
+def test_async_send_many_ordered(
+    httpx_mock, session_token, auth_reply, echo_reply
+):
+    httpx_mock.add_callback(auth_reply, url=api.AsyncChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.AsyncChatGPT._CONV_URL)
+
+    async def main():
+        async with api.AsyncChatGPT(session_token=session_token) as chat:
+            return [
+                r
+                async for r in batch.async_send_many(
+                    chat, ["a", "b", "c", "d"], concurrency=2, ordered=True
+                )
+            ]
+
+    results = asyncio.run(main())
+    assert [r.response.content for r in results] == ["A", "B", "C", "D"]
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = batch.RateLimiter(requests_per_minute=60)
+    assert limiter._reserve() == 0
+    assert limiter._reserve() == pytest.approx(1, abs=0.05)
+    assert limiter._reserve() == pytest.approx(2, abs=0.05)
+
+
+def test_rate_limiter_invalid_budget():
+    with pytest.raises(ValueError):
+        batch.RateLimiter(requests_per_minute=0)
@@ -0,0 +1,237 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from chatgpt import api
+from chatgpt import cache
+from chatgpt import exceptions
+from chatgpt import payloads
+from chatgpt import store
+from chatgpt.scheduler import CancellationToken
+
+
+def _response(n):
+    return api.Response(f"msg-{n}", "conv", f"msg-{n}", f"content-{n}")
+
+
+@pytest.fixture(params=["lru", "sqlite"])
+def make_cache(request, tmp_path):
+    def factory(**kwargs):
+        if request.param == "lru":
+            return cache.LRUCache(**kwargs)
+        return cache.SQLiteCache(tmp_path / "cache.db", **kwargs)
+
+    return factory
+
+
+def test_cache_get_set(make_cache):
+    response_cache = make_cache()
+    assert response_cache.get("a") is None
+    response_cache.set("a", _response(1))
+    assert response_cache.get("a") == _response(1)
+    assert (response_cache.hits, response_cache.misses) == (1, 1)
+
+
+def test_cache_evicts_least_recently_used(make_cache, mocker):
+    clock = mocker.patch("chatgpt.cache.time.time", return_value=0)
+    response_cache = make_cache(maxsize=2)
+    response_cache.set("a", _response(1))
+    clock.return_value = 1
+    response_cache.set("b", _response(2))
+    clock.return_value = 2
+    response_cache.get("a")
+    clock.return_value = 3
+    response_cache.set("c", _response(3))
+    assert len(response_cache) == 2
+    assert response_cache.get("b") is None
+    assert response_cache.get("a") == _response(1)
+
+
+def test_cache_ttl(make_cache, mocker):
+    clock = mocker.patch("chatgpt.cache.time.time", return_value=0)
+    response_cache = make_cache(ttl=10)
+    response_cache.set("a", _response(1))
+    clock.return_value = 5
+    assert response_cache.get("a") == _response(1)
+    clock.return_value = 11
+    assert response_cache.get("a") is None
+
+
+def test_sqlite_cache_persists(tmp_path):
+    cache.SQLiteCache(tmp_path / "cache.db").set("a", _response(1))
+    assert cache.SQLiteCache(tmp_path / "cache.db").get("a") == _response(1)
+
+
+def test_send_message_key():
+    assert payloads.send_message_key(
+        "foo", None, "random-1"
+    ) == payloads.send_message_key("foo", None, "random-2")
+    assert payloads.send_message_key(
+        "foo", "conv", "msg-1"
+    ) != payloads.send_message_key("foo", "conv", "msg-2")
+    assert payloads.send_message_key(
+        "foo", None, "msg"
+    ) != payloads.send_message_key("bar", None, "msg")
+    assert payloads.send_message_key(
+        "foo", None, "msg", session="a"
+    ) != payloads.send_message_key("foo", None, "msg", session="b")
+
+
+def test_api_send_message_uses_cache(
+    httpx_mock, session_token, auth_reply, echo_reply
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    response_cache = cache.LRUCache()
+    with api.ChatGPT(
+        session_token=session_token, response_cache=response_cache
+    ) as chat:
+        first = chat.send_message("foo")
+        second = chat.conversation().send_message("foo")
+        # Follow-up messages have a different context
+        chat.send_message("foo")
+    assert first == second
+    assert chat.conversation_id == "conv-foo"
+    assert len(httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)) == 2
+    assert (response_cache.hits, response_cache.misses) == (1, 2)
+
+
+def test_cache_is_kept_per_session_and_hits_are_recorded(
+    httpx_mock, auth_reply, echo_reply, tmp_path
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    response_cache = cache.SQLiteCache(tmp_path / "cache.db")
+    conversation_store = store.SQLiteConversationStore(tmp_path / "conv.db")
+    with api.ChatGPT(
+        session_token="a",
+        response_cache=response_cache,
+        conversation_store=conversation_store,
+        transcript=None,
+    ) as chat:
+        chat.send_message("foo")
+        hit = chat.conversation().send_message("foo")
+        assert hit.id in chat.message_tree
+        assert len(conversation_store.turns(hit.conversation_id)) == 2
+    # Another account can't continue conversations of the first one
+    with api.ChatGPT(
+        session_token="b", response_cache=response_cache, transcript=None
+    ) as chat:
+        chat.send_message("foo")
+    assert len(httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)) == 2
+    assert (response_cache.hits, response_cache.misses) == (1, 2)
+
+
+def test_single_flight_shares_reply_between_threads(
+    httpx_mock, session_token, auth_reply, echo_reply, mocker
+):
+    single_flight = cache.SingleFlight()
+    join = mocker.spy(single_flight, "_join")
+
+    def slow_reply(request):
+        # Reply once all requests have joined the flight
+        deadline = time.monotonic() + 5
+        while join.call_count < 4 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        # Spy counts the call before it's made
+        time.sleep(0.05)
+        return echo_reply(request)
+
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(slow_reply, url=api.ChatGPT._CONV_URL)
+    with api.ChatGPT(
+        session_token=session_token, single_flight=single_flight
+    ) as chat:
+        with ThreadPoolExecutor(4) as executor:
+            replies = list(
+                executor.map(
+                    lambda _: chat.conversation().send_message("foo"),
+                    range(4),
+                )
+            )
+        assert len(httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)) == 1
+        assert all(reply == replies[0] for reply in replies)
+        assert single_flight.shared == 3
+        # Nothing in flight anymore, so the next request is sent
+        chat.conversation().send_message("foo")
+    assert len(httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)) == 2
+
+
+def test_single_flight_cancelled_leader_hands_over(
+    httpx_mock, session_token, auth_reply, echo_reply, mocker
+):
+    single_flight = cache.SingleFlight()
+    join = mocker.spy(single_flight, "_join")
+    cancel = CancellationToken()
+    requests = []
+
+    def leader_reply(request):
+        requests.append(request)
+        if len(requests) == 1:
+            # The leader is cancelled once the other request waits for it
+            deadline = time.monotonic() + 5
+            while join.call_count < 2 and time.monotonic() < deadline:
+                time.sleep(0.001)
+            time.sleep(0.05)
+            cancel.cancel()
+        return echo_reply(request)
+
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(leader_reply, url=api.ChatGPT._CONV_URL)
+    with api.ChatGPT(
+        session_token=session_token, single_flight=single_flight
+    ) as chat:
+        leader = chat.conversation()._converse("foo", False, cancel=cancel)
+        with ThreadPoolExecutor(2) as executor:
+            leading = executor.submit(list, leader)
+            while join.call_count < 1:
+                time.sleep(0.001)
+            waiter = executor.submit(chat.conversation().send_message, "foo")
+            with pytest.raises(exceptions.CancelledException):
+                leading.result(timeout=5)
+            assert waiter.result(timeout=5).content == "FOO"
+    # The waiter sent the request itself
+    assert len(requests) == 2
+    assert single_flight.shared == 0
+
+
+def test_single_flight_shares_errors(mocker):
+    single_flight = cache.SingleFlight()
+    join = mocker.spy(single_flight, "_join")
+    assert single_flight.wait("key") is None
+    waiter = ThreadPoolExecutor(1).submit(single_flight.wait, "key")
+    while join.call_count < 2:
+        time.sleep(0.001)
+    time.sleep(0.05)
+    single_flight.done("key", error=exceptions.StatusCodeException())
+    with pytest.raises(exceptions.StatusCodeException):
+        waiter.result(timeout=5)
+
+
+def test_single_flight_async_waiters_retry_abandoned_flight():
+    single_flight = cache.SingleFlight()
+    response = _response(1)
+
+    async def main():
+        # This caller leads, its call is abandoned
+        assert await single_flight.wait_async("key") is None
+        waiters = [
+            asyncio.ensure_future(single_flight.wait_async("key"))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        single_flight.done("key", error=GeneratorExit())
+        await asyncio.sleep(0.01)
+        # One of the waiters takes over and completes the call
+        single_flight.done("key", response)
+        return await asyncio.gather(*waiters)
+
+    results = asyncio.run(main())
+    assert sorted(results, key=lambda r: r is None) == [
+        response,
+        response,
+        None,
+    ]
+    assert single_flight.shared == 2
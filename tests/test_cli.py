@@ -1,3 +1,4 @@
+import json
 import pathlib
 from unittest.mock import patch
 
@@ -117,3 +118,88 @@ def test_cli_start_new_conversation_command(mocker, httpx_mock):
     result = runner.invoke(app, ["start"], input="!new\n!exit\n")
     assert result.exit_code == 0
     assert "Starting new conversation" in result.stdout
+
+
+def test_cli_start_cancel_response(mocker, httpx_mock):
+    mocker.patch.object(pathlib.Path, "read_text", lambda *x, **y: None)
+
+    def cancelled_stream(self, message):
+        yield api.Response("1", "2", "1", "Partial")
+        raise KeyboardInterrupt()
+
+    mocker.patch.object(api.ChatGPT, "stream_message", cancelled_stream)
+
+    # auth
+    def custom_response(request):
+        return httpx.Response(
+            status_code=200,
+            json={"accessToken": "access123"},
+            headers={"Set-Cookie": f"{api.ChatGPT._AUTH_COOKIE_NAME}=12345"},
+        )
+
+    httpx_mock.add_callback(custom_response, url=api.ChatGPT._AUTH_URL)
+    result = runner.invoke(app, ["start"], input="Hello\n!exit\n")
+    assert result.exit_code == 0
+    assert "Response cancelled" in result.stdout
+    assert "Bye!" in result.stdout
+
+
+def test_cli_batch(mocker, httpx_mock, echo_reply, auth_reply):
+    mocker.patch.object(pathlib.Path, "read_text", lambda *x, **y: None)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    lines = [
+        {"id": "a", "prompt": "one", "conversation": "c"},
+        {"id": "b", "prompt": "two", "conversation": "c"},
+        {"id": "c", "prompt": "three"},
+    ]
+    stdin = "\n".join(json.dumps(line) for line in lines) + "\nnot json\n"
+    result = runner.invoke(app, ["batch"], input=stdin)
+    assert result.exit_code == 1
+    records = {
+        record["line"]: record
+        for record in map(json.loads, result.stdout.splitlines()[:-1])
+    }
+    assert "1 prompt(s) failed" in result.stdout
+    assert records[0]["response"] == "ONE"
+    assert records[0]["conversation_id"] == "conv-one"
+    # Second prompt of a conversation continues it
+    assert records[1]["id"] == "b"
+    assert records[1]["conversation_id"] == "conv-one"
+    assert records[2]["conversation_id"] == "conv-three"
+    assert "error" in records[3]
+
+
+def test_cli_batch_resume_from_checkpoint(
+    mocker, httpx_mock, echo_reply, auth_reply, tmp_path
+):
+    mocker.patch.object(pathlib.Path, "read_text", lambda *x, **y: None)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    checkpoint.write_text(
+        json.dumps(
+            {
+                "line": 0,
+                "conversation": "c",
+                "conversation_id": "conv-one",
+                "parent_message_id": "msg-one",
+            }
+        )
+        + "\n"
+    )
+    stdin = (
+        '{"prompt": "one", "conversation": "c"}\n'
+        '{"prompt": "two", "conversation": "c"}\n'
+    )
+    result = runner.invoke(
+        app, ["batch", "--checkpoint", str(checkpoint)], input=stdin
+    )
+    assert result.exit_code == 0
+    (record,) = map(json.loads, result.stdout.splitlines())
+    assert record["line"] == 1
+    assert record["conversation_id"] == "conv-one"
+    (request,) = httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)
+    assert json.loads(request.content)["parent_message_id"] == "msg-one"
+    with checkpoint.open() as f:
+        assert len(f.readlines()) == 2
@@ -0,0 +1,46 @@
+import json
+import subprocess
+import sys
+
+# Import time of chatgpt.cli on top of typer, which is needed anyway.
+# Generous, so that it fails only when a heavy module sneaks in.
+IMPORT_TIME_BUDGET_US = 50_000
+
+
+def _run(code):
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def test_cli_import_does_not_load_http_stack():
+    result = _run(
+        "import json, sys, chatgpt.cli; print(json.dumps(list(sys.modules)))"
+    )
+    modules = set(json.loads(result.stdout))
+    for heavy in ("httpx", "chatgpt.api", "rich.live", "asyncio", "sqlite3"):
+        assert heavy not in modules
+
+
+def test_cli_import_time_budget():
+    result = _run("import typer; import chatgpt.cli")
+    (line,) = [
+        line
+        for line in result.stderr.splitlines()
+        if line.endswith("| chatgpt.cli")
+    ]
+    cumulative_us = int(line.split("|")[1])
+    assert cumulative_us < IMPORT_TIME_BUDGET_US
+
+
+def test_package_submodules_are_lazy():
+    result = _run(
+        "import json, sys, chatgpt; chatgpt.exceptions; "
+        "print(json.dumps(list(sys.modules)))"
+    )
+    modules = set(json.loads(result.stdout))
+    assert "chatgpt.exceptions" in modules
+    assert "chatgpt.api" not in modules
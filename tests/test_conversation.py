@@ -0,0 +1,96 @@
+import asyncio
+import json
+import threading
+
+import httpx
+
+from chatgpt import api
+
+
+def _reply(request):
+    body = json.loads(request.content)
+    message = body["messages"][0]["content"]["parts"][0]
+    conv_id = body["conversation_id"] or f"conv-{message}"
+    data = {
+        "message": {
+            "id": f"msg-{message}",
+            "content": {"content_type": "text", "parts": [message.upper()]},
+        },
+        "conversation_id": conv_id,
+    }
+    return httpx.Response(
+        status_code=200, content=f"data: {json.dumps(data)}\n\ndata: [DONE]"
+    )
+
+
+def _auth_response(request):
+    return httpx.Response(
+        status_code=200,
+        json={"accessToken": "access123"},
+        headers={"Set-Cookie": f"{api.ChatGPT._AUTH_COOKIE_NAME}=12345"},
+    )
+
+
+def test_conversations_keep_separate_state(httpx_mock, chatgpt_authenticated):
+    httpx_mock.add_callback(_reply, url=api.ChatGPT._CONV_URL)
+    first = chatgpt_authenticated.conversation()
+    second = chatgpt_authenticated.conversation()
+
+    assert first.send_message("a").content == "A"
+    assert second.send_message("b").content == "B"
+    assert first.conversation_id == "conv-a"
+    assert first.parent_message_id == "msg-a"
+    assert second.conversation_id == "conv-b"
+    assert second.parent_message_id == "msg-b"
+    # The client's own conversation is untouched
+    assert chatgpt_authenticated.conversation_id is None
+
+    first.new_conversation()
+    assert first.conversation_id is None
+    assert first.parent_message_id != "msg-a"
+
+
+def test_conversation_resumes_from_given_ids(
+    httpx_mock, chatgpt_authenticated
+):
+    httpx_mock.add_callback(_reply, url=api.ChatGPT._CONV_URL)
+    conv = chatgpt_authenticated.conversation("conv-x", "msg-x")
+    conv.send_message("c")
+    request = json.loads(httpx_mock.get_requests()[-1].content)
+    assert request["conversation_id"] == "conv-x"
+    assert request["parent_message_id"] == "msg-x"
+    assert conv.parent_message_id == "msg-c"
+
+
+def test_conversations_used_from_threads(httpx_mock, chatgpt_authenticated):
+    httpx_mock.add_callback(_reply, url=api.ChatGPT._CONV_URL)
+    conversations = [chatgpt_authenticated.conversation() for _ in range(8)]
+    threads = [
+        threading.Thread(target=conv.send_message, args=(str(i),))
+        for i, conv in enumerate(conversations)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [c.conversation_id for c in conversations] == [
+        f"conv-{i}" for i in range(8)
+    ]
+
+
+def test_async_conversations_used_from_tasks(httpx_mock, session_token):
+    httpx_mock.add_callback(_auth_response, url=api.AsyncChatGPT._AUTH_URL)
+    httpx_mock.add_callback(_reply, url=api.AsyncChatGPT._CONV_URL)
+
+    async def main():
+        async with api.AsyncChatGPT(session_token=session_token) as chat:
+            conversations = [chat.conversation() for _ in range(8)]
+            await asyncio.gather(
+                *(c.send_message(str(i)) for i, c in enumerate(conversations))
+            )
+            return conversations
+
+    conversations = asyncio.run(main())
+    assert [c.parent_message_id for c in conversations] == [
+        f"msg-{i}" for i in range(8)
+    ]
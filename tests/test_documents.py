@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from chatgpt import api
+from chatgpt import documents
+from chatgpt import exceptions
+
+PARAGRAPHS = [f"p{n} aaaa bbbb" for n in range(1, 6)]
+
+
+@pytest.fixture
+def map_reduce_reply():
+    """Replies to `MAP:` prompts with a summary, merges `RED:` prompts."""
+
+    def custom_response(request):
+        body = json.loads(request.content)
+        prompt = body["messages"][0]["content"]["parts"][0]
+        if prompt.startswith("MAP:"):
+            if "fail" in prompt:
+                return httpx.Response(status_code=400)
+            content = "sum-" + prompt[4:].split()[0]
+        else:
+            content = "red({})".format(",".join(prompt[4:].split("\n\n")))
+        data = {
+            "message": {
+                "id": "msg",
+                "content": {"content_type": "text", "parts": [content]},
+            },
+            "conversation_id": "conv",
+        }
+        return httpx.Response(
+            status_code=200,
+            content=f"data: {json.dumps(data)}\n\ndata: [DONE]",
+        )
+
+    return custom_response
+
+
+def test_split_document_packs_paragraphs():
+    text = "\n\n".join(["a" * 8, "b" * 8, "c" * 8])
+    assert list(documents.split_document(text, max_tokens=4)) == [
+        "a" * 8 + "\n\n" + "b" * 8,
+        "c" * 8,
+    ]
+
+
+def test_split_document_splits_long_paragraphs():
+    text = "One two. Three four five six seven eight nine ten eleven."
+    chunks = list(documents.split_document(text, max_tokens=3))
+    assert chunks[0] == "One two."
+    assert " ".join(chunks) == text
+    assert all(documents.estimate_tokens(c) <= 3 for c in chunks)
+
+
+def test_split_document_reads_lazily(tmp_path):
+    read = []
+
+    def lines():
+        for paragraph in PARAGRAPHS:
+            read.append(paragraph)
+            yield paragraph + "\n"
+            yield "\n"
+
+    chunks = documents.split_document(lines(), max_tokens=3)
+    assert next(chunks) == PARAGRAPHS[0]
+    assert read == PARAGRAPHS[:2]
+
+    path = tmp_path / "document.txt"
+    path.write_text("line 1\nline 2\n\n\nline 3\n")
+    assert list(documents.read_paragraphs(path)) == [
+        "line 1\nline 2",
+        "line 3",
+    ]
+
+
+def test_map_reduce_tree(
+    httpx_mock, session_token, auth_reply, map_reduce_reply
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(map_reduce_reply, url=api.ChatGPT._CONV_URL)
+    with api.ChatGPT(session_token=session_token, transcript=None) as chat:
+        result = documents.map_reduce(
+            chat,
+            "\n\n".join(PARAGRAPHS),
+            "MAP:{chunk}",
+            "RED:{results}",
+            max_tokens=5,
+        )
+        assert result == (
+            "red(red(red(sum-p1,sum-p2),red(sum-p3,sum-p4)),sum-p5)"
+        )
+        assert (
+            documents.map_reduce(
+                chat, PARAGRAPHS[0], "MAP:{chunk}", "RED:{results}"
+            )
+            == "sum-p1"
+        )
+        assert (
+            documents.map_reduce(
+                chat, "\n\n".join(PARAGRAPHS), "MAP:{chunk}", None
+            )
+            == "sum-p1"
+        )
+
+
+def test_map_reduce_raises_failure(
+    httpx_mock, session_token, auth_reply, map_reduce_reply
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(map_reduce_reply, url=api.ChatGPT._CONV_URL)
+    with api.ChatGPT(session_token=session_token, transcript=None) as chat:
+        with pytest.raises(exceptions.StatusCodeException):
+            documents.map_reduce(
+                chat, "ok\n\nfail", "MAP:{chunk}", max_tokens=3
+            )
+        with pytest.raises(ValueError):
+            documents.map_reduce(chat, "ok", "MAP:{chunk}", max_tokens=1)
+
+
+def test_async_map_reduce(
+    httpx_mock, session_token, auth_reply, map_reduce_reply
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(map_reduce_reply, url=api.ChatGPT._CONV_URL)
+
+    async def main():
+        async with api.AsyncChatGPT(
+            session_token=session_token, transcript=None
+        ) as chat:
+            return await documents.async_map_reduce(
+                chat,
+                "\n\n".join(PARAGRAPHS[:2]),
+                "MAP:{chunk}",
+                "RED:{results}",
+                max_tokens=5,
+            )
+
+    assert asyncio.run(main()) == "red(sum-p1,sum-p2)"
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from chatgpt import api
+from chatgpt import exceptions
+from chatgpt import metrics
+from chatgpt.hedge import HedgePolicy
+from chatgpt.limiter import AdaptiveLimiter
+
+
+def _reply_data(conversation_id):
+    data = {
+        "message": {
+            "id": f"msg-{conversation_id}",
+            "content": {"content_type": "text", "parts": ["hi"]},
+        },
+        "conversation_id": conversation_id,
+    }
+    return f"data: {json.dumps(data)}\n\ndata: [DONE]".encode()
+
+
+@pytest.fixture
+def slow_first_reply():
+    """The first request sends its first byte late, the next ones don't."""
+    requests = []
+
+    def stream(conversation_id, delay):
+        time.sleep(delay)
+        yield _reply_data(conversation_id)
+
+    async def async_stream(conversation_id, delay):
+        await asyncio.sleep(delay)
+        yield _reply_data(conversation_id)
+
+    def custom_response(request):
+        requests.append(request)
+        delay = 0.5 if len(requests) == 1 else 0
+        conversation_id = f"conv-{len(requests)}"
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            content = stream(conversation_id, delay)
+        else:
+            content = async_stream(conversation_id, delay)
+        return httpx.Response(status_code=200, content=content)
+
+    return custom_response
+
+
+@pytest.fixture
+def assert_all_responses_were_requested() -> bool:
+    return False
+
+
+def test_hedge_wins_over_slow_request(
+    httpx_mock, session_token, auth_reply, slow_first_reply
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(slow_first_reply, url=api.ChatGPT._CONV_URL)
+    policy = HedgePolicy(initial_delay=0.05, max_ratio=1)
+    with api.ChatGPT(
+        session_token=session_token, hedge_policy=policy, transcript=None
+    ) as chat:
+        started = time.monotonic()
+        chat.send_message("foo")
+        assert time.monotonic() - started < 0.5
+        # Only the winner's reply continues the conversation
+        assert chat.conversation_id == "conv-2"
+        assert chat._parent_message_id == "msg-conv-2"
+    requests = httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)
+    assert len(requests) == 2
+    # The hedge is a new message with the same parent
+    first, second = (json.loads(r.content) for r in requests)
+    assert first["messages"][0]["id"] != second["messages"][0]["id"]
+    assert first["parent_message_id"] == second["parent_message_id"]
+    stats = policy.stats()
+    assert (stats.requests, stats.hedged, stats.hedge_wins) == (1, 1, 1)
+    assert stats.hedge_rate == stats.win_rate == 1
+    # The loser records how long it waited, a lower bound of its latency
+    assert len(policy._samples) == 2
+    assert max(policy._samples) >= 0.05
+
+
+def test_fast_request_is_not_hedged(
+    httpx_mock, session_token, auth_reply, echo_reply
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    policy = HedgePolicy(initial_delay=5, max_ratio=1)
+    with api.ChatGPT(session_token=session_token, hedge_policy=policy) as chat:
+        replies = list(chat.stream_message("foo"))
+    assert replies[-1].content == "FOO"
+    assert len(httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)) == 1
+    assert policy.stats().hedged == 0
+
+
+def test_hedges_are_limited_by_budget(
+    httpx_mock, session_token, auth_reply, slow_first_reply
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(slow_first_reply, url=api.ChatGPT._CONV_URL)
+    policy = HedgePolicy(initial_delay=0.01, max_ratio=0.5)
+    with api.ChatGPT(
+        session_token=session_token, hedge_policy=policy, transcript=None
+    ) as chat:
+        chat.send_message("foo")
+    assert len(httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)) == 1
+    assert policy.stats().hedged == 0
+
+
+def test_hedge_error_is_raised_when_no_request_is_left(
+    httpx_mock, session_token, auth_reply
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_response(url=api.ChatGPT._CONV_URL, status_code=400)
+    policy = HedgePolicy(initial_delay=0.01, max_ratio=1)
+    with api.ChatGPT(session_token=session_token, hedge_policy=policy) as chat:
+        with pytest.raises(exceptions.StatusCodeException):
+            chat.send_message("foo")
+
+
+def test_async_hedge_wins_over_slow_request(
+    httpx_mock, session_token, auth_reply, slow_first_reply
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(slow_first_reply, url=api.ChatGPT._CONV_URL)
+    policy = HedgePolicy(initial_delay=0.05, max_ratio=1)
+
+    async def main():
+        async with api.AsyncChatGPT(
+            session_token=session_token, hedge_policy=policy, transcript=None
+        ) as chat:
+            replies = [resp async for resp in chat.stream_message("foo")]
+            assert replies[-1].conversation_id == "conv-2"
+            assert chat.conversation_id == "conv-2"
+
+    asyncio.run(main())
+    assert policy.stats().hedge_wins == 1
+
+
+def test_hedged_reply_reports_first_byte_as_it_arrives(
+    httpx_mock, session_token, auth_reply
+):
+    def stream():
+        data = _reply_data("conv")
+        yield data[:10]
+        time.sleep(0.3)
+        yield data[10:]
+
+    def custom_response(request):
+        return httpx.Response(status_code=200, content=stream())
+
+    class RecordingHooks(metrics.Hooks):
+        def __init__(self):
+            self.calls = []
+
+        def call_finished(self, context, stats):
+            self.calls.append(stats)
+
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(custom_response, url=api.ChatGPT._CONV_URL)
+    hooks = RecordingHooks()
+    limiter = AdaptiveLimiter()
+    with api.ChatGPT(
+        session_token=session_token,
+        hedge_policy=HedgePolicy(initial_delay=5),
+        hooks=hooks,
+        limiter=limiter,
+        transcript=None,
+    ) as chat:
+        assert chat.send_message("foo").content == "hi"
+        latency = limiter._states[chat.limiter_key].long_latency
+    (stats,) = [c for c in hooks.calls if c.operation == "send_message"]
+    assert stats.time_to_first_byte < 0.2 <= stats.time_to_last_byte
+    assert latency < 0.2
+
+
+def test_hedge_delay_follows_percentile():
+    policy = HedgePolicy(percentile=90, min_samples=10, max_delay=0.5)
+    assert policy.delay() == policy.initial_delay
+    for n in range(1, 11):
+        policy.record(n / 10)
+    assert policy.delay() == 0.5
+    policy.max_delay = 30
+    assert policy.delay() == 0.9
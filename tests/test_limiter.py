@@ -0,0 +1,141 @@
+import asyncio
+import threading
+
+from chatgpt import api
+from chatgpt import metrics
+from chatgpt.limiter import AdaptiveLimiter
+from chatgpt.retry import RetryPolicy
+
+
+def test_limiter_grows_while_latency_is_stable():
+    limiter = AdaptiveLimiter(initial_limit=2, max_limit=3)
+
+    def run_at_limit(replies):
+        limiter._acquire("a")
+        for _ in range(replies):
+            at_limit = limiter._acquire("a")
+            limiter._release("a", 1.0, at_limit)
+        limiter._release("a", 1.0)
+
+    run_at_limit(2)
+    assert limiter.limit("a") == 2
+    run_at_limit(10)
+    assert limiter.limit("a") == 3
+    # Limits are kept per key
+    assert limiter.limits() == {"a": 3}
+    assert limiter.limit("b") == 2
+
+
+def test_limiter_does_not_grow_under_light_load():
+    limiter = AdaptiveLimiter(initial_limit=4)
+    for _ in range(100):
+        # Two replies at a time never fill the limit
+        first = limiter._acquire("a")
+        second = limiter._acquire("a")
+        assert not first and not second
+        limiter._release("a", 1.0, second)
+        limiter._release("a", 1.0, first)
+    assert limiter.limit("a") == 4
+
+
+def test_limiter_backs_off_on_overload_and_rising_latency():
+    limiter = AdaptiveLimiter(initial_limit=16, backoff_interval=0)
+    limiter.overload("a")
+    assert limiter.limit("a") == 8
+    for latency in (1, 1, 10, 10):
+        limiter._acquire("a")
+        limiter._release("a", latency)
+    assert limiter.limit("a") < 8
+
+    limiter = AdaptiveLimiter(initial_limit=16, backoff_interval=60)
+    limiter.overload("a")
+    limiter.overload("a")
+    # A burst of errors backs off once
+    assert limiter.limit("a") == 8
+
+
+def test_limiter_queues_requests_over_limit():
+    limiter = AdaptiveLimiter(initial_limit=1)
+    order = []
+
+    def worker(n):
+        with limiter.slot("a"):
+            order.append(n)
+
+    limiter._acquire("a")
+    threads = []
+    for n in range(3):
+        threads.append(threading.Thread(target=worker, args=(n,)))
+        threads[-1].start()
+        while len(limiter._states["a"].waiters) != n + 1:
+            pass
+    limiter._release("a", None)
+    for thread in threads:
+        thread.join()
+    assert order == [0, 1, 2]
+    assert limiter.in_flight() == {"a": 0}
+
+
+def test_limiter_async_slot():
+    limiter = AdaptiveLimiter(initial_limit=1)
+
+    async def main():
+        async with limiter.slot_async("a"):
+            waiting = asyncio.ensure_future(limiter._acquire_async("a"))
+            cancelled = asyncio.ensure_future(limiter._acquire_async("a"))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await asyncio.sleep(0)
+            assert len(limiter._states["a"].waiters) == 1
+        await waiting
+        assert limiter.in_flight() == {"a": 1}
+
+    asyncio.run(main())
+
+
+def test_client_reports_overload_to_limiter(
+    httpx_mock, session_token, auth_reply, echo_reply
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_response(url=api.ChatGPT._CONV_URL, status_code=429)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    limiter = AdaptiveLimiter(initial_limit=4)
+    prometheus = metrics.PrometheusMetrics()
+    prometheus.add_gauge("concurrency_limit", "session", limiter.limits)
+    with api.ChatGPT(
+        session_token=session_token,
+        limiter=limiter,
+        retry_policy=RetryPolicy(backoff_base=0),
+    ) as chat:
+        assert chat.send_message("foo").content == "FOO"
+        key = chat.limiter_key
+    assert session_token not in key
+    assert limiter.in_flight() == {key: 0}
+    assert limiter.limit(key) == 2
+    assert (
+        f'chatgpt_concurrency_limit{{session="{key}"}} 2'
+        in prometheus.render()
+    )
+
+
+def test_async_client_holds_limiter_slot(
+    httpx_mock, session_token, auth_reply, echo_reply
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    limiter = AdaptiveLimiter()
+
+    async def main():
+        async with api.AsyncChatGPT(
+            session_token=session_token, limiter=limiter
+        ) as chat:
+            replies = chat.stream_message("foo")
+            await replies.__anext__()
+            assert limiter.in_flight() == {chat.limiter_key: 1}
+            async for _ in replies:
+                pass
+            assert limiter.in_flight() == {chat.limiter_key: 0}
+            slot_latency = limiter._states[chat.limiter_key].long_latency
+            assert slot_latency is not None
+
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+import sys
+import types
+
+import httpx
+import pytest
+
+from chatgpt import api
+from chatgpt import exceptions
+from chatgpt import metrics
+from chatgpt.retry import RetryPolicy
+
+
+class RecordingHooks(metrics.Hooks):
+    def __init__(self):
+        self.calls = []
+
+    def call_started(self, operation):
+        return operation
+
+    def call_finished(self, context, stats):
+        assert context == stats.operation
+        self.calls.append(stats)
+
+
+def test_api_hooks_record_calls(
+    httpx_mock, session_token, auth_reply, echo_reply
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_response(url=api.ChatGPT._CONV_URL, status_code=503)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    hooks = RecordingHooks()
+    with api.ChatGPT(
+        session_token=session_token,
+        hooks=hooks,
+        retry_policy=RetryPolicy(backoff_base=0),
+    ) as chat:
+        chat.send_message("foo")
+    auth, message = hooks.calls
+    assert auth.operation == "authenticate"
+    assert auth.status_code == 200
+    assert auth.outcome == "ok"
+    assert message.operation == "send_message"
+    assert (message.attempts, message.retries) == (2, 1)
+    assert message.status_code == 200
+    assert message.response_bytes > 0
+    assert 0 < message.time_to_first_byte <= message.time_to_last_byte
+    assert message.time_to_last_byte <= message.duration
+
+
+def test_api_hooks_record_parse_failure(httpx_mock, session_token, auth_reply):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_response(url=api.ChatGPT._CONV_URL, content=b"data: {")
+    prometheus = metrics.PrometheusMetrics()
+    with api.ChatGPT(session_token=session_token, hooks=prometheus) as chat:
+        with pytest.raises(exceptions.InvalidResponseException):
+            chat.send_message("foo")
+    assert prometheus.counter("parse_failures_total") == 1
+    assert (
+        prometheus.counter(
+            "calls_total",
+            operation="send_message",
+            outcome="InvalidResponseException",
+        )
+        == 1
+    )
+    assert prometheus.counter("calls_total", outcome="ok") == 1
+
+
+def test_prometheus_render():
+    prometheus = metrics.PrometheusMetrics(duration_buckets=(1, 10))
+    stats = metrics.CallStats(
+        "send_message",
+        duration=2,
+        time_to_first_byte=0.5,
+        time_to_last_byte=1.5,
+        attempts=3,
+        status_code=200,
+    )
+    prometheus.call_finished(None, stats)
+    text = prometheus.render()
+    assert "# TYPE chatgpt_calls_total counter" in text
+    assert (
+        'chatgpt_calls_total{operation="send_message",outcome="ok",'
+        'status_code="200"} 1'
+    ) in text
+    assert 'chatgpt_retries_total{operation="send_message"} 2' in text
+    assert (
+        'chatgpt_call_duration_seconds_bucket{operation="send_message",'
+        'le="1"} 0'
+    ) in text
+    assert (
+        'chatgpt_call_duration_seconds_bucket{operation="send_message",'
+        'le="10"} 1'
+    ) in text
+    assert (
+        'chatgpt_time_to_first_byte_seconds_count{operation="send_message"} 1'
+    ) in text
+    assert (
+        'chatgpt_time_to_last_byte_seconds_bucket{operation="send_message",'
+        'le="1"} 0'
+    ) in text
+    assert (
+        'chatgpt_time_to_last_byte_seconds_sum{operation="send_message"} 1.5'
+    ) in text
+
+
+def test_multi_hooks():
+    first, second = RecordingHooks(), RecordingHooks()
+    hooks = metrics.MultiHooks(first, second)
+    context = hooks.call_started("authenticate")
+    hooks.call_finished(context, metrics.CallStats("authenticate"))
+    assert len(first.calls) == len(second.calls) == 1
+
+
+def test_opentelemetry_hooks(mocker, monkeypatch):
+    trace = types.ModuleType("opentelemetry.trace")
+    trace.Status = mocker.Mock()
+    trace.StatusCode = mocker.Mock()
+    monkeypatch.setitem(sys.modules, "opentelemetry", types.ModuleType("o"))
+    monkeypatch.setitem(sys.modules, "opentelemetry.trace", trace)
+    tracer = mocker.Mock()
+    hooks = metrics.OpenTelemetryHooks(tracer)
+
+    span = hooks.call_started("send_message")
+    error = httpx.ReadTimeout("")
+    hooks.call_finished(
+        span,
+        metrics.CallStats(
+            "send_message",
+            attempts=1,
+            time_to_first_byte=0.5,
+            time_to_last_byte=1.5,
+            error=error,
+        ),
+    )
+    tracer.start_span.assert_called_once_with("chatgpt.send_message")
+    span.set_attribute.assert_any_call("chatgpt.attempts", 1)
+    span.set_attribute.assert_any_call("chatgpt.time_to_first_byte", 0.5)
+    span.set_attribute.assert_any_call("chatgpt.time_to_last_byte", 1.5)
+    span.record_exception.assert_called_once_with(error)
+    trace.Status.assert_called_once_with(trace.StatusCode.ERROR, "ReadTimeout")
+    span.end.assert_called_once_with()
@@ -0,0 +1,191 @@
+import json
+import threading
+
+import httpx
+import pytest
+
+from chatgpt import api
+from chatgpt import batch
+from chatgpt import cache
+from chatgpt import exceptions
+from chatgpt.pool import SessionPool
+
+
+def _session(request):
+    """Returns session token of a request, from its access token."""
+    return request.headers["Authorization"].split("-", 1)[1]
+
+
+@pytest.fixture
+def session_auth_reply():
+    """Issues access token naming the session token it was issued for."""
+
+    def custom_response(request):
+        token = request.headers["Cookie"].split("=", 1)[1]
+        return httpx.Response(
+            status_code=200,
+            json={"accessToken": f"access-{token}"},
+            headers={"Set-Cookie": f"{api.ChatGPT._AUTH_COOKIE_NAME}={token}"},
+        )
+
+    return custom_response
+
+
+def test_pool_spreads_and_pins_conversations(
+    httpx_mock, session_auth_reply, echo_reply
+):
+    httpx_mock.add_callback(session_auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    with SessionPool(["a", "b"], transcript=None) as pool:
+        first, second = pool.conversation(), pool.conversation()
+        first.send_message("one")
+        second.send_message("two")
+        first.send_message("three")
+        # A known conversation continues on its session
+        pool.conversation(
+            second.conversation_id, second.parent_message_id
+        ).send_message("four")
+    sessions = [
+        _session(request)
+        for request in httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)
+    ]
+    assert sessions == ["a", "b", "a", "b"]
+    # Sessions are authenticated once, on first use
+    assert len(httpx_mock.get_requests(url=api.ChatGPT._AUTH_URL)) == 2
+
+
+def test_pool_shared_cache_keeps_conversations_on_their_session(
+    httpx_mock, session_auth_reply, echo_reply
+):
+    httpx_mock.add_callback(session_auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    with SessionPool(
+        ["a", "b"], response_cache=cache.LRUCache(), transcript=None
+    ) as pool:
+        first, second = pool.conversation(), pool.conversation()
+        first.send_message("hi")
+        # Routed to the other session, which has no reply to reuse. The
+        # mock names both conversations alike, the first keeps its session
+        second.send_message("hi")
+        assert second.client is not first.client
+        pool.conversation(
+            first.conversation_id, first.parent_message_id
+        ).send_message("more")
+        assert pool._owners["conv-hi"] is pool._sessions[0]
+    sessions = [
+        _session(request)
+        for request in httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)
+    ]
+    assert sessions == ["a", "b", "a"]
+
+
+def test_pool_routes_to_least_loaded_session(
+    httpx_mock, session_auth_reply, echo_reply
+):
+    httpx_mock.add_callback(session_auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    with SessionPool(["a", "b"], transcript=None) as pool:
+        streaming = pool.stream_message("slow")
+        next(streaming)
+        # "a" is busy, so both new conversations go to "b"
+        pool.send_message("one")
+        pool.send_message("two")
+        streaming.close()
+    sessions = [
+        _session(request)
+        for request in httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)
+    ]
+    assert sessions == ["a", "b", "b"]
+
+
+@pytest.mark.parametrize("status_code", [403, 429])
+def test_pool_cools_down_failing_session(
+    httpx_mock, session_auth_reply, echo_reply, status_code
+):
+    def custom_response(request):
+        if _session(request) == "a":
+            return httpx.Response(
+                status_code=status_code, headers={"Retry-After": "120"}
+            )
+        return echo_reply(request)
+
+    httpx_mock.add_callback(session_auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(custom_response, url=api.ChatGPT._CONV_URL)
+    with SessionPool(["a", "b"], cooldown=60, transcript=None) as pool:
+        conversation = pool.conversation()
+        with pytest.raises(exceptions.StatusCodeException):
+            conversation.send_message("one")
+        assert pool.healthy_count() == 1
+        # Not started yet, so it moves to the healthy session
+        assert conversation.send_message("one").content == "ONE"
+        assert conversation.client is pool.clients[1]
+        pool.send_message("two")
+        cooldown_until = pool._sessions[0].cooldown_until
+        with pytest.raises(exceptions.NoSessionAvailableException):
+            pool._sessions[1].cooldown_until = cooldown_until
+            pool.send_message("three")
+    sessions = [
+        _session(request)
+        for request in httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)
+    ]
+    assert sessions == ["a", "b", "b"]
+
+
+def test_pool_cools_down_rejected_session_token(httpx_mock, echo_reply):
+    def custom_response(request):
+        token = request.headers["Cookie"].split("=", 1)[1]
+        if token == "a":
+            return httpx.Response(status_code=200, json={})
+        return httpx.Response(
+            status_code=200,
+            json={"accessToken": f"access-{token}"},
+            headers={"Set-Cookie": f"{api.ChatGPT._AUTH_COOKIE_NAME}={token}"},
+        )
+
+    httpx_mock.add_callback(custom_response, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    with SessionPool(["a", "b"], transcript=None) as pool:
+        with pytest.raises(exceptions.InvalidResponseException):
+            pool.send_message("one")
+        assert pool.send_message("one").content == "ONE"
+        assert pool.healthy_count() == 1
+
+
+def test_send_many_with_pool(httpx_mock, session_auth_reply, echo_reply):
+    httpx_mock.add_callback(session_auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    with SessionPool(["a", "b", "c"], transcript=None) as pool:
+        results = list(
+            batch.send_many(pool, [str(n) for n in range(9)], concurrency=3)
+        )
+    assert all(result.ok for result in results)
+    sessions = {
+        _session(request)
+        for request in httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)
+    }
+    assert sessions == {"a", "b", "c"}
+
+
+def test_pool_requires_session_tokens():
+    with pytest.raises(ValueError):
+        SessionPool([])
+
+
+def test_pool_conversation_is_serialized(
+    httpx_mock, session_auth_reply, echo_reply
+):
+    httpx_mock.add_callback(session_auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    with SessionPool(["a", "b"], transcript=None) as pool:
+        conversation = pool.conversation()
+        threads = [
+            threading.Thread(target=conversation.send_message, args=(m,))
+            for m in ("one", "two")
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    requests = httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)
+    assert {_session(request) for request in requests} == {"a"}
+    assert json.loads(requests[1].content)["conversation_id"] is not None
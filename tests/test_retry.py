@@ -0,0 +1,175 @@
+import asyncio
+
+import httpx
+import pytest
+
+from chatgpt import api
+from chatgpt import exceptions
+from chatgpt import retry
+
+
+@pytest.fixture
+def no_sleep(mocker):
+    return mocker.patch("chatgpt.api.time.sleep")
+
+
+def test_retry_policy_delay_backoff(mocker):
+    mocker.patch("chatgpt.retry.random.uniform", lambda a, b: b)
+    policy = retry.RetryPolicy(max_attempts=5, backoff_base=1, backoff_max=3)
+    error = httpx.ConnectError("")
+    assert [policy.delay(n, error=error) for n in range(1, 6)] == [
+        1,
+        2,
+        3,
+        3,
+        None,
+    ]
+
+
+def test_retry_policy_delay_retry_after():
+    policy = retry.RetryPolicy(backoff_max=10)
+    response = httpx.Response(429, headers={"Retry-After": "7"})
+    assert policy.delay(1, response=response) == 7
+    response = httpx.Response(429, headers={"Retry-After": "60"})
+    assert policy.delay(1, response=response) is None
+
+
+def test_retry_policy_not_retryable():
+    policy = retry.RetryPolicy()
+    assert policy.delay(1, response=httpx.Response(400)) is None
+    assert policy.delay(1, error=httpx.ReadTimeout("")) is None
+    policy = retry.RetryPolicy(retry_read_timeouts=True)
+    assert policy.delay(1, error=httpx.ReadTimeout("")) is not None
+
+
+def test_circuit_breaker(mocker):
+    monotonic = mocker.patch("chatgpt.retry.time.monotonic", return_value=0)
+    breaker = retry.CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    breaker.record_failure()
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.is_open
+    with pytest.raises(exceptions.CircuitOpenException):
+        breaker.before_request()
+
+    monotonic.return_value = 11
+    breaker.before_request()
+    # Only a single trial request is let through
+    with pytest.raises(exceptions.CircuitOpenException):
+        breaker.before_request()
+    breaker.record_success()
+    assert not breaker.is_open
+    breaker.before_request()
+
+
+def test_api_send_message_retries_status_codes(
+    httpx_mock, session_token, auth_reply, valid_response_data, no_sleep
+):
+    responses = iter([httpx.Response(status_code=503)] * 2)
+
+    def custom_response(request):
+        return next(
+            responses,
+            httpx.Response(status_code=200, content=valid_response_data),
+        )
+
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(custom_response, url=api.ChatGPT._CONV_URL)
+    with api.ChatGPT(
+        session_token=session_token, retry_policy=retry.RetryPolicy()
+    ) as chat:
+        assert chat.send_message("foo").content == "Avocado"
+    assert no_sleep.call_count == 2
+
+
+def test_api_send_message_retries_exhausted(
+    httpx_mock, session_token, auth_reply, no_sleep
+):
+    def custom_response(request):
+        return httpx.Response(status_code=429)
+
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(custom_response, url=api.ChatGPT._CONV_URL)
+    with api.ChatGPT(
+        session_token=session_token,
+        retry_policy=retry.RetryPolicy(max_attempts=3),
+    ) as chat:
+        with pytest.raises(exceptions.StatusCodeException) as e:
+            chat.send_message("foo")
+    assert e.value.status_code == 429
+    assert len(httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)) == 3
+
+
+def test_api_send_message_retries_connect_errors(
+    httpx_mock, session_token, auth_reply, valid_response_data, no_sleep
+):
+    calls = []
+
+    def custom_response(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ConnectError("")
+        return httpx.Response(status_code=200, content=valid_response_data)
+
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(custom_response, url=api.ChatGPT._CONV_URL)
+    with api.ChatGPT(
+        session_token=session_token, retry_policy=retry.RetryPolicy()
+    ) as chat:
+        assert chat.send_message("foo").content == "Avocado"
+
+
+def test_api_send_message_circuit_breaker_fails_fast(
+    httpx_mock, session_token, auth_reply
+):
+    def custom_response(request):
+        return httpx.Response(status_code=502)
+
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(custom_response, url=api.ChatGPT._CONV_URL)
+    with api.ChatGPT(
+        session_token=session_token,
+        circuit_breaker=retry.CircuitBreaker(failure_threshold=2),
+    ) as chat:
+        for _ in range(2):
+            with pytest.raises(exceptions.StatusCodeException):
+                chat.send_message("foo")
+        with pytest.raises(exceptions.CircuitOpenException):
+            chat.send_message("foo")
+    assert len(httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)) == 2
+
+
+def test_cancelled_trial_releases_circuit(
+    httpx_mock, session_token, auth_reply, echo_reply, mocker
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    monotonic = mocker.patch("chatgpt.retry.time.monotonic", return_value=0)
+    breaker = retry.CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    monotonic.return_value = 11
+
+    async def main():
+        async with api.AsyncChatGPT(
+            session_token=session_token,
+            circuit_breaker=breaker,
+            transcript=None,
+        ) as chat:
+            sent = asyncio.Event()
+
+            async def hang(*args, **kwargs):
+                sent.set()
+                await asyncio.Event().wait()
+
+            send, chat.send = chat.send, hang
+            trial = asyncio.ensure_future(chat.send_message("foo"))
+            await sent.wait()
+            trial.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await trial
+            # The next request becomes the trial and closes the circuit
+            chat.send = send
+            assert (await chat.send_message("foo")).content == "FOO"
+        assert not breaker.is_open
+
+    asyncio.run(main())
@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+
+import httpx
+import pytest
+
+from chatgpt import api
+from chatgpt import exceptions
+from chatgpt.retry import RetryPolicy
+from chatgpt.scheduler import CancellationToken
+from chatgpt.scheduler import Priority
+from chatgpt.scheduler import Scheduler
+
+
+@pytest.fixture
+def assert_all_responses_were_requested() -> bool:
+    return False
+
+
+@pytest.fixture
+def chat(httpx_mock, session_token, auth_reply, echo_reply):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    with api.ChatGPT(session_token=session_token, transcript=None) as chat:
+        chat.authenticate()
+        yield chat
+
+
+def _prompts(httpx_mock):
+    return [
+        json.loads(request.content)["messages"][0]["content"]["parts"][0]
+        for request in httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)
+    ]
+
+
+def test_scheduler_runs_by_priority(chat, httpx_mock):
+    scheduler = Scheduler(chat, concurrency=1)
+    scheduler._acquire(Priority.NORMAL, None, CancellationToken())
+    threads = []
+    for message, priority in [
+        ("batch", Priority.BATCH),
+        ("normal", Priority.NORMAL),
+        ("interactive", Priority.INTERACTIVE),
+        ("later", Priority.INTERACTIVE),
+    ]:
+        threads.append(
+            threading.Thread(
+                target=scheduler.send_message,
+                args=(message,),
+                kwargs={"priority": priority},
+            )
+        )
+        threads[-1].start()
+        while scheduler.waiting != len(threads):
+            pass
+    scheduler._release()
+    for thread in threads:
+        thread.join()
+    assert _prompts(httpx_mock) == ["interactive", "later", "normal", "batch"]
+    assert scheduler._active == 0
+
+
+def test_scheduler_drops_request_which_cannot_start_in_time(chat):
+    scheduler = Scheduler(chat, concurrency=1)
+    scheduler._acquire(Priority.NORMAL, None, CancellationToken())
+    with pytest.raises(exceptions.DeadlineExceededException):
+        scheduler.send_message("foo", timeout=0.01)
+    assert scheduler.waiting == 0
+    scheduler._release()
+    assert scheduler.send_message("foo", timeout=1).content == "FOO"
+
+
+def test_scheduler_cancels_waiting_request(chat):
+    scheduler = Scheduler(chat, concurrency=1)
+    scheduler._acquire(Priority.NORMAL, None, CancellationToken())
+    token = CancellationToken()
+    threading.Timer(0.01, token.cancel).start()
+    with pytest.raises(exceptions.CancelledException):
+        scheduler.send_message("foo", cancel=token)
+    assert scheduler.waiting == 0
+    with pytest.raises(exceptions.CancelledException):
+        scheduler.send_message("foo", cancel=token)
+
+
+def test_scheduler_cancels_running_request(chat):
+    scheduler = Scheduler(chat)
+    token = CancellationToken()
+    replies = scheduler.stream_message("foo", cancel=token)
+    assert next(replies).content == "FOO"
+    assert scheduler._active == 1
+    token.cancel()
+    with pytest.raises(exceptions.CancelledException):
+        next(replies)
+    assert scheduler._active == 0
+
+
+def test_scheduler_cancels_request_past_deadline(chat):
+    scheduler = Scheduler(chat)
+    conversation = chat.conversation()
+    replies = scheduler.stream_message("foo", conversation, timeout=0.01)
+    next(replies)
+    time.sleep(0.05)
+    with pytest.raises(exceptions.DeadlineExceededException):
+        next(replies)
+    assert scheduler._active == 0
+    # The unfinished reply doesn't continue the conversation
+    assert conversation.conversation_id is None
+
+
+def test_cancellation_closes_response(
+    httpx_mock, session_token, auth_reply, echo_reply, mocker
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    token = CancellationToken()
+    close = mocker.spy(httpx.Response, "close")
+    with api.ChatGPT(session_token=session_token, transcript=None) as chat:
+        replies = chat._stream("foo", None, "parent", cancel=token)
+        next(replies)
+        closed = close.call_count
+        token.cancel()
+        assert close.call_count == closed + 1
+        with pytest.raises(exceptions.CancelledException):
+            next(replies)
+
+
+def test_deadline_cuts_retries_short(httpx_mock, session_token, auth_reply):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_response(
+        url=api.ChatGPT._CONV_URL,
+        status_code=503,
+        headers={"Retry-After": "2"},
+    )
+    with api.ChatGPT(
+        session_token=session_token,
+        transcript=None,
+        retry_policy=RetryPolicy(),
+    ) as chat:
+        scheduler = Scheduler(chat)
+        start = time.monotonic()
+        with pytest.raises(exceptions.DeadlineExceededException):
+            scheduler.send_message("foo", timeout=0.3)
+        assert time.monotonic() - start < 1
+    requests = httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)
+    assert len(requests) == 1
+    # Waiting for the response doesn't outlast the deadline either
+    assert all(
+        0 < t <= 0.3 for t in requests[0].extensions["timeout"].values()
+    )
@@ -0,0 +1,159 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from chatgpt import api
+from chatgpt import exceptions
+from chatgpt import server
+
+
+@pytest.fixture
+def assert_all_responses_were_requested() -> bool:
+    return False
+
+
+@pytest.fixture
+def proxy(httpx_mock, session_token, auth_reply, echo_reply):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    with api.ChatGPT(session_token=session_token) as chat:
+        proxy = server.ProxyServer(
+            ("127.0.0.1", 0), chat, server.RequestQueue(2)
+        )
+        thread = threading.Thread(
+            target=proxy.serve_forever, args=(0.01,), daemon=True
+        )
+        thread.start()
+        yield proxy
+        proxy.shutdown()
+        proxy.server_close()
+
+
+def _post(proxy, body):
+    host, port = proxy.server_address
+    request = urllib.request.Request(
+        f"http://{host}:{port}{server.COMPLETIONS_PATH}",
+        data=json.dumps(body).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode()
+
+
+def test_server_completion(proxy, httpx_mock):
+    messages = [{"role": "user", "content": "foo"}]
+    status, body = _post(proxy, {"model": "m", "messages": messages})
+    assert status == 200
+    completion = json.loads(body)
+    assert completion["model"] == "m"
+    reply = completion["choices"][0]["message"]
+    assert reply == {"role": "assistant", "content": "FOO"}
+
+    # A follow-up continues the conversation with just the new message
+    messages += [reply, {"role": "user", "content": "bar"}]
+    status, body = _post(proxy, {"messages": messages})
+    assert json.loads(body)["choices"][0]["message"]["content"] == "BAR"
+    request = httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)[-1]
+    sent = json.loads(request.content)
+    assert sent["conversation_id"] == "conv-foo"
+    assert sent["messages"][0]["content"]["parts"] == ["bar"]
+
+
+def test_server_completion_reads_only_completed_reply(proxy, mocker):
+    snapshots = mocker.spy(api, "_ReplyReader")
+    _post(proxy, {"messages": [{"role": "user", "content": "foo"}]})
+    assert snapshots.call_args.args[0] is False
+    _post(proxy, {"messages": [{"content": "foo"}], "stream": True})
+    assert snapshots.call_args.args[0] is True
+
+
+def test_server_completion_renders_unknown_history(proxy, httpx_mock):
+    messages = [
+        {"role": "system", "content": "Be brief."},
+        {"role": "user", "content": [{"type": "text", "text": "foo"}]},
+    ]
+    status, _ = _post(proxy, {"messages": messages})
+    assert status == 200
+    request = httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)[-1]
+    assert json.loads(request.content)["messages"][0]["content"]["parts"] == [
+        "System: Be brief.\n\nUser: foo"
+    ]
+
+
+def test_server_streaming_completion(proxy):
+    messages = [{"role": "user", "content": "foo"}]
+    status, body = _post(proxy, {"messages": messages, "stream": True})
+    assert status == 200
+    events = [line[6:] for line in body.splitlines() if line]
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    assert (
+        "".join(
+            chunk["choices"][0]["delta"].get("content", "") for chunk in chunks
+        )
+        == "FOO"
+    )
+    assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
+
+
+@pytest.mark.parametrize(
+    "messages", [[], ["hi"], [{"role": "user", "content": ["hi"]}]]
+)
+def test_server_invalid_request(proxy, messages):
+    status, body = _post(proxy, {"messages": messages})
+    assert status == 400
+    assert json.loads(body)["error"]["type"] == "invalid_request_error"
+
+
+def test_server_upstream_error(proxy, mocker):
+    def complete(self, messages, stream):
+        raise exceptions.CircuitOpenException("Circuit is open.")
+        yield
+
+    mocker.patch.object(server.ProxyServer, "complete", complete)
+    status, body = _post(proxy, {"messages": [{"content": "foo"}]})
+    assert status == 503
+    assert json.loads(body)["error"]["message"] == "Circuit is open."
+
+
+def test_request_queue_backpressure():
+    queue = server.RequestQueue(1, max_queue=1, timeout=0.01)
+    with queue.slot():
+        # One request may wait, it times out as the slot isn't released
+        with pytest.raises(exceptions.QueueFullException):
+            with queue.slot():
+                pass
+        queue._waiters.append(threading.Event())
+        with pytest.raises(exceptions.QueueFullException):
+            with queue.slot():
+                pass
+        queue._waiters.clear()
+    with queue.slot():
+        assert queue.waiting == 0
+
+
+def test_request_queue_hands_over_slot_in_order():
+    queue = server.RequestQueue(1, timeout=5)
+    order = []
+    queue._acquire()
+
+    def worker(n):
+        with queue.slot():
+            order.append(n)
+
+    threads = []
+    for n in range(3):
+        threads.append(threading.Thread(target=worker, args=(n,)))
+        threads[-1].start()
+        while queue.waiting != n + 1:
+            pass
+    queue._release()
+    for thread in threads:
+        thread.join()
+    assert order == [0, 1, 2]
@@ -0,0 +1,46 @@
+import pytest
+
+from chatgpt import sse
+
+
+def _parse(*chunks):
+    parser = sse.EventStreamParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    events.extend(parser.close())
+    return [event.data for event in events]
+
+
+def test_parser_single_chunk(valid_response_data):
+    data = _parse(valid_response_data.encode())
+    assert len(data) == 4
+    assert data[-1] == sse.DONE
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64])
+def test_parser_chunks_split_anywhere(valid_response_data, size):
+    raw = valid_response_data.encode()
+    bounds = range(0, len(raw) + size, size)
+    chunks = [raw[start:end] for start, end in zip(bounds, bounds[1:])]
+    assert _parse(*chunks) == _parse(raw)
+
+
+def test_parser_multiline_data():
+    assert _parse(b'data: {"a":\ndata: 1}\n\n') == [b'{"a":\n1}']
+
+
+def test_parser_crlf_comments_and_other_fields():
+    raw = b": ping\r\nevent: message\r\nid: 1\r\ndata:x\r\n\r\ndata: y\r\n"
+    assert _parse(raw) == [b"x", b"y"]
+
+
+def test_parser_empty_input():
+    assert _parse(b"", b"\n\n") == []
+
+
+def test_event():
+    event = sse.Event(b'{"a": 1}')
+    assert event.json() == {"a": 1}
+    assert not event.done
+    assert sse.Event(b"[DONE]").done
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from chatgpt import api
+from chatgpt.cache import ResponseCache
+from chatgpt.hedge import HedgePolicy
+from chatgpt.stop import combine
+from chatgpt.stop import FirstJSONValue
+from chatgpt.stop import MaxChars
+from chatgpt.stop import StopSequence
+from chatgpt.stop import StopWhen
+
+SNAPSHOTS = ["Hello", "Hello\nWor", "Hello\nWorld", "Hello\nWorld\n!"]
+
+
+def _event(content):
+    data = {
+        "message": {
+            "id": "msg-1",
+            "content": {"content_type": "text", "parts": [content]},
+        },
+        "conversation_id": "conv-1",
+    }
+    return f"data: {json.dumps(data)}\n\n".encode()
+
+
+@pytest.fixture
+def sent():
+    """Events sent by `snapshot_reply`, which streams them one by one."""
+    return []
+
+
+@pytest.fixture
+def snapshot_reply(sent):
+    def stream():
+        for content in SNAPSHOTS:
+            sent.append(content)
+            yield _event(content)
+        sent.append("[DONE]")
+        yield b"data: [DONE]\n\n"
+
+    async def async_stream():
+        for chunk in stream():
+            yield chunk
+
+    def custom_response(request):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return httpx.Response(status_code=200, content=stream())
+        return httpx.Response(status_code=200, content=async_stream())
+
+    return custom_response
+
+
+def test_stop_sequence_ends_reply(
+    httpx_mock, session_token, auth_reply, snapshot_reply, sent, mocker
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(snapshot_reply, url=api.ChatGPT._CONV_URL)
+    cache = ResponseCache()
+    cache_set = mocker.spy(cache, "set")
+    with api.ChatGPT(
+        session_token=session_token, response_cache=cache, transcript=None
+    ) as chat:
+        resp = chat.send_message("foo", stop=StopSequence("\n"))
+        assert resp.content == "Hello"
+        assert chat._parent_message_id == "msg-1"
+        assert chat.conversation_id == "conv-1"
+    # The stream was closed at the match
+    assert sent == SNAPSHOTS[:2]
+    # A cut reply isn't reused for the whole one
+    cache_set.assert_not_called()
+
+
+def test_stop_conditions_end_streamed_reply(
+    httpx_mock, session_token, auth_reply, snapshot_reply, sent
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(snapshot_reply, url=api.ChatGPT._CONV_URL)
+    with api.ChatGPT(session_token=session_token, transcript=None) as chat:
+        conversation = chat.conversation()
+        replies = conversation.stream_message(
+            "foo", stop=[MaxChars(100), StopWhen(lambda t: "World" in t)]
+        )
+        assert [resp.content for resp in replies] == SNAPSHOTS[:3]
+        assert conversation.parent_message_id == "msg-1"
+    assert sent == SNAPSHOTS[:3]
+
+
+def test_unmatched_stop_condition_keeps_whole_reply(
+    httpx_mock, session_token, auth_reply, snapshot_reply
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(snapshot_reply, url=api.ChatGPT._CONV_URL)
+    with api.ChatGPT(session_token=session_token, transcript=None) as chat:
+        resp = chat.send_message("foo", stop=StopSequence("?"))
+    assert resp.content == SNAPSHOTS[-1]
+
+
+def test_async_stop(
+    httpx_mock, session_token, auth_reply, snapshot_reply, sent
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(snapshot_reply, url=api.ChatGPT._CONV_URL)
+
+    async def main():
+        async with api.AsyncChatGPT(
+            session_token=session_token, transcript=None
+        ) as chat:
+            resp = await chat.send_message("foo", stop=MaxChars(7))
+            assert resp.content == "Hello\nW"
+            assert chat._parent_message_id == "msg-1"
+
+    asyncio.run(main())
+    assert sent == SNAPSHOTS[:2]
+
+
+@pytest.mark.parametrize("run_async", [False, True])
+def test_stop_ends_hedged_reply(
+    httpx_mock, session_token, auth_reply, run_async
+):
+    def stream():
+        yield _event(SNAPSHOTS[0])
+        time.sleep(1)
+        yield _event(SNAPSHOTS[-1])
+
+    async def async_stream():
+        yield _event(SNAPSHOTS[0])
+        await asyncio.sleep(1)
+        yield _event(SNAPSHOTS[-1])
+
+    def slow_reply(request):
+        content = async_stream() if run_async else stream()
+        return httpx.Response(status_code=200, content=content)
+
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(slow_reply, url=api.ChatGPT._CONV_URL)
+    kwargs = dict(
+        session_token=session_token,
+        hedge_policy=HedgePolicy(),
+        transcript=None,
+    )
+
+    async def main():
+        async with api.AsyncChatGPT(**kwargs) as chat:
+            return await chat.send_message("foo", stop=MaxChars(3))
+
+    started = time.monotonic()
+    if run_async:
+        resp = asyncio.run(main())
+    else:
+        with api.ChatGPT(**kwargs) as chat:
+            resp = chat.send_message("foo", stop=MaxChars(3))
+    # The reply isn't buffered until one of the requests finishes
+    assert time.monotonic() - started < 0.5
+    assert resp.content == "Hel"
+
+
+def test_stop_sequence():
+    stop = StopSequence("\n", "World")
+    assert stop("Hello") is None
+    assert stop("Hello World\n") == 6
+    assert StopSequence("\n", include=True)("a\nb") == 2
+    with pytest.raises(ValueError):
+        StopSequence("")
+
+
+def test_first_json_value():
+    stop = FirstJSONValue()
+    assert stop("Here it is: ```json\n{") is None
+    assert stop('{"a": [1, 2]') is None
+    assert stop('```json\n{"a": [1, 2]}\n```') == 21
+    assert stop('[{"a": "}"}] and more') == 12
+    assert stop('See [docs] then {"a": 1} trailing') == 24
+    # Values cut off inside a string, number or literal aren't skipped
+    assert stop('{"a": [1], "b": "x]') is None
+    assert stop('{"a": [1], "b": 1.') is None
+    assert stop('{"a": [1], "b": tr') is None
+
+
+def test_combine():
+    assert combine(None) is None
+    assert combine([]) is None
+    stop = MaxChars(3)
+    assert combine(stop) is stop
+    assert combine([MaxChars(10), StopSequence("b")])("abc" * 4) == 1
@@ -0,0 +1,109 @@
+import json
+import pathlib
+
+import pytest
+from typer.testing import CliRunner
+
+from chatgpt import api
+from chatgpt import exceptions
+from chatgpt import store
+from chatgpt.cli import app
+
+
+def _response(conv, n, content):
+    return api.Response(f"msg-{n}", conv, f"msg-{n}", content)
+
+
+@pytest.fixture
+def conversation_store(tmp_path):
+    conversation_store = store.SQLiteConversationStore(tmp_path / "conv.db")
+    yield conversation_store
+    conversation_store.close()
+
+
+def test_store_save_and_get(conversation_store):
+    conversation_store.save_turn("hello", "root", _response("a", 1, "hi"))
+    conversation_store.save_turn("bye", "msg-1", _response("a", 2, "ciao"))
+    stored = conversation_store.get("a")
+    assert stored.title == "hello"
+    assert stored.parent_message_id == "msg-2"
+    assert conversation_store.get("b") is None
+    turns = conversation_store.turns("a")
+    assert [(t.parent_message_id, t.prompt, t.reply) for t in turns] == [
+        ("root", "hello", "hi"),
+        ("msg-1", "bye", "ciao"),
+    ]
+
+
+def test_store_list_and_search(conversation_store, mocker):
+    clock = mocker.patch("chatgpt.store.time.time", return_value=0)
+    conversation_store.save_turn("apples", "root", _response("a", 1, "red"))
+    clock.return_value = 1
+    conversation_store.save_turn("pears", "root", _response("b", 2, "green"))
+    clock.return_value = 2
+    conversation_store.save_turn('"red" or', "msg-2", _response("b", 3, "no"))
+    listed = conversation_store.list_conversations()
+    assert [c.id for c in listed] == ["b", "a"]
+    assert [c.id for c in conversation_store.list_conversations(1, 1)] == ["a"]
+    assert [c.id for c in conversation_store.search("red")] == ["b", "a"]
+    assert [c.id for c in conversation_store.search("apples red")] == ["a"]
+    assert conversation_store.search("plums") == []
+    assert conversation_store.search("  ") == []
+
+
+def test_store_search_without_fts(tmp_path, mocker):
+    conversation_store = store.SQLiteConversationStore(tmp_path / "conv.db")
+    mocker.patch.object(conversation_store, "_fts", False)
+    conversation_store.save_turn("apples", "root", _response("a", 1, "red"))
+    assert [c.id for c in conversation_store.search("app red")] == ["a"]
+    assert conversation_store.search("pears") == []
+
+
+def test_api_resume_conversation(
+    httpx_mock, session_token, auth_reply, echo_reply, conversation_store
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    with api.ChatGPT(
+        session_token=session_token, conversation_store=conversation_store
+    ) as chat:
+        chat.send_message("foo")
+    with api.ChatGPT(
+        session_token=session_token, conversation_store=conversation_store
+    ) as chat:
+        chat.resume("conv-foo")
+        chat.send_message("bar")
+        conversation = chat.conversation()
+        conversation.resume("conv-foo")
+        assert conversation.parent_message_id == "msg-bar"
+        with pytest.raises(exceptions.ConversationNotFoundException):
+            chat.resume("missing")
+    request = httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)[-1]
+    body = json.loads(request.content)
+    assert body["conversation_id"] == "conv-foo"
+    assert body["parent_message_id"] == "msg-foo"
+    assert len(conversation_store.turns("conv-foo")) == 2
+
+
+def test_cli_start_resume(mocker, httpx_mock, auth_reply, echo_reply):
+    mocker.patch.object(pathlib.Path, "read_text", lambda *x, **y: None)
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    runner = CliRunner()
+    result = runner.invoke(app, ["start"], input="foo\n!exit\n")
+    assert result.exit_code == 0
+
+    result = runner.invoke(app, ["history", "foo"])
+    assert "conv-foo" in result.stdout
+
+    result = runner.invoke(
+        app, ["start", "--resume", "conv-foo"], input="bar\n!exit\n"
+    )
+    assert result.exit_code == 0
+    body = json.loads(
+        httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)[-1].content
+    )
+    assert body["parent_message_id"] == "msg-foo"
+
+    result = runner.invoke(app, ["start", "--resume", "missing"])
+    assert "Conversation missing not found" in result.stdout
@@ -0,0 +1,104 @@
+import os
+import time
+
+import httpx
+
+from chatgpt import api
+from chatgpt import tokens
+
+
+def test_access_token_is_expired():
+    assert not tokens.AccessToken("abc").is_expired()
+    assert tokens.AccessToken("abc", time.time() - 1).is_expired()
+    assert not tokens.AccessToken("abc", time.time() + 120).is_expired(60)
+    assert tokens.AccessToken("abc", time.time() + 30).is_expired(60)
+
+
+def test_parse_expires():
+    assert tokens.parse_expires("1970-01-01T00:01:00.000Z") == 60
+    assert tokens.parse_expires(None) is None
+    assert tokens.parse_expires("foo") is None
+
+
+def test_memory_token_cache():
+    cache = tokens.MemoryTokenCache()
+    assert cache.get("session") is None
+    cache.set("session", tokens.AccessToken("abc", 10.0))
+    assert cache.get("session") == tokens.AccessToken("abc", 10.0)
+    cache.delete("session")
+    assert cache.get("session") is None
+
+
+def test_file_token_cache(token_cache_file):
+    cache = tokens.FileTokenCache()
+    assert cache.get("session") is None
+    cache.set("session", tokens.AccessToken("abc", 10.0))
+    assert tokens.FileTokenCache().get("session") == tokens.AccessToken(
+        "abc", 10.0
+    )
+    assert "session" not in token_cache_file.read_text()
+    assert os.stat(token_cache_file).st_mode & 0o777 == 0o600
+    cache.delete("session")
+    assert cache.get("session") is None
+
+
+def test_file_token_cache_corrupted_file(token_cache_file):
+    token_cache_file.write_text("{")
+    assert tokens.FileTokenCache().get("session") is None
+
+
+def test_api_authenticate_stores_token(httpx_mock, session_token):
+    def custom_response(request):
+        return httpx.Response(
+            status_code=200,
+            json={
+                "accessToken": "access123",
+                "expires": "2999-01-01T00:00:00.000Z",
+            },
+            headers={"Set-Cookie": f"{api.ChatGPT._AUTH_COOKIE_NAME}=12345"},
+        )
+
+    httpx_mock.add_callback(custom_response)
+    cache = tokens.MemoryTokenCache()
+    chat = api.ChatGPT(session_token=session_token, token_cache=cache)
+    chat.authenticate()
+    token = cache.get(session_token)
+    assert token.value == "access123"
+    assert token.expires_at == tokens.parse_expires("2999-01-01T00:00:00Z")
+
+
+def test_api_authenticate_uses_cached_token(session_token):
+    cache = tokens.MemoryTokenCache()
+    cache.set(session_token, tokens.AccessToken("cached", time.time() + 600))
+    with api.ChatGPT(session_token=session_token, token_cache=cache) as chat:
+        assert chat._auth_flag is True
+        assert chat._access_token == "cached"
+
+
+def test_api_authenticate_ignores_expired_cached_token(
+    httpx_mock, session_token, auth_reply
+):
+    httpx_mock.add_callback(auth_reply)
+    cache = tokens.MemoryTokenCache()
+    cache.set(session_token, tokens.AccessToken("cached", time.time() + 10))
+    with api.ChatGPT(session_token=session_token, token_cache=cache) as chat:
+        assert chat._access_token == "access123"
+
+
+def test_api_send_message_refreshes_token_on_401(
+    httpx_mock, session_token, auth_reply, valid_response_data
+):
+    def custom_response(request):
+        if request.headers["Authorization"] == "Bearer cached":
+            return httpx.Response(status_code=401)
+        return httpx.Response(status_code=200, content=valid_response_data)
+
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(custom_response, url=api.ChatGPT._CONV_URL)
+    cache = tokens.MemoryTokenCache()
+    cache.set(session_token, tokens.AccessToken("cached"))
+    with api.ChatGPT(session_token=session_token, token_cache=cache) as chat:
+        assert chat.send_message("foo").content == "Avocado"
+        assert chat._access_token == "access123"
+    assert cache.get(session_token).value == "access123"
+    assert len(httpx_mock.get_requests(url=api.ChatGPT._CONV_URL)) == 2
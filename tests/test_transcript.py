@@ -0,0 +1,66 @@
+import json
+import logging
+
+import httpx
+
+from chatgpt import api
+from chatgpt import transcript
+
+
+def test_transcript_writes_valid_jsonl(tmp_path):
+    path = tmp_path / "transcript.jsonl"
+    sink = transcript.Transcript.to_file(path)
+    sink.record(input='say "hi"\nplease', output="hi")
+    sink.record(input="ąę", output="{}")
+    sink.close()
+    lines = path.read_text(encoding="utf-8").splitlines()
+    entries = [json.loads(line) for line in lines]
+    assert entries[0]["input"] == 'say "hi"\nplease'
+    assert entries[1]["input"] == "ąę"
+    assert all("timestamp" in entry for entry in entries)
+
+
+def test_transcript_rotates_by_size(tmp_path):
+    path = tmp_path / "transcript.jsonl"
+    sink = transcript.Transcript.to_file(path, max_bytes=100, backup_count=2)
+    for i in range(10):
+        sink.record(input="x" * 50, output=str(i))
+    sink.close()
+    assert (tmp_path / "transcript.jsonl.1").exists()
+    assert not (tmp_path / "transcript.jsonl.3").exists()
+
+
+def test_transcript_record_after_close_is_ignored(tmp_path):
+    sink = transcript.Transcript.to_file(tmp_path / "transcript.jsonl")
+    sink.close()
+    sink.record(input="foo")
+    sink.close()
+
+
+def test_default_transcript_is_shared(session_token, default_transcript):
+    first = api.ChatGPT(session_token=session_token)
+    second = api.ChatGPT(session_token=session_token)
+    assert first.transcript is second.transcript
+    assert first.transcript is transcript.get_default_transcript()
+    assert not logging.getLogger("ChatGPT").handlers
+
+
+def test_api_send_message_records_turn(
+    httpx_mock, chatgpt_authenticated, valid_response_data, default_transcript
+):
+    httpx_mock.add_callback(
+        lambda request: httpx.Response(200, content=valid_response_data),
+        url=api.ChatGPT._CONV_URL,
+    )
+    chatgpt_authenticated.send_message('"foo"')
+    chatgpt_authenticated.transcript.close()
+    (entry,) = map(json.loads, default_transcript.read_text().splitlines())
+    assert entry["input"] == '"foo"'
+    assert entry["output"] == "Avocado"
+    assert entry["conversation_id"] == "234"
+
+
+def test_api_transcript_disabled(session_token, default_transcript):
+    chat = api.ChatGPT(session_token=session_token, transcript=None)
+    assert chat.transcript is None
+    assert not default_transcript.exists()
@@ -0,0 +1,79 @@
+import asyncio
+
+import httpx
+
+from chatgpt import api
+from chatgpt.transport import TransportConfig
+
+
+def test_transport_config_timeout_and_limits():
+    config = TransportConfig(connect_timeout=1, read_timeout=None)
+    assert config.timeout == httpx.Timeout(
+        connect=1, read=None, write=10, pool=30
+    )
+    assert config.limits == httpx.Limits(
+        max_connections=100,
+        max_keepalive_connections=50,
+        keepalive_expiry=60,
+    )
+
+
+def test_api_transport_config(session_token):
+    config = TransportConfig(connect_timeout=2, read_timeout=120)
+    chat = api.ChatGPT(
+        session_token=session_token,
+        response_timeout=5,
+        transport_config=config,
+    )
+    assert chat.timeout.connect == 2
+    assert chat.timeout.read == 120
+    assert isinstance(chat._transport, httpx.HTTPTransport)
+    chat.close()
+    async_chat = api.AsyncChatGPT(
+        session_token=session_token, transport_config=config
+    )
+    assert isinstance(async_chat._transport, httpx.AsyncHTTPTransport)
+
+
+def test_api_given_transport_is_used_as_is(session_token, mocker):
+    config = TransportConfig(connect_timeout=2)
+    transport = config.shared_transport()
+    create = mocker.spy(config, "create_transport")
+    chat = api.ChatGPT(
+        session_token=session_token,
+        transport_config=config,
+        transport=transport,
+    )
+    assert chat.timeout.connect == 2
+    # No pool is built just to be thrown away
+    create.assert_not_called()
+    chat.close()
+    transport.shutdown()
+
+
+def test_api_shared_transport(httpx_mock, session_token, auth_reply):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    transport = TransportConfig().shared_transport()
+    with api.ChatGPT(session_token=session_token, transport=transport):
+        pass
+    # The pool outlives the first client
+    with api.ChatGPT(session_token=session_token, transport=transport):
+        pass
+    transport.shutdown()
+    assert len(httpx_mock.get_requests(url=api.ChatGPT._AUTH_URL)) == 2
+
+
+def test_api_async_shared_transport(httpx_mock, session_token, auth_reply):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    transport = TransportConfig().shared_async_transport()
+
+    async def main():
+        for _ in range(2):
+            async with api.AsyncChatGPT(
+                session_token=session_token, transport=transport
+            ):
+                pass
+        await transport.shutdown()
+
+    asyncio.run(main())
+    assert len(httpx_mock.get_requests(url=api.ChatGPT._AUTH_URL)) == 2
@@ -0,0 +1,107 @@
+import asyncio
+import json
+
+import pytest
+
+from chatgpt import api
+from chatgpt import batch
+from chatgpt.exceptions import MessageNotFoundException
+from chatgpt.pool import SessionPool
+from chatgpt.tree import MessageTree
+
+
+def _sent(httpx_mock):
+    """Conversation and parent ids of messages sent, by message text."""
+    sent = {}
+    for request in httpx_mock.get_requests(url=api.ChatGPT._CONV_URL):
+        body = json.loads(request.content)
+        message = body["messages"][0]["content"]["parts"][0]
+        sent[message] = (body["conversation_id"], body["parent_message_id"])
+    return sent
+
+
+def test_message_tree():
+    tree = MessageTree(max_messages=3)
+    tree.add("a", "root", "conv")
+    tree.add("b", "a", "conv")
+    tree.add("c", "a", "conv")
+    tree.add("b", "c", "conv")
+    assert len(tree) == 3
+    assert tree.children("a") == ["b", "c"]
+    assert tree.parent("b") == "a"
+    assert tree.path("c") == ["a", "c"]
+    assert tree.conversation_id("c") == "conv"
+
+    tree.add("d", "c", "conv")
+    # The oldest reply is forgotten
+    assert "a" not in tree
+    assert tree.children("root") == []
+    assert tree.path("d") == ["c", "d"]
+    assert tree.parent("a") is None
+    with pytest.raises(MessageNotFoundException):
+        tree.conversation_id("a")
+
+
+def test_fork_runs_branches_from_shared_prefix(
+    httpx_mock, session_token, auth_reply, echo_reply
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    with api.ChatGPT(session_token=session_token, transcript=None) as chat:
+        conversation = chat.conversation()
+        conversation.send_message("a")
+        conversation.send_message("b")
+        branches = [(conversation.fork("msg-a"), v) for v in ("c", "d")]
+        results = list(batch.send_many(chat, branches, concurrency=2))
+        assert all(result.ok for result in results)
+        # The original conversation is untouched
+        assert conversation.parent_message_id == "msg-b"
+        assert branches[0][0].parent_message_id == "msg-c"
+
+        tree = chat.message_tree
+        assert sorted(tree.children("msg-a")) == ["msg-b", "msg-c", "msg-d"]
+        assert tree.path("msg-d") == ["msg-a", "msg-d"]
+        assert chat.fork("msg-b").conversation_id == "conv-a"
+        with pytest.raises(MessageNotFoundException):
+            chat.fork("msg-unknown")
+    sent = _sent(httpx_mock)
+    assert sent["c"] == ("conv-a", "msg-a")
+    assert sent["d"] == ("conv-a", "msg-a")
+
+
+def test_pooled_conversation_fork(
+    httpx_mock, session_token, auth_reply, echo_reply
+):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+    with SessionPool([session_token, "other"], transcript=None) as pool:
+        conversation = pool.conversation()
+        with pytest.raises(MessageNotFoundException):
+            conversation.fork("msg-a")
+        conversation.send_message("a")
+        conversation.send_message("b")
+        branch = conversation.fork("msg-a")
+        branch.send_message("c")
+        assert branch.client is conversation.client
+    assert _sent(httpx_mock)["c"] == ("conv-a", "msg-a")
+
+
+def test_async_fork(httpx_mock, session_token, auth_reply, echo_reply):
+    httpx_mock.add_callback(auth_reply, url=api.ChatGPT._AUTH_URL)
+    httpx_mock.add_callback(echo_reply, url=api.ChatGPT._CONV_URL)
+
+    async def main():
+        async with api.AsyncChatGPT(
+            session_token=session_token, transcript=None
+        ) as chat:
+            await chat.send_message("a")
+            await chat.send_message("b")
+            branches = [chat.fork("msg-a"), chat.fork().fork("msg-a")]
+            await asyncio.gather(
+                branches[0].send_message("c"), branches[1].send_message("d")
+            )
+
+    asyncio.run(main())
+    sent = _sent(httpx_mock)
+    assert sent["c"] == ("conv-a", "msg-a")
+    assert sent["d"] == ("conv-a", "msg-a")